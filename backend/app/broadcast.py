@@ -0,0 +1,269 @@
+import asyncio
+import json
+import os
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from fastapi import WebSocket
+from .protocol import PROTOCOL_VERSION, apply_patch, encode_event, encode_frame
+from .eventlog import EventLog, compact
+from .metrics import WS_FANOUT
+
+# Per-subscriber outbound queue bound (in events) and what to do when it fills:
+#   "disconnect" - close the lagging socket (it can reconnect and catch up)
+#   "drop"       - drop the newest events for that client only
+HUB_QUEUE_SIZE = int(os.getenv("HUB_QUEUE_SIZE", "1024"))
+HUB_LAGGARD_POLICY = os.getenv("HUB_LAGGARD_POLICY", "disconnect")
+# v3 frames: events are held at most this long, or until this many bytes are pending
+WS_COALESCE_MS = float(os.getenv("WS_COALESCE_MS", "30"))
+WS_COALESCE_BYTES = int(os.getenv("WS_COALESCE_BYTES", "16384"))
+
+class Subscriber:
+    def __init__(self, sid: int, ws: WebSocket, maxsize: int, proto: int = PROTOCOL_VERSION, enc: str = "json"):
+        self.id = sid
+        self.ws = ws
+        self.proto = proto
+        self.enc = enc
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize)
+        self.task: Optional[asyncio.Task] = None
+        self.closed = False
+        self.sent = 0
+        self.bytes = 0
+        self.dropped = 0
+        self.last_seq = 0
+        self.last_latency_ms = 0.0
+        self.max_latency_ms = 0.0
+
+class BroadcastHub:
+    # Session fan-out: each event is encoded once and handed to every
+    # subscriber's bounded queue; a writer task per subscriber does the socket I/O,
+    # so publishing never waits on a client. v3 subscribers get batched frames
+    # instead: events collect for up to WS_COALESCE_MS, then one frame per
+    # encoding is built and shared by all of them.
+
+    def __init__(self, session_id: str, queue_size: int = HUB_QUEUE_SIZE, policy: str = HUB_LAGGARD_POLICY,
+                 log: Optional[EventLog] = None, coalesce_ms: float = WS_COALESCE_MS,
+                 coalesce_bytes: int = WS_COALESCE_BYTES):
+        self.session_id = session_id
+        self.log = log if log is not None else EventLog(session_id)
+        self.queue_size = queue_size
+        self.policy = policy
+        self.subscribers: Dict[int, Subscriber] = {}
+        self.seq = 0
+        # server-side mirror of the clients' state, for snapshots on join/resync
+        self.state: Optional[Dict[str, Any]] = None
+        self.resyncs = 0
+        self.disconnected_laggards = 0
+        self._next_id = 0
+        self.coalesce_s = coalesce_ms / 1000.0
+        self.coalesce_bytes = coalesce_bytes
+        self.batched = 0  # v3 subscribers
+        self.pending: List[Tuple[Dict[str, Any], str]] = []
+        self.pending_bytes = 0
+        self.pending_since = 0.0
+        self.frames = 0
+        self._flush_timer: Optional[asyncio.TimerHandle] = None
+        # set on a session's owner when sessions are shared across workers (cluster/backend.py)
+        self.forward: Optional[Callable[[str], Any]] = None
+
+    async def subscribe(self, ws: WebSocket, from_seq: Optional[int] = None, proto: int = PROTOCOL_VERSION,
+                        enc: str = "json") -> Subscriber:
+        # from_seq=None: snapshot of the current state, then live events.
+        # from_seq=N: every logged event from seq N on (deltas coalesced), then live events.
+        # Only the log read waits (on disk, in a worker thread); the rest runs without a
+        # break, so nothing published in between is missed or sent twice
+        catchup = []
+        if from_seq is not None:
+            events = compact(await self.log.read(max(1, from_seq)))
+            if proto >= 3:
+                catchup = self._frames(events, enc)
+            else:
+                catchup = [encode_event(e) for e in events]
+        if proto >= 3:
+            # what is pending predates this subscriber; send it to the others first
+            self.flush()
+            self.batched += 1
+        self._next_id += 1
+        sub = Subscriber(self._next_id, ws, self.queue_size + len(catchup), proto, enc)
+        sub.last_seq = self.seq
+        sub.task = asyncio.create_task(self._writer(sub))
+        self.subscribers[sub.id] = sub
+        if from_seq is not None:
+            now = time.perf_counter()
+            for data in catchup:
+                sub.queue.put_nowait((self.seq, now, data))
+        elif self.state is not None:
+            self._send_snapshot(sub)
+        return sub
+
+    def resync(self, sub: Subscriber):
+        self.resyncs += 1
+        self._send_snapshot(sub)
+
+    def _frames(self, events: List[Dict[str, Any]], enc: str) -> List[Any]:
+        # catch-up as v3 frames of about coalesce_bytes each
+        out, items, size = [], [], 0
+        for e in events:
+            data = encode_event(e)
+            items.append((e, data))
+            size += len(data)
+            if size >= self.coalesce_bytes:
+                out.append(encode_frame(items, enc))
+                items, size = [], 0
+        if items:
+            out.append(encode_frame(items, enc))
+        return out
+
+    def _send_snapshot(self, sub: Subscriber):
+        evt = {"type": "snapshot", "seq": self.seq, "proto": PROTOCOL_VERSION, "state": self.state}
+        data = encode_event(evt)
+        if sub.proto >= 3:
+            data = encode_frame([(evt, data)], sub.enc)
+        try:
+            sub.queue.put_nowait((self.seq, time.perf_counter(), data))
+        except asyncio.QueueFull:
+            self._overflow(sub)
+
+    def unsubscribe(self, sub: Subscriber):
+        sub.closed = True
+        if self.subscribers.pop(sub.id, None) is not None and sub.proto >= 3:
+            self.batched -= 1
+        if sub.task is not None and sub.task is not asyncio.current_task():
+            sub.task.cancel()
+
+    def publish(self, evt: Dict[str, Any]):
+        self.seq += 1
+        evt["seq"] = self.seq
+        data = encode_event(evt)
+        self._accept(evt, data)
+        if self.forward is not None:
+            self.forward(data)
+
+    def ingest(self, data: str):
+        # an event the session's owner published on another worker; replays are skipped by seq
+        evt = json.loads(data)
+        if evt["seq"] <= self.seq:
+            return
+        self.seq = evt["seq"]
+        self._accept(evt, data)
+
+    def _accept(self, evt: Dict[str, Any], data: str):
+        if "state" in evt:
+            self.state = evt["state"]
+        elif "patch" in evt and self.state is not None:
+            apply_patch(self.state, evt["patch"])
+        self.log.append(self.seq, data)
+        self._fanout(self.seq, data)
+        if self.batched:
+            self._pend(evt, data)
+
+    async def send(self, evt: Dict[str, Any]):
+        # awaitable form of publish for run_simulation's ws_send
+        self.publish(evt)
+
+    def _fanout(self, seq: int, data: str):
+        now = time.perf_counter()
+        for sub in list(self.subscribers.values()):
+            if sub.proto >= 3:
+                continue
+            try:
+                sub.queue.put_nowait((seq, now, data))
+            except asyncio.QueueFull:
+                self._overflow(sub)
+
+    def _pend(self, evt: Dict[str, Any], data: str):
+        if not self.pending:
+            self.pending_since = time.perf_counter()
+            self._flush_timer = asyncio.get_running_loop().call_later(self.coalesce_s, self.flush)
+        self.pending.append((evt, data))
+        self.pending_bytes += len(data)
+        if self.pending_bytes >= self.coalesce_bytes:
+            self.flush()
+
+    def flush(self):
+        # one frame per encoding in use, shared by every v3 subscriber
+        if self._flush_timer is not None:
+            self._flush_timer.cancel()
+            self._flush_timer = None
+        if not self.pending:
+            return
+        items, self.pending, self.pending_bytes = self.pending, [], 0
+        seq = items[-1][0]["seq"]
+        frames: Dict[str, Any] = {}
+        for sub in list(self.subscribers.values()):
+            if sub.proto < 3:
+                continue
+            data = frames.get(sub.enc)
+            if data is None:
+                data = frames[sub.enc] = encode_frame(items, sub.enc)
+                self.frames += 1
+            try:
+                # latency measured from the first event in the frame, batching delay included
+                sub.queue.put_nowait((seq, self.pending_since, data))
+            except asyncio.QueueFull:
+                self._overflow(sub)
+
+    def _overflow(self, sub: Subscriber):
+        sub.dropped += 1
+        if self.policy == "drop":
+            return
+        self.disconnected_laggards += 1
+        self.unsubscribe(sub)
+        asyncio.create_task(self._close(sub.ws, 1013))
+
+    async def _close(self, ws: WebSocket, code: int = 1000):
+        try:
+            await ws.close(code=code)
+        except Exception:
+            pass
+
+    async def _writer(self, sub: Subscriber):
+        try:
+            while not sub.closed:
+                seq, enq, data = await sub.queue.get()
+                if isinstance(data, bytes):
+                    await sub.ws.send_bytes(data)
+                else:
+                    await sub.ws.send_text(data)
+                sub.sent += 1
+                sub.bytes += len(data)
+                sub.last_seq = seq
+                lat = (time.perf_counter() - enq) * 1000.0
+                WS_FANOUT.observe(lat / 1000.0)
+                sub.last_latency_ms = lat
+                if lat > sub.max_latency_ms:
+                    sub.max_latency_ms = lat
+        except asyncio.CancelledError:
+            pass
+        except Exception:
+            self.unsubscribe(sub)
+
+    async def close(self):
+        self.flush()
+        for sub in list(self.subscribers.values()):
+            self.unsubscribe(sub)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "seq": self.seq,
+            "resyncs": self.resyncs,
+            "policy": self.policy,
+            "queue_size": self.queue_size,
+            "disconnected_laggards": self.disconnected_laggards,
+            "coalesce_ms": self.coalesce_s * 1000.0,
+            "batched_frames": self.frames,
+            "clients": [
+                {
+                    "id": sub.id,
+                    "proto": sub.proto,
+                    "enc": sub.enc,
+                    "queue_depth": sub.queue.qsize(),
+                    "lag_events": self.seq - sub.last_seq,
+                    "last_latency_ms": round(sub.last_latency_ms, 3),
+                    "max_latency_ms": round(sub.max_latency_ms, 3),
+                    "sent": sub.sent,
+                    "bytes": sub.bytes,
+                    "dropped": sub.dropped,
+                }
+                for sub in self.subscribers.values()
+            ],
+        }
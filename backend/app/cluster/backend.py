@@ -0,0 +1,283 @@
+import asyncio
+import json
+import os
+import socket
+from typing import Any, Callable, Dict, List, Optional
+
+from .resp import BackendUnavailable, RespClient, RespSubscriber
+
+# Where sessions live when the app runs as several worker processes.
+#   local - in this process only (STORE); a single worker
+#   redis - session records, ownership, stop signals and events go through a
+#           Redis-compatible server (a real Redis, or python -m app.cluster.server)
+# With "redis", /api/sim/start only writes the session record; the worker that
+# gets the first websocket claims the session and runs it (the owner). Viewers
+# on other workers follow it: the owner appends every event to the session's
+# list and publishes it on the session's channel, and followers replay the
+# list, then apply published events to a local hub. When the connection to the
+# server drops, calls raise BackendUnavailable until it is redialled; then the
+# owner writes the events it held back and followers replay the list again.
+SESSION_BACKEND = os.getenv("SESSION_BACKEND", "local")
+SESSION_BACKEND_URL = os.getenv("SESSION_BACKEND_URL", "redis://127.0.0.1:6390")
+SESSION_BACKEND_TTL = int(os.getenv("SESSION_BACKEND_TTL", "3600"))
+SESSION_BACKEND_FINISHED_TTL = int(os.getenv("SESSION_BACKEND_FINISHED_TTL", "300"))
+
+BACKENDS = ("local", "redis")
+
+def _k(kind: str, session_id: str) -> str:
+    return f"sim:{kind}:{session_id}"
+
+class _Follow:
+    # a followed session: published messages are held while the list is replayed
+    __slots__ = ("on_event", "held")
+
+    def __init__(self, on_event: Callable[[str], Any]):
+        self.on_event = on_event
+        self.held: Optional[List[str]] = []
+
+class SessionBackend:
+    # single process: nothing is shared, every call is a no-op
+    enabled = False
+
+    def __init__(self):
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+
+    async def start(self):
+        pass
+
+    async def close(self):
+        pass
+
+    async def create(self, session_id: str, record: Dict[str, Any]):
+        pass
+
+    async def record(self, session_id: str) -> Optional[Dict[str, Any]]:
+        return None
+
+    async def claim(self, session_id: str) -> bool:
+        return True
+
+    def own(self, session_id: str, on_control: Callable[[str], Any]):
+        pass
+
+    def status(self, session_id: str, status: str):
+        pass
+
+    def forward(self, session_id: str, data: str):
+        pass
+
+    async def follow(self, session_id: str, on_event: Callable[[str], Any]):
+        pass
+
+    def unfollow(self, session_id: str):
+        pass
+
+    async def stop(self, session_id: str):
+        pass
+
+    def viewers(self, session_id: str, n: int):
+        pass
+
+    async def remote_viewers(self, session_id: str) -> int:
+        return 0
+
+    def finished(self, session_id: str, outcome: str):
+        pass
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": "local"}
+
+class RedisSessionBackend(SessionBackend):
+    enabled = True
+
+    def __init__(self, url: str = SESSION_BACKEND_URL):
+        super().__init__()
+        self.url = url
+        self.cmd = RespClient(url)
+        self.sub = RespSubscriber(url, on_resubscribe=self._resubscribed)
+        self.following: Dict[str, _Follow] = {}
+        # owner-side events waiting to be written, batched per session by the flusher
+        self.outbox: List[tuple] = []
+        self.unsent: List[tuple] = []  # written as the connection dropped, to write again
+        self.wakeup: Optional[asyncio.Event] = None
+        self.flusher: Optional[asyncio.Task] = None
+        self.counters = {"events_forwarded": 0, "batches": 0, "events_received": 0, "replays": 0}
+
+    async def start(self):
+        await self.cmd.connect()
+        await self.sub.connect()
+        self.wakeup = asyncio.Event()
+        self.flusher = asyncio.create_task(self._flush_forever())
+
+    async def close(self):
+        if self.flusher is not None:
+            self.flusher.cancel()
+            self.flusher = None
+            self._flush()
+        await self.sub.close()
+        await self.cmd.close()
+
+    async def create(self, session_id: str, record: Dict[str, Any]):
+        key = _k("session", session_id)
+        self.cmd.send("HSET", key, "config", json.dumps(record), "status", "pending")
+        await self.cmd.execute("EXPIRE", key, SESSION_BACKEND_TTL)
+
+    async def record(self, session_id: str) -> Optional[Dict[str, Any]]:
+        flat = await self.cmd.execute("HGETALL", _k("session", session_id))
+        if not flat:
+            return None
+        h = dict(zip(flat[::2], flat[1::2]))
+        rec = json.loads(h.get("config") or "{}")
+        rec["status"] = h.get("status", "pending")
+        rec["outcome"] = h.get("outcome")
+        rec["stop"] = h.get("stop") == "1"
+        rec["owner"] = await self.cmd.execute("GET", _k("owner", session_id))
+        return rec
+
+    async def claim(self, session_id: str) -> bool:
+        ok = await self.cmd.execute("SET", _k("owner", session_id), self.worker_id, "NX", "EX", SESSION_BACKEND_TTL)
+        if ok is not None:
+            self.cmd.send("HSET", _k("session", session_id), "status", "running")
+        return ok is not None
+
+    def own(self, session_id: str, on_control: Callable[[str], Any]):
+        # stop requests and viewer counts from other workers
+        self.sub.subscribe(_k("ctl", session_id), on_control)
+
+    def status(self, session_id: str, status: str):
+        # paused / running, as seen by the owner
+        self.cmd.send("HSET", _k("session", session_id), "status", status)
+
+    def forward(self, session_id: str, data: str):
+        self.outbox.append((session_id, data))
+        self.wakeup.set()
+
+    async def _flush_forever(self):
+        while True:
+            await self.wakeup.wait()
+            self.wakeup.clear()
+            # let a burst (a streamed turn's deltas) collect into one write
+            await asyncio.sleep(0)
+            while self.cmd.closed:
+                # keep the events until the connection is back, followers must see no gap
+                await asyncio.sleep(0.1)
+            self._flush()
+
+    def _flush(self):
+        if not (self.outbox or self.unsent) or self.cmd.closed:
+            return
+        items, self.outbox, self.unsent = self.unsent + self.outbox, [], []
+        by_session: Dict[str, List[str]] = {}
+        for sid, data in items:
+            by_session.setdefault(sid, []).append(data)
+        for sid, batch in by_session.items():
+            # the list first, so a follower that replays it and then sees the message has no gap
+            pushed = self.cmd.send("RPUSH", _k("log", sid), *batch)
+            pushed.add_done_callback(lambda fut, sid=sid, batch=batch: self._pushed(fut, sid, batch))
+            self.cmd.send("PUBLISH", _k("events", sid), "\n".join(batch))
+        self.counters["events_forwarded"] += len(items)
+        self.counters["batches"] += len(by_session)
+
+    def _pushed(self, fut: asyncio.Future, sid: str, batch: List[str]):
+        # lost with the connection (or maybe just its reply): push and publish it again,
+        # before anything newer; followers skip what they already have by seq
+        if not fut.cancelled() and isinstance(fut.exception(), BackendUnavailable):
+            self.unsent.extend((sid, data) for data in batch)
+            self.wakeup.set()
+
+    async def follow(self, session_id: str, on_event: Callable[[str], Any]):
+        # subscribe first and hold what arrives until the backlog is applied
+        if self.sub.closed:
+            raise BackendUnavailable("session backend unreachable")
+        f = self.following[session_id] = _Follow(on_event)
+        confirm = self.sub.subscribe(_k("events", session_id), lambda msg: self._deliver(f, msg))
+        try:
+            await self._replay(session_id, f, confirm)
+        except BackendUnavailable:
+            self.unfollow(session_id)
+            raise
+
+    def _deliver(self, f: _Follow, msg: str):
+        self.counters["events_received"] += msg.count("\n") + 1
+        if f.held is not None:
+            f.held.append(msg)
+            return
+        for data in msg.split("\n"):
+            f.on_event(data)
+
+    async def _replay(self, session_id: str, f: _Follow, confirm: asyncio.Future):
+        # the hub skips events it already has, so replaying the whole list again is safe
+        await confirm
+        for data in await self.cmd.execute("LRANGE", _k("log", session_id), 0, -1):
+            f.on_event(data)
+        if f.held is not None:
+            held, f.held = f.held, None
+            for msg in held:
+                for data in msg.split("\n"):
+                    f.on_event(data)
+
+    def _resubscribed(self, confirms: Dict[str, asyncio.Future]):
+        # the pub/sub connection was redialled: catch up on what was published meanwhile
+        for channel, confirm in confirms.items():
+            _, kind, session_id = channel.split(":", 2)
+            if kind == "events" and session_id in self.following:
+                f = self.following[session_id]
+                if f.held is None:
+                    f.held = []
+                asyncio.create_task(self._catch_up(session_id, self._replay, f, confirm))
+            elif kind == "ctl":
+                asyncio.create_task(self._catch_up(session_id, self._recheck, self.sub.handlers[channel], confirm))
+
+    async def _recheck(self, session_id: str, on_control: Callable[[str], Any], confirm: asyncio.Future):
+        # a stop request or a viewer count change may have been missed
+        await confirm
+        if await self.cmd.execute("HGET", _k("session", session_id), "stop") == "1":
+            on_control("stop")
+        on_control("viewers")
+
+    async def _catch_up(self, session_id: str, step: Callable, *args: Any):
+        # the command connection may still be down: retry until it is back
+        while not self.sub.stopping:
+            try:
+                await step(session_id, *args)
+            except BackendUnavailable:
+                await asyncio.sleep(0.1)
+                continue
+            self.counters["replays"] += 1
+            return
+
+    def unfollow(self, session_id: str):
+        self.following.pop(session_id, None)
+        self.sub.unsubscribe(_k("events", session_id))
+
+    async def stop(self, session_id: str):
+        # the flag covers a session nobody has claimed yet
+        self.cmd.send("HSET", _k("session", session_id), "stop", "1")
+        await self.cmd.execute("PUBLISH", _k("ctl", session_id), "stop")
+
+    def viewers(self, session_id: str, n: int):
+        self.cmd.send("HSET", _k("viewers", session_id), self.worker_id, n)
+        self.cmd.send("EXPIRE", _k("viewers", session_id), SESSION_BACKEND_TTL)
+        self.cmd.send("PUBLISH", _k("ctl", session_id), "viewers")
+
+    async def remote_viewers(self, session_id: str) -> int:
+        flat = await self.cmd.execute("HGETALL", _k("viewers", session_id))
+        return sum(int(n) for w, n in zip(flat[::2], flat[1::2]) if w != self.worker_id)
+
+    def finished(self, session_id: str, outcome: str):
+        # after the last events, so the list is complete when the status says so
+        self._flush()
+        self.sub.unsubscribe(_k("ctl", session_id))
+        self.cmd.send("HSET", _k("session", session_id), "status", "finished", "outcome", outcome)
+        for kind in ("session", "log", "owner", "viewers"):
+            self.cmd.send("EXPIRE", _k(kind, session_id), SESSION_BACKEND_FINISHED_TTL)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": "redis", "url": self.url, "worker": self.worker_id, **self.counters}
+
+def make_backend(kind: str = SESSION_BACKEND) -> SessionBackend:
+    if kind not in BACKENDS:
+        raise ValueError(f"unknown session backend: {kind}")
+    return RedisSessionBackend() if kind == "redis" else SessionBackend()
+
+CLUSTER = make_backend()
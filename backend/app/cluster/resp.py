@@ -0,0 +1,202 @@
+import asyncio
+import os
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Optional, Tuple
+from urllib.parse import urlparse
+
+# Minimal asyncio client for the Redis protocol (RESP2): enough for the session
+# backend, against a real Redis or the local stand-in (cluster/server.py).
+# Commands are pipelined: each call writes its request right away and a reader
+# task resolves replies in order, so concurrent callers never wait on each other.
+# A dropped connection is redialled with backoff (up to RESP_RECONNECT_MAX seconds
+# apart); meanwhile commands fail at once with BackendUnavailable.
+RESP_RECONNECT_MAX = float(os.getenv("RESP_RECONNECT_MAX", "5"))
+
+class RespError(RuntimeError):
+    pass
+
+class BackendUnavailable(ConnectionError):
+    pass
+
+def parse_url(url: str) -> Tuple[str, int]:
+    u = urlparse(url)
+    return u.hostname or "127.0.0.1", u.port or 6379
+
+def encode_command(*args: Any) -> bytes:
+    out = [b"*%d\r\n" % len(args)]
+    for a in args:
+        b = a if isinstance(a, bytes) else str(a).encode("utf-8")
+        out.append(b"$%d\r\n%s\r\n" % (len(b), b))
+    return b"".join(out)
+
+async def read_reply(reader: asyncio.StreamReader) -> Any:
+    line = await reader.readline()
+    if not line:
+        raise ConnectionError("connection closed")
+    kind, rest = line[:1], line[1:-2]
+    if kind == b"+":
+        return rest.decode("utf-8")
+    if kind == b"-":
+        return RespError(rest.decode("utf-8"))
+    if kind == b":":
+        return int(rest)
+    if kind == b"$":
+        n = int(rest)
+        if n < 0:
+            return None
+        data = await reader.readexactly(n + 2)
+        return data[:-2].decode("utf-8")
+    if kind == b"*":
+        n = int(rest)
+        if n < 0:
+            return None
+        return [await read_reply(reader) for _ in range(n)]
+    raise RespError(f"bad reply: {line!r}")
+
+class _Connection:
+    # one socket plus the task reading it; redialled when it drops, until close()
+    def __init__(self, url: str):
+        self.host, self.port = parse_url(url)
+        self.reader: Optional[asyncio.StreamReader] = None
+        self.writer: Optional[asyncio.StreamWriter] = None
+        self.task: Optional[asyncio.Task] = None
+        self.closed = True  # no usable connection right now
+        self.stopping = False
+        self.reconnects = 0
+
+    async def connect(self):
+        self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        self.closed = False
+        self._connected()
+        self.task = asyncio.create_task(self._run())
+
+    def _connected(self):
+        pass
+
+    async def _run(self):
+        try:
+            await self._read_loop()
+        except (OSError, asyncio.IncompleteReadError) as e:
+            self.closed = True
+            self.writer.close()
+            self._lost(BackendUnavailable(str(e) or "connection closed"))
+        if not self.stopping:
+            await self._redial()
+
+    async def _redial(self):
+        delay = 0.1
+        while not self.stopping:
+            await asyncio.sleep(delay)
+            try:
+                await self.connect()
+            except OSError:
+                delay = min(delay * 2, RESP_RECONNECT_MAX)
+                continue
+            self.reconnects += 1
+            return
+
+    async def _read_loop(self):
+        raise NotImplementedError
+
+    def _lost(self, e: Exception):
+        pass
+
+    async def close(self):
+        self.stopping = True
+        self.closed = True
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+class RespClient(_Connection):
+    def __init__(self, url: str):
+        super().__init__(url)
+        self.waiting: Deque[asyncio.Future] = deque()
+
+    async def _read_loop(self):
+        while True:
+            reply = await read_reply(self.reader)
+            fut = self.waiting.popleft()
+            if fut.done():
+                continue
+            if isinstance(reply, RespError):
+                fut.set_exception(reply)
+            else:
+                fut.set_result(reply)
+
+    def _lost(self, e: Exception):
+        # commands sent on the dropped connection get no reply
+        while self.waiting:
+            fut = self.waiting.popleft()
+            if not fut.done():
+                fut.set_exception(e)
+
+    def send(self, *args: Any) -> asyncio.Future:
+        # write now, reply later; the future may be ignored (fire and forget)
+        fut = asyncio.get_running_loop().create_future()
+        fut.add_done_callback(_consume)
+        if self.closed:
+            fut.set_exception(BackendUnavailable(f"session backend {self.host}:{self.port} unreachable"))
+            return fut
+        self.waiting.append(fut)
+        self.writer.write(encode_command(*args))
+        return fut
+
+    async def execute(self, *args: Any) -> Any:
+        return await self.send(*args)
+
+def _consume(fut: asyncio.Future):
+    # a reply nobody awaited must not log "exception never retrieved"
+    if not fut.cancelled():
+        fut.exception()
+
+class RespSubscriber(_Connection):
+    # a connection in pub/sub mode: one callback per channel, called with each message;
+    # subscribe() can be awaited for the server's confirmation. After a reconnect every
+    # channel is subscribed again, then on_resubscribe(channel -> confirmation) is called
+    # before any message is read: what was published in between was missed
+    def __init__(self, url: str, on_resubscribe: Optional[Callable[[Dict[str, asyncio.Future]], Any]] = None):
+        super().__init__(url)
+        self.handlers: Dict[str, Callable[[str], Any]] = {}
+        self.confirm: Dict[str, asyncio.Future] = {}
+        self.on_resubscribe = on_resubscribe
+
+    def _connected(self):
+        if not self.handlers:
+            return
+        confirms = {channel: self.subscribe(channel, handler) for channel, handler in list(self.handlers.items())}
+        if self.on_resubscribe is not None:
+            self.on_resubscribe(confirms)
+
+    def subscribe(self, channel: str, handler: Callable[[str], Any]) -> asyncio.Future:
+        # resolves once the server confirms, i.e. every later publish will be delivered;
+        # while disconnected, once the channel is subscribed again after the reconnect
+        self.handlers[channel] = handler
+        fut = self.confirm.get(channel)
+        if fut is None:
+            fut = self.confirm[channel] = asyncio.get_running_loop().create_future()
+        if not self.closed:
+            self.writer.write(encode_command("SUBSCRIBE", channel))
+        return fut
+
+    def unsubscribe(self, channel: str):
+        if self.handlers.pop(channel, None) is not None and not self.closed:
+            self.writer.write(encode_command("UNSUBSCRIBE", channel))
+
+    async def _read_loop(self):
+        while True:
+            reply = await read_reply(self.reader)
+            # ["message", channel, data] or ["subscribe", channel, count]
+            if not isinstance(reply, list) or len(reply) != 3:
+                continue
+            if reply[0] == "message":
+                handler = self.handlers.get(reply[1])
+                if handler is not None:
+                    handler(reply[2])
+            elif reply[0] == "subscribe":
+                fut = self.confirm.pop(reply[1], None)
+                if fut is not None and not fut.done():
+                    fut.set_result(None)
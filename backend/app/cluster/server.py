@@ -0,0 +1,266 @@
+"""Local stand-in for Redis, for running the app with several workers without one.
+
+Speaks RESP2 and implements the commands the session backend uses (strings
+with NX/EX/PX, hashes, lists, key expiry, pub/sub). Data lives in memory only.
+
+    cd backend && python -m app.cluster.server --port 6390
+    SESSION_BACKEND=redis SESSION_BACKEND_URL=redis://127.0.0.1:6390 uvicorn app.main:app --workers 4
+"""
+import argparse
+import asyncio
+import time
+from typing import Any, Dict, List, Optional, Set
+
+from .resp import encode_command
+
+class Server:
+    def __init__(self):
+        self.data: Dict[str, Any] = {}
+        self.expires: Dict[str, float] = {}
+        self.channels: Dict[str, Set[asyncio.StreamWriter]] = {}
+        self.stats = {"commands": 0, "published": 0, "delivered": 0, "clients": 0}
+
+    # --- keyspace -------------------------------------------------------
+
+    def _get(self, key: str, kind: Optional[type] = None) -> Any:
+        exp = self.expires.get(key)
+        if exp is not None and exp <= time.time():
+            self.data.pop(key, None)
+            self.expires.pop(key, None)
+        v = self.data.get(key)
+        if v is not None and kind is not None and not isinstance(v, kind):
+            raise TypeError("WRONGTYPE Operation against a key holding the wrong kind of value")
+        return v
+
+    def _expire(self, key: str, seconds: float) -> int:
+        if self._get(key) is None:
+            return 0
+        self.expires[key] = time.time() + seconds
+        return 1
+
+    def sweep(self):
+        now = time.time()
+        for key in [k for k, t in self.expires.items() if t <= now]:
+            self.data.pop(key, None)
+            self.expires.pop(key, None)
+
+    async def sweep_forever(self, interval: float = 5.0):
+        while True:
+            await asyncio.sleep(interval)
+            self.sweep()
+
+    # --- commands -------------------------------------------------------
+
+    def cmd_ping(self, *args):
+        return Simple(args[0] if args else "PONG")
+
+    def cmd_echo(self, msg):
+        return msg
+
+    def cmd_get(self, key):
+        return self._get(key, str)
+
+    def cmd_set(self, key, value, *opts):
+        opts = [o.upper() for o in opts]
+        ttl = None
+        for flag, scale in (("EX", 1.0), ("PX", 0.001)):
+            if flag in opts:
+                ttl = float(opts[opts.index(flag) + 1]) * scale
+        if "NX" in opts and self._get(key) is not None:
+            return None
+        if "XX" in opts and self._get(key) is None:
+            return None
+        self.data[key] = value
+        self.expires.pop(key, None)
+        if ttl is not None:
+            self.expires[key] = time.time() + ttl
+        return Simple("OK")
+
+    def cmd_del(self, *keys):
+        n = 0
+        for k in keys:
+            if self._get(k) is not None:
+                n += 1
+            self.data.pop(k, None)
+            self.expires.pop(k, None)
+        return n
+
+    def cmd_exists(self, *keys):
+        return sum(1 for k in keys if self._get(k) is not None)
+
+    def cmd_expire(self, key, seconds):
+        return self._expire(key, float(seconds))
+
+    def cmd_pexpire(self, key, ms):
+        return self._expire(key, float(ms) / 1000.0)
+
+    def cmd_incr(self, key):
+        v = int(self._get(key, str) or 0) + 1
+        self.data[key] = str(v)
+        return v
+
+    def cmd_hset(self, key, *pairs):
+        h = self._get(key, dict)
+        if h is None:
+            h = self.data[key] = {}
+        n = 0
+        for i in range(0, len(pairs) - 1, 2):
+            n += pairs[i] not in h
+            h[pairs[i]] = pairs[i + 1]
+        return n
+
+    def cmd_hget(self, key, field):
+        return (self._get(key, dict) or {}).get(field)
+
+    def cmd_hgetall(self, key):
+        out: List[str] = []
+        for k, v in (self._get(key, dict) or {}).items():
+            out += [k, v]
+        return out
+
+    def cmd_hdel(self, key, *fields):
+        h = self._get(key, dict) or {}
+        return sum(1 for f in fields if h.pop(f, None) is not None)
+
+    def cmd_rpush(self, key, *values):
+        lst = self._get(key, list)
+        if lst is None:
+            lst = self.data[key] = []
+        lst.extend(values)
+        return len(lst)
+
+    def cmd_llen(self, key):
+        return len(self._get(key, list) or [])
+
+    def cmd_lrange(self, key, start, stop):
+        lst = self._get(key, list) or []
+        start, stop = int(start), int(stop)
+        n = len(lst)
+        if start < 0:
+            start = max(0, n + start)
+        stop = n + stop if stop < 0 else min(stop, n - 1)
+        return lst[start:stop + 1]
+
+    def cmd_publish(self, channel, message):
+        subs = self.channels.get(channel) or ()
+        frame = encode_command("message", channel, message)
+        for w in list(subs):
+            w.write(frame)
+        self.stats["published"] += 1
+        self.stats["delivered"] += len(subs)
+        return len(subs)
+
+    def cmd_dbsize(self):
+        self.sweep()
+        return len(self.data)
+
+    def cmd_flushall(self):
+        self.data.clear()
+        self.expires.clear()
+        return Simple("OK")
+
+    # --- connections ----------------------------------------------------
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.stats["clients"] += 1
+        subscribed: Set[str] = set()
+        try:
+            while True:
+                args = await read_command(reader)
+                if args is None:
+                    break
+                self.stats["commands"] += 1
+                name = args[0].upper()
+                if name in ("SUBSCRIBE", "UNSUBSCRIBE"):
+                    for ch in args[1:]:
+                        if name == "SUBSCRIBE":
+                            self.channels.setdefault(ch, set()).add(writer)
+                            subscribed.add(ch)
+                        else:
+                            self._leave(ch, writer)
+                            subscribed.discard(ch)
+                        writer.write(encode_reply([name.lower(), ch, len(subscribed)]))
+                    continue
+                if name == "QUIT":
+                    writer.write(b"+OK\r\n")
+                    break
+                fn = getattr(self, "cmd_" + name.lower(), None)
+                if fn is None:
+                    writer.write(b"-ERR unknown command '%s'\r\n" % name.encode())
+                    continue
+                try:
+                    writer.write(encode_reply(fn(*args[1:])))
+                except TypeError as e:
+                    msg = str(e) if str(e).startswith("WRONGTYPE") else f"ERR wrong arguments for '{name}'"
+                    writer.write(b"-%s\r\n" % msg.encode())
+                if writer.transport.get_write_buffer_size() > 1 << 20:
+                    await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            for ch in subscribed:
+                self._leave(ch, writer)
+            self.stats["clients"] -= 1
+            writer.close()
+
+    def _leave(self, channel: str, writer: asyncio.StreamWriter):
+        subs = self.channels.get(channel)
+        if subs is not None:
+            subs.discard(writer)
+            if not subs:
+                del self.channels[channel]
+
+class Simple(str):
+    # a status reply (+OK) rather than a bulk string
+    pass
+
+def encode_reply(v: Any) -> bytes:
+    if v is None:
+        return b"$-1\r\n"
+    if isinstance(v, Simple):
+        return b"+%s\r\n" % v.encode("utf-8")
+    if isinstance(v, bool) or isinstance(v, int):
+        return b":%d\r\n" % int(v)
+    if isinstance(v, list):
+        return b"*%d\r\n" % len(v) + b"".join(encode_reply(x) for x in v)
+    b = str(v).encode("utf-8")
+    return b"$%d\r\n%s\r\n" % (len(b), b)
+
+async def read_command(reader: asyncio.StreamReader) -> Optional[List[str]]:
+    line = await reader.readline()
+    if not line:
+        return None
+    if not line.startswith(b"*"):
+        # inline command (e.g. from telnet / redis-cli in a pinch)
+        return line.decode("utf-8").split() or [""]
+    n = int(line[1:-2])
+    args = []
+    for _ in range(n):
+        hdr = await reader.readline()
+        size = int(hdr[1:-2])
+        data = await reader.readexactly(size + 2)
+        args.append(data[:-2].decode("utf-8"))
+    return args
+
+async def serve(host: str, port: int):
+    srv = Server()
+    server = await asyncio.start_server(srv.handle, host, port)
+    sweeper = asyncio.create_task(srv.sweep_forever())
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        sweeper.cancel()
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=6390)
+    args = ap.parse_args()
+    try:
+        asyncio.run(serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
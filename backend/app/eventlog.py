@@ -0,0 +1,127 @@
+import asyncio
+import gzip
+import json
+import os
+import threading
+from collections import deque
+from typing import Any, Deque, Dict, Iterator, List, Optional, Tuple
+from .protocol import coalesce
+
+# Append-only per-session event log. Encoded events (seq 1, 2, 3, ... with no
+# gaps) live in an in-memory ring; when the ring fills, its older half is
+# appended to <dir>/<session_id>.jsonl.gz, so line N of the file is seq N.
+# The file is only touched in worker threads: appends by one writer task per log,
+# events leaving the ring only once they are on disk, so reads never see a gap.
+EVENTLOG_RING = int(os.getenv("EVENTLOG_RING", "2048"))
+EVENTLOG_DIR = os.getenv("EVENTLOG_DIR", "eventlogs")
+
+def log_path(session_id: str, directory: str = EVENTLOG_DIR) -> str:
+    return os.path.join(directory, f"{session_id}.jsonl.gz")
+
+class EventLog:
+    def __init__(self, session_id: str, ring_size: int = EVENTLOG_RING, directory: str = EVENTLOG_DIR,
+                 persist: bool = True):
+        self.session_id = session_id
+        self.ring_size = max(2, ring_size)
+        self.directory = directory
+        # persist=False: memory only, nothing trimmed (a follower's copy; the owner writes the file)
+        self.persist = persist
+        self.path = log_path(session_id, directory)
+        self.ring: Deque[Tuple[int, str]] = deque()
+        self.on_disk = 0   # highest seq written to the file
+        self.save_upto = 0  # highest seq due to be written
+        self.keep = self.ring_size // 2  # events kept in memory once on disk (0 after flush)
+        self.last_seq = 0
+        self.writer: Optional[asyncio.Task] = None
+        self.io = threading.Lock()
+
+    def append(self, seq: int, data: str):
+        self.ring.append((seq, data))
+        self.last_seq = seq
+        if self.persist and len(self.ring) >= self.ring_size and self.save_upto < seq:
+            self._save(self.ring[len(self.ring) // 2 - 1][0])
+
+    def flush(self):
+        # everything to disk, then out of the ring: reads of a finished session go to the file
+        if self.persist:
+            self.keep = 0
+            self._save(self.last_seq)
+
+    async def drain(self):
+        # writes still in flight (shutdown)
+        if self.writer is not None:
+            await asyncio.wait([self.writer])
+
+    def _save(self, upto: int):
+        self.save_upto = max(self.save_upto, upto)
+        if self.writer is not None:
+            return
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            # no event loop (a script): write right away
+            items = self._unsaved()
+            if items:
+                self._write(items)
+            self._trim()
+            return
+        self.writer = asyncio.create_task(self._drain())
+
+    def _unsaved(self) -> List[Tuple[int, str]]:
+        return [(s, d) for s, d in self.ring if self.on_disk < s <= self.save_upto]
+
+    async def _drain(self):
+        # whatever became due while a batch was being written goes in the next one
+        try:
+            while self.on_disk < self.save_upto:
+                await asyncio.to_thread(self._write, self._unsaved())
+            self._trim()
+        finally:
+            self.writer = None
+
+    def _write(self, items: List[Tuple[int, str]]):
+        with self.io:
+            os.makedirs(self.directory, exist_ok=True)
+            with gzip.open(self.path, "at", encoding="utf-8") as f:
+                for _, data in items:
+                    f.write(data)
+                    f.write("\n")
+        self.on_disk = items[-1][0]
+
+    def _trim(self):
+        while len(self.ring) > self.keep and self.ring[0][0] <= self.on_disk:
+            self.ring.popleft()
+
+    def _read_file(self, from_seq: int, to_seq: int) -> List[str]:
+        with self.io:
+            return read_lines(self.path, from_seq, to_seq)
+
+    async def read(self, from_seq: int) -> List[str]:
+        # every event from from_seq on. The file part is read in a worker thread; if the
+        # ring moved on to disk meanwhile, the stretch it left is read from the file too
+        out: List[str] = []
+        while True:
+            first_mem = self.ring[0][0] if self.ring else self.last_seq + 1
+            if from_seq >= first_mem:
+                break
+            out.extend(await asyncio.to_thread(self._read_file, from_seq, first_mem - 1))
+            from_seq = first_mem
+        out.extend(d for s, d in self.ring if s >= from_seq)
+        return out
+
+def read_file(path: str, from_seq: int = 1, to_seq: Optional[int] = None) -> Iterator[str]:
+    if not os.path.exists(path):
+        return
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        for seq, line in enumerate(f, start=1):
+            if to_seq is not None and seq > to_seq:
+                return
+            if seq >= from_seq:
+                yield line.rstrip("\n")
+
+def read_lines(path: str, from_seq: int = 1, to_seq: Optional[int] = None) -> List[str]:
+    return list(read_file(path, from_seq, to_seq))
+
+def compact(lines: List[str]) -> List[Dict[str, Any]]:
+    # catch-up compaction: merged delta runs (see protocol.coalesce)
+    return coalesce(json.loads(line) for line in lines)
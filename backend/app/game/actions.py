@@ -4,6 +4,8 @@ from typing import Literal, Optional, Dict, List
 RoleID = Literal["water_minister", "farmer", "environment", "citizen", "minister"]
 
 AmendmentType = Literal["subsidy", "phasing", "enforcement_soft", "enforcement_hard", "monitoring_kpis"]
+# the amendments policies draw from, in the order they draw them
+AMENDMENTS = ["subsidy", "phasing", "monitoring_kpis", "enforcement_soft"]
 RiskType = Literal["ecological", "economic", "political", "implementation"]
 QuestionType = Literal["feasibility", "fairness", "cost", "timeline", "metrics"]
 KPI = Literal["leak_rate", "consumption", "groundwater", "prices", "farm_output"]
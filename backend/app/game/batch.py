@@ -0,0 +1,283 @@
+import json
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+import numpy as np
+
+from .actions import AMENDMENTS, Action, ActionType, allowed_actions
+from .state import OptionTable, PolicyOption, SCORE_WEIGHTS
+from ..roles import ROLE_ORDER
+
+# Headless rules-only engine: plays many games at once, one row per game.
+# Mirrors orchestrator.run_simulation without the LLM render/judge steps:
+# choose_action -> transition per turn, call_vote at round end, utilities at the end.
+
+ACTION_TYPES: List[ActionType] = [
+    "PROPOSE","SUPPORT","OPPOSE","AMEND","OFFER_COMPROMISE","DEMAND_COMPENSATION",
+    "RAISE_RISK","ASK_QUESTION","REQUEST_METRICS","SUMMARIZE","CALL_VOTE","DECIDE"
+]
+A = {t: i for i, t in enumerate(ACTION_TYPES)}
+
+# action types that carry option_id (and so trigger the option's hard impacts)
+_WITH_OPTION = np.array([t in ("PROPOSE","SUPPORT","OPPOSE","AMEND","DECIDE") for t in ACTION_TYPES])
+
+@dataclass
+class BatchResult:
+    option_ids: List[str]
+    utilities: np.ndarray          # games x roles, columns in ROLE_ORDER
+    decision: np.ndarray           # games, option index
+    turns: np.ndarray              # games, turns actually played
+    actions: Optional[np.ndarray] = None  # turns x games x 4 (type, option, option_b, amendment); -1 = not played
+
+class BatchState:
+    def __init__(self, n: int, n_options: int):
+        self.support = np.full((n, len(ROLE_ORDER), n_options), 0.25)
+        self.budget_remaining = np.full(n, 1.0)
+        self.infrastructure_status = np.full(n, 0.5)
+        self.restriction_level = np.zeros(n, dtype=np.int64)
+        self.groundwater_risk = np.full(n, 0.6)
+        self.economic_stress = np.full(n, 0.4)
+        self.public_support = np.full(n, 0.55)
+        self.fairness_index = np.full(n, 0.55)
+        self.decision_locked = np.zeros(n, dtype=bool)
+        self.decision_option = np.full(n, -1, dtype=np.int64)
+
+def _clip(x):
+    return np.clip(x, 0.0, 1.0)
+
+def choose_actions(rng: np.random.Generator, role: str, n_options: int, round_idx: int, locked: np.ndarray) -> np.ndarray:
+    # vectorized policy.choose_action; returns n x 4 codes
+    n = locked.shape[0]
+    allow = allowed_actions()[role]
+    out = np.full((n, 4), -1, dtype=np.int64)
+
+    if role == "minister":
+        opt = rng.integers(0, n_options, n)
+        typ = np.full(n, A["SUMMARIZE"])
+        if round_idx >= 2:
+            typ[:] = A["CALL_VOTE"]
+        elif n_options >= 2:
+            a = rng.integers(0, n_options, n)
+            b = rng.integers(0, n_options - 1, n)
+            b = b + (b >= a)
+            comp = rng.random(n) < 0.35
+            typ[comp] = A["OFFER_COMPROMISE"]
+            out[comp, 1] = a[comp]
+            out[comp, 2] = b[comp]
+        typ[locked] = A["DECIDE"]
+        out[locked, 1] = opt[locked]
+        out[locked, 2] = -1
+        out[:, 0] = typ
+        return out
+
+    r = rng.random(n)
+    opt = rng.integers(0, n_options, n)
+    amend = rng.integers(0, len(AMENDMENTS), n)
+    conds, types = [], []
+    for t, hi in (("PROPOSE", 0.25), ("AMEND", 0.45), ("SUPPORT", 0.70), ("OPPOSE", 0.85), ("REQUEST_METRICS", 0.93)):
+        if t in allow:
+            conds.append(r < hi)
+            types.append(A[t])
+    fallback = A["ASK_QUESTION"] if "ASK_QUESTION" in allow else A["SUMMARIZE"]
+    typ = np.select(conds, types, default=fallback)
+    out[:, 0] = typ
+    has_opt = np.isin(typ, [A["PROPOSE"], A["AMEND"], A["SUPPORT"], A["OPPOSE"]])
+    out[has_opt, 1] = opt[has_opt]
+    is_amend = typ == A["AMEND"]
+    out[is_amend, 3] = amend[is_amend]
+    return out
+
+def transition(s: BatchState, ri: int, codes: np.ndarray, active: np.ndarray, coef: Dict[str, np.ndarray]):
+    # vectorized transition.transition for role index ri over active games
+    typ, opt, opt_b, amend = codes[:, 0], codes[:, 1], codes[:, 2], codes[:, 3]
+    rows = np.arange(typ.shape[0])
+
+    def bump(mask, col, delta):
+        idx = rows[mask]
+        s.support[idx, ri, col[mask]] = _clip(s.support[idx, ri, col[mask]] + delta)
+
+    m = active & (typ == A["SUPPORT"])
+    bump(m, opt, 0.15)
+    s.public_support[m] = _clip(s.public_support[m] + 0.02)
+    m = active & (typ == A["OPPOSE"])
+    bump(m, opt, -0.15)
+    s.public_support[m] = _clip(s.public_support[m] - 0.02)
+    m = active & (typ == A["PROPOSE"])
+    bump(m, opt, 0.10)
+    m = active & (typ == A["AMEND"])
+    bump(m, opt, 0.07)
+    sub = m & (amend == AMENDMENTS.index("subsidy"))
+    s.fairness_index[sub] = _clip(s.fairness_index[sub] + 0.06)
+    s.budget_remaining[sub] -= 0.05
+    ph = m & (amend == AMENDMENTS.index("phasing"))
+    s.public_support[ph] = _clip(s.public_support[ph] + 0.03)
+    mon = m & (amend == AMENDMENTS.index("monitoring_kpis"))
+    s.infrastructure_status[mon] = _clip(s.infrastructure_status[mon] + 0.03)
+    m = active & (typ == A["OFFER_COMPROMISE"])
+    bump(m, opt, 0.07)
+    bump(m, opt_b, 0.07)
+    s.public_support[m] = _clip(s.public_support[m] + 0.03)
+
+    # hard impacts of the option carried by the action
+    m = active & _WITH_OPTION[typ] & (opt >= 0)
+    o = opt[m]
+    s.budget_remaining[m] -= coef["cost"][o]
+    s.groundwater_risk[m] = _clip(s.groundwater_risk[m] - coef["water"][o] - coef["eco"][o])
+    s.public_support[m] = _clip(s.public_support[m] - coef["political"][o])
+    # scenario side effects (OptionEffects), only for options that have any
+    eff = coef["has_effect"][o]
+    q, o = rows[m][eff], o[eff]
+    s.restriction_level[q] = np.minimum(3, s.restriction_level[q] + coef["restrict"][o])
+    s.fairness_index[q] = _clip(s.fairness_index[q] + coef["fairness"][o])
+    s.public_support[q] = _clip(s.public_support[q] + coef["public"][o])
+    s.infrastructure_status[q] = _clip(s.infrastructure_status[q] + coef["infra"][o])
+    s.budget_remaining[q] += coef["budget"][o]
+
+    m = active & (s.budget_remaining < 0)
+    s.economic_stress[m] = _clip(s.economic_stress[m] + 0.08)
+    s.public_support[m] = _clip(s.public_support[m] - 0.05)
+
+def option_scores(s: BatchState) -> np.ndarray:
+    sup = np.zeros(s.support.shape[::2])
+    for ri, w in enumerate(SCORE_WEIGHTS):
+        sup = sup + w * s.support[:, ri, :]
+    feasibility = _clip(0.6 * _clip(s.budget_remaining) + 0.4 * s.infrastructure_status)
+    return _clip(0.75 * sup + 0.25 * feasibility[:, None])
+
+def call_vote(s: BatchState, active: np.ndarray) -> np.ndarray:
+    scores = option_scores(s)
+    best_idx = np.argmax(scores, axis=1)
+    best = scores[np.arange(scores.shape[0]), best_idx]
+    lock = active & (best >= 0.65)
+    s.decision_locked[lock] = True
+    s.decision_option[lock] = best_idx[lock]
+    return best_idx
+
+def utilities(s: BatchState) -> np.ndarray:
+    budget = _clip(s.budget_remaining)
+    water_safety = _clip(1.0 - s.groundwater_risk)
+    fairness = _clip(s.fairness_index)
+    public = _clip(s.public_support)
+    econ = _clip(1.0 - s.economic_stress)
+    infra = _clip(s.infrastructure_status)
+    restrict = _clip(1.0 - (s.restriction_level / 3.0))
+
+    u = {
+        "farmer": _clip(0.40 * restrict + 0.30 * econ + 0.15 * fairness + 0.15 * public),
+        "environment": _clip(0.60 * water_safety + 0.20 * infra + 0.20 * (1.0 - restrict)),
+        "citizen": _clip(0.35 * fairness + 0.35 * public + 0.30 * econ),
+        "water_minister": _clip(0.35 * water_safety + 0.25 * infra + 0.20 * budget + 0.20 * public),
+        "minister": _clip(0.35 * public + 0.25 * fairness + 0.25 * water_safety + 0.15 * budget),
+    }
+    return np.stack([u[r] for r in ROLE_ORDER], axis=1)
+
+def option_coefficients(options: List[PolicyOption], table: Optional[OptionTable] = None) -> Dict[str, np.ndarray]:
+    # the scalar engine's OptionTable as arrays
+    tab = table if table is not None else OptionTable(options)
+    return {
+        "cost": np.array(tab.cost),
+        "water": np.array(tab.water),
+        "eco": np.array(tab.eco),
+        "political": np.array(tab.political),
+        "restrict": np.array(tab.restrict, dtype=np.int64),
+        "fairness": np.array(tab.fairness),
+        "public": np.array(tab.public),
+        "infra": np.array(tab.infra),
+        "budget": np.array(tab.budget),
+        "has_effect": np.array(tab.has_effect, dtype=bool),
+    }
+
+def _play_chunk(rng: np.random.Generator, n: int, rounds: int, options: List[PolicyOption], coef, record: bool):
+    s = BatchState(n, len(options))
+    active = np.ones(n, dtype=bool)
+    turns = np.zeros(n, dtype=np.int64)
+    log = []
+
+    for r in range(1, rounds + 1):
+        for ri, role in enumerate(ROLE_ORDER):
+            codes = choose_actions(rng, role, len(options), r, s.decision_locked)
+            transition(s, ri, codes, active, coef)
+            turns += active
+            if record:
+                played = codes.copy()
+                played[~active] = -1
+                log.append(played)
+            if role == "minister":
+                dec = active & (codes[:, 0] == A["DECIDE"])
+                s.decision_locked[dec] = True
+                s.decision_option[dec] = codes[dec, 1]
+                active &= ~dec
+        call_vote(s, active)
+
+    best = call_vote(s, active)
+    undecided = active & (s.decision_option < 0)
+    s.decision_option[undecided] = best[undecided]
+    acts = np.stack(log) if record else None
+    return utilities(s), s.decision_option.copy(), turns, acts
+
+def run_batch(n_games: int, rounds: int = 2, seed: Optional[int] = None,
+              options: Optional[List[PolicyOption]] = None, chunk_size: int = 100_000,
+              record: bool = False) -> BatchResult:
+    if options is None:
+        from ..scenario.defaults import default_options
+        options = default_options()
+    rng = np.random.default_rng(seed)
+    coef = option_coefficients(options)
+
+    parts = []
+    for start in range(0, n_games, chunk_size):
+        parts.append(_play_chunk(rng, min(chunk_size, n_games - start), rounds, options, coef, record))
+
+    acts = None
+    if record:
+        acts = np.concatenate([p[3] for p in parts], axis=1)
+    return BatchResult(
+        option_ids=[o.id for o in options],
+        utilities=np.concatenate([p[0] for p in parts]),
+        decision=np.concatenate([p[1] for p in parts]),
+        turns=np.concatenate([p[2] for p in parts]),
+        actions=acts,
+    )
+
+def decode_action(codes, option_ids: List[str]) -> Action:
+    typ, opt, opt_b, amend = (int(c) for c in codes)
+    a = Action(type=ACTION_TYPES[typ])
+    if a.type == "OFFER_COMPROMISE":
+        a.option_id_a, a.option_id_b = option_ids[opt], option_ids[opt_b]
+    elif opt >= 0:
+        a.option_id = option_ids[opt]
+    if amend >= 0:
+        a.amendment_type = AMENDMENTS[amend]
+    return a
+
+def payoff_distribution(res: BatchResult) -> Dict:
+    pct = [5, 25, 50, 75, 95]
+    out = {"games": int(res.utilities.shape[0]), "utilities": {}, "decisions": {}}
+    for ri, role in enumerate(ROLE_ORDER):
+        u = res.utilities[:, ri]
+        q = np.percentile(u, pct)
+        out["utilities"][role] = {
+            "mean": float(u.mean()), "std": float(u.std()),
+            **{f"p{p}": float(v) for p, v in zip(pct, q)},
+        }
+    counts = np.bincount(res.decision, minlength=len(res.option_ids))
+    out["decisions"] = {oid: int(c) for oid, c in zip(res.option_ids, counts)}
+    out["mean_turns"] = float(res.turns.mean())
+    return out
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    ap = argparse.ArgumentParser(description="Rules-only Monte Carlo rollouts")
+    ap.add_argument("--games", type=int, default=100_000)
+    ap.add_argument("--rounds", type=int, default=2)
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+
+    t0 = time.perf_counter()
+    res = run_batch(args.games, rounds=args.rounds, seed=args.seed)
+    dt = time.perf_counter() - t0
+    out = payoff_distribution(res)
+    out["seconds"] = round(dt, 3)
+    out["games_per_sec"] = round(args.games / dt)
+    print(json.dumps(out, indent=2))
@@ -0,0 +1,235 @@
+import asyncio
+import math
+import multiprocessing as mp
+import os
+import random
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+from .actions import AMENDMENTS, Action, RoleID, allowed_actions
+from .state import SimState, ROLE_INDEX
+from .transition import transition, call_vote, top_options
+from .utilities import utilities
+from ..roles import ROLE_ORDER
+
+# Lookahead policy: UCT search over the rules-only simulator (transition,
+# call_vote, utilities on SimState copies). Every role in the tree picks the
+# action that is best for its own utility (max^n); leaves are scored with
+# utilities() after a random playout. Judge fusion is an LLM call and is not
+# modelled.
+POLICY_BUDGET_MS = float(os.getenv("POLICY_BUDGET_MS", "3"))
+# seeded sessions search a fixed number of iterations so they stay reproducible
+POLICY_SEARCH_ITERS = int(os.getenv("POLICY_SEARCH_ITERS", "400"))
+POLICY_HORIZON = int(os.getenv("POLICY_HORIZON", "5"))
+# 0 runs the search inline on the event loop
+POLICY_WORKERS = int(os.getenv("POLICY_WORKERS", "2"))
+POLICY_UCB_C = float(os.getenv("POLICY_UCB_C", "0.05"))
+# large scenarios: the tree only branches over the best-scoring options at the root
+POLICY_TOP_K = int(os.getenv("POLICY_TOP_K", "8"))
+
+# actions with no effect on the state; the search treats them as one "pass"
+NO_EFFECT = ["SUMMARIZE", "RAISE_RISK", "ASK_QUESTION", "REQUEST_METRICS", "CALL_VOTE", "DEMAND_COMPENSATION"]
+
+@lru_cache(maxsize=64)
+def candidate_actions(role: RoleID, option_ids: Tuple[str, ...]) -> Tuple[Action, ...]:
+    # one Action per distinct effect; index 0 is the pass move. Built once and
+    # shared, transition() never mutates an Action.
+    allow = allowed_actions()[role]
+    out = [Action(type="CALL_VOTE") if role == "minister" else Action(type="SUMMARIZE")]
+    for t in ("PROPOSE", "SUPPORT", "OPPOSE"):
+        if t in allow:
+            out.extend(Action(type=t, option_id=o) for o in option_ids)
+    if "AMEND" in allow:
+        out.extend(Action(type="AMEND", option_id=o, amendment_type=am) for o in option_ids for am in AMENDMENTS)
+    if "OFFER_COMPROMISE" in allow:
+        out.extend(Action(type="OFFER_COMPROMISE", option_id_a=a, option_id_b=b)
+                   for i, a in enumerate(option_ids) for b in option_ids[i + 1:])
+    if "DECIDE" in allow:
+        out.extend(Action(type="DECIDE", option_id=o) for o in option_ids)
+    return tuple(out)
+
+@lru_cache(maxsize=256)
+def _legal(role: RoleID, option_ids: Tuple[str, ...], locked: bool) -> List[int]:
+    # DECIDE ends the game; like the baseline policy, only once a vote has locked a decision
+    return [i for i, a in enumerate(candidate_actions(role, option_ids)) if a.type != "DECIDE" or locked]
+
+def legal(s: SimState, role: RoleID) -> List[int]:
+    return _legal(role, search_options(s), s.decision_locked)
+
+def search_options(s: SimState, k: int = POLICY_TOP_K) -> Tuple[str, ...]:
+    # every option when there are few, else the k currently scoring best
+    if len(s.option_ids) <= k:
+        return tuple(s.option_ids)
+    return tuple(s.option_ids[i] for i in top_options(s, k))
+
+def state_key(s: SimState, turn: int, cols: Optional[List[int]] = None) -> int:
+    # scalars quantized to 1e-6 so the same moves in a different order land on
+    # the same entry despite float rounding. cols: the only support columns the
+    # search can change (the rest are equal in every node)
+    sup = s.support if cols is None else [[row[i] for i in cols] for row in s.support]
+    return hash((
+        turn, s.round_idx, s.restriction_level, s.decision_locked,
+        int(s.budget_remaining * 1e6), int(s.groundwater_risk * 1e6), int(s.economic_stress * 1e6),
+        int(s.public_support * 1e6), int(s.fairness_index * 1e6), int(s.infrastructure_status * 1e6),
+        *[int(x * 1e6) for row in sup for x in row],
+    ))
+
+class _Node:
+    __slots__ = ("n", "acts", "untried", "child_n", "child_w")
+
+    def __init__(self, acts: List[int]):
+        self.n = 0
+        self.acts = acts
+        self.untried = list(range(len(acts)))
+        self.child_n = [0] * len(acts)
+        self.child_w = [0.0] * len(acts)
+
+    def select(self, c: float, rng: random.Random) -> int:
+        u = self.untried
+        if u:
+            # random untried move: swap it to the end and pop
+            i = rng.randrange(len(u))
+            u[i], u[-1] = u[-1], u[i]
+            return u.pop()
+        log_n = math.log(self.n)
+        sqrt = math.sqrt
+        best, best_k = -1.0, 0
+        k = 0
+        for n, w in zip(self.child_n, self.child_w):
+            v = w / n + c * sqrt(log_n / n)
+            if v > best:
+                best, best_k = v, k
+            k += 1
+        return best_k
+
+def _step(s: SimState, turn: int, role: RoleID, a: Action, rounds: int) -> Tuple[int, bool]:
+    # one turn of the orchestrator's loop; returns (next turn, game over)
+    transition(s, role, a)
+    if role == "minister":
+        if a.type == "DECIDE":
+            return turn + 1, True
+        call_vote(s)
+        s.round_idx += 1
+        if s.round_idx > rounds:
+            return turn + 1, True
+    return turn + 1, False
+
+def search(s: SimState, role: RoleID, rounds: int, budget_ms: float = POLICY_BUDGET_MS,
+           max_iters: Optional[int] = None, seed: Optional[int] = None,
+           horizon: int = POLICY_HORIZON, c: float = POLICY_UCB_C) -> Tuple[int, Dict]:
+    # returns (index into candidate_actions(role, ...), search stats). With
+    # max_iters the budget is an iteration count, otherwise wall-clock time.
+    rng = random.Random(seed)
+    option_ids = search_options(s)
+    cols = None if len(option_ids) == len(s.option_ids) else [s.option_index[o] for o in option_ids]
+    cands = {r: candidate_actions(r, option_ids) for r in ROLE_ORDER}
+    moves = {(r, locked): _legal(r, option_ids, locked) for r in ROLE_ORDER for locked in (False, True)}
+    start = ROLE_INDEX[role]
+    table: Dict[int, _Node] = {}
+    deadline = time.perf_counter() + budget_ms / 1000.0
+    iters = 0
+    hits = 0
+
+    root = _Node(moves[role, s.decision_locked])
+    table[state_key(s, 0, cols)] = root
+
+    while True:
+        if max_iters is not None:
+            if iters >= max_iters:
+                break
+        elif iters and time.perf_counter() >= deadline:
+            break
+        iters += 1
+
+        x = s.copy()
+        turn, over = 0, False
+        node = root
+        path: List[Tuple[_Node, int, str]] = []
+        # selection / expansion through the table
+        while node is not None and not over and turn < horizon:
+            r = ROLE_ORDER[(start + turn) % len(ROLE_ORDER)]
+            k = node.select(c, rng)
+            path.append((node, k, r))
+            turn, over = _step(x, turn, r, cands[r][node.acts[k]], rounds)
+            if over or turn >= horizon:
+                break
+            key = state_key(x, turn, cols)
+            nxt = table.get(key)
+            if nxt is None:
+                nr = ROLE_ORDER[(start + turn) % len(ROLE_ORDER)]
+                table[key] = _Node(moves[nr, x.decision_locked])
+                break
+            hits += 1
+            node = nxt
+        # random playout to the horizon
+        while not over and turn < horizon:
+            r = ROLE_ORDER[(start + turn) % len(ROLE_ORDER)]
+            a = cands[r][rng.choice(moves[r, x.decision_locked])]
+            turn, over = _step(x, turn, r, a, rounds)
+
+        u = utilities(x)
+        for nd, k, r in path:
+            nd.n += 1
+            nd.child_n[k] += 1
+            nd.child_w[k] += u[r]
+
+    k = max(range(len(root.acts)), key=lambda i: (root.child_n[i], root.child_w[i]))
+    value = root.child_w[k] / root.child_n[k] if root.child_n[k] else 0.0
+    return root.acts[k], {"iterations": iters, "nodes": len(table), "tt_hits": hits, "value": round(value, 4)}
+
+def pass_action(role: RoleID, option_ids: List[str], round_idx: int, rng=random) -> Action:
+    # the search only knows "no effect"; pick a concrete one so the dialogue keeps some variety
+    allow = [t for t in allowed_actions()[role] if t in NO_EFFECT]
+    t = rng.choice(allow)
+    if role == "minister" and round_idx >= 2 and "CALL_VOTE" in allow:
+        t = "CALL_VOTE"
+    if t == "RAISE_RISK":
+        return Action(type=t, risk_type=rng.choice(["ecological", "economic", "political", "implementation"]))
+    if t == "ASK_QUESTION":
+        return Action(type=t, target_role="minister", question_type=rng.choice(["feasibility", "fairness", "metrics"]))
+    if t == "REQUEST_METRICS":
+        return Action(type=t, kpi=rng.choice(["consumption", "groundwater", "leak_rate", "prices"]))
+    if t == "DEMAND_COMPENSATION":
+        return Action(type=t, compensation_level=rng.choice(["low", "mid", "high"]))
+    return Action(type=t)
+
+_POOL: Optional[Executor] = None
+
+def _warm() -> int:
+    return os.getpid()
+
+def start_pool() -> Optional[Executor]:
+    # the workers are only spawned for a process that runs lookahead sessions: when the
+    # first one starts, so their imports are done before its first turn
+    global _POOL
+    if _POOL is None and POLICY_WORKERS > 0:
+        _POOL = ProcessPoolExecutor(max_workers=POLICY_WORKERS, mp_context=mp.get_context("spawn"))
+        for _ in range(POLICY_WORKERS):
+            _POOL.submit(_warm)
+    return _POOL
+
+def shutdown_pool():
+    global _POOL
+    if _POOL is not None:
+        _POOL.shutdown(wait=True, cancel_futures=True)
+        _POOL = None
+
+async def choose_action_lookahead(s: SimState, role: RoleID, rounds: int, rng=random,
+                                  deterministic: bool = False, meta: Optional[Dict] = None) -> Action:
+    seed = rng.getrandbits(32)
+    max_iters = POLICY_SEARCH_ITERS if deterministic else None
+    pool = start_pool()
+    t0 = time.perf_counter()
+    if pool is None:
+        k, info = search(s, role, rounds, max_iters=max_iters, seed=seed)
+    else:
+        k, info = await asyncio.get_running_loop().run_in_executor(
+            pool, search, s, role, rounds, POLICY_BUDGET_MS, max_iters, seed)
+    if meta is not None:
+        meta.update(info)
+        meta["search_ms"] = round((time.perf_counter() - t0) * 1000.0, 3)
+    if k == 0:
+        return pass_action(role, s.option_ids, s.round_idx, rng)
+    return candidate_actions(role, search_options(s))[k]
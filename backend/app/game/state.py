@@ -1,6 +1,22 @@
 from pydantic import BaseModel, Field
 from typing import Dict, List, Optional
 from .actions import RoleID
+from ..roles import ROLE_ORDER
+
+ROLE_INDEX: Dict[str, int] = {r: i for i, r in enumerate(ROLE_ORDER)}
+
+# Weighted support across non-chair roles, indexed like ROLE_INDEX
+SCORE_WEIGHTS = [0.22, 0.22, 0.22, 0.22, 0.12]
+
+class OptionEffects(BaseModel):
+    # side effects applied each time an action carries the option
+    restriction: int = Field(default=0, ge=0, le=3)
+    fairness: float = Field(default=0.0, ge=-1.0, le=1.0)
+    public_support: float = Field(default=0.0, ge=-1.0, le=1.0)
+    infrastructure: float = Field(default=0.0, ge=-1.0, le=1.0)
+    budget: float = Field(default=0.0, ge=-1.0, le=1.0)
+
+_NO_EFFECTS = OptionEffects()
 
 class PolicyOption(BaseModel):
     id: str
@@ -11,6 +27,33 @@ class PolicyOption(BaseModel):
     water_saving: float = Field(ge=0.0, le=1.0)
     political_risk: float = Field(ge=0.0, le=1.0)
     eco_benefit: float = Field(ge=0.0, le=1.0)
+    effects: OptionEffects = Field(default_factory=OptionEffects)
+
+class OptionTable:
+    # Per-option coefficients compiled once per option set; transition() reads
+    # them by option index instead of going through the PolicyOption models.
+    __slots__ = ("ids", "index", "cost", "water", "eco", "political",
+                 "restrict", "fairness", "public", "infra", "budget", "has_effect")
+
+    def __init__(self, options: List[PolicyOption]):
+        self.ids = [o.id for o in options]
+        self.index = {oid: i for i, oid in enumerate(self.ids)}
+        self.cost = [0.03 * o.capex_cost + 0.02 * o.opex_cost for o in options]
+        self.water = [0.04 * o.water_saving for o in options]
+        self.eco = [0.03 * o.eco_benefit for o in options]
+        self.political = [0.03 * o.political_risk for o in options]
+        self.restrict = [o.effects.restriction for o in options]
+        self.fairness = [o.effects.fairness for o in options]
+        self.public = [o.effects.public_support for o in options]
+        self.infra = [o.effects.infrastructure for o in options]
+        self.budget = [o.effects.budget for o in options]
+        self.has_effect = [o.effects != _NO_EFFECTS for o in options]
+
+def weighted_support(support: List[List[float]], oi: int) -> float:
+    sup = 0
+    for w, row in zip(SCORE_WEIGHTS, support):
+        sup += w * row[oi]
+    return sup
 
 class GameState(BaseModel):
     t: int = 0
@@ -44,7 +87,107 @@ def init_support(options: List[PolicyOption]) -> Dict[RoleID, Dict[str, float]]:
         "minister": dict(base),
     }
 
-def init_state(topic: str, options: List[PolicyOption]) -> GameState:
-    s = GameState(topic=topic, options=options)
-    s.support = init_support(options)
-    return s
+# Internal hot-path representation. GameState (pydantic) is only built at the
+# API/serialization edge; the game loop mutates this slotted object instead.
+# support is a roles x options list of lists indexed by ROLE_INDEX / option_index;
+# score_sum[oi] is the SCORE_WEIGHTS-weighted support of option oi, kept up to
+# date on every support change so scoring never scans all roles x options.
+class SimState:
+    __slots__ = (
+        "t", "round_idx", "speaker", "topic", "options", "option_ids", "option_index", "support",
+        "budget_remaining", "infrastructure_status", "restriction_level", "groundwater_risk",
+        "economic_stress", "public_support", "fairness_index", "decision_locked", "decision_option",
+        "table", "score_sum", "_options_dump",
+    )
+
+    def __init__(self, topic: str, options: List[PolicyOption], table: Optional[OptionTable] = None):
+        self.t = 0
+        self.round_idx = 1
+        self.speaker = "water_minister"
+        self.topic = topic
+        self.options = options
+        self.table = table if table is not None else OptionTable(options)
+        self.option_ids = self.table.ids
+        self.option_index = self.table.index
+        self.support = [[0.25] * len(options) for _ in ROLE_ORDER]
+        self.score_sum = [weighted_support(self.support, 0)] * len(options) if options else []
+        self.budget_remaining = 1.0
+        self.infrastructure_status = 0.5
+        self.restriction_level = 0
+        self.groundwater_risk = 0.6
+        self.economic_stress = 0.4
+        self.public_support = 0.55
+        self.fairness_index = 0.55
+        self.decision_locked = False
+        self.decision_option = None
+        self._options_dump = None
+
+    def copy(self) -> "SimState":
+        # spelled out rather than looping over __slots__: this is the search's hot path
+        c = SimState.__new__(SimState)
+        c.t = self.t
+        c.round_idx = self.round_idx
+        c.speaker = self.speaker
+        c.topic = self.topic
+        c.options = self.options
+        c.option_ids = self.option_ids
+        c.option_index = self.option_index
+        c.support = [row[:] for row in self.support]
+        c.table = self.table
+        c.score_sum = self.score_sum[:]
+        c.budget_remaining = self.budget_remaining
+        c.infrastructure_status = self.infrastructure_status
+        c.restriction_level = self.restriction_level
+        c.groundwater_risk = self.groundwater_risk
+        c.economic_stress = self.economic_stress
+        c.public_support = self.public_support
+        c.fairness_index = self.fairness_index
+        c.decision_locked = self.decision_locked
+        c.decision_option = self.decision_option
+        c._options_dump = self._options_dump
+        return c
+
+    def support_of(self, role: str, option_id: str) -> float:
+        return self.support[ROLE_INDEX[role]][self.option_index[option_id]]
+
+    def snapshot(self) -> Dict:
+        # same shape as GameState.model_dump(); option dumps are immutable and built once
+        if self._options_dump is None:
+            self._options_dump = [o.model_dump() for o in self.options]
+        ids = self.option_ids
+        return {
+            "t": self.t,
+            "round_idx": self.round_idx,
+            "speaker": self.speaker,
+            "topic": self.topic,
+            "options": list(self._options_dump),
+            "support": {r: dict(zip(ids, row)) for r, row in zip(ROLE_ORDER, self.support)},
+            "budget_remaining": self.budget_remaining,
+            "infrastructure_status": self.infrastructure_status,
+            "restriction_level": self.restriction_level,
+            "groundwater_risk": self.groundwater_risk,
+            "economic_stress": self.economic_stress,
+            "public_support": self.public_support,
+            "fairness_index": self.fairness_index,
+            "decision_locked": self.decision_locked,
+            "decision_option": self.decision_option,
+        }
+
+    def to_model(self) -> GameState:
+        return GameState.model_validate(self.snapshot())
+
+    @classmethod
+    def from_model(cls, gs: GameState) -> "SimState":
+        s = cls(gs.topic, list(gs.options))
+        for k in ("t", "round_idx", "speaker", "budget_remaining", "infrastructure_status",
+                  "restriction_level", "groundwater_risk", "economic_stress", "public_support",
+                  "fairness_index", "decision_locked", "decision_option"):
+            setattr(s, k, getattr(gs, k))
+        for r, row in gs.support.items():
+            for oid, v in row.items():
+                s.support[ROLE_INDEX[r]][s.option_index[oid]] = v
+        s.score_sum = [weighted_support(s.support, oi) for oi in range(len(s.option_ids))]
+        return s
+
+def init_state(topic: str, options: List[PolicyOption], table: Optional[OptionTable] = None) -> SimState:
+    return SimState(topic, options, table)
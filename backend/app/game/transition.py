@@ -1,20 +1,36 @@
-from typing import Optional
-from .state import GameState
+import heapq
+from typing import List, Optional
+from .state import SimState, ROLE_INDEX, weighted_support
 from .actions import Action
 
 def clamp(x: float, lo: float = 0.0, hi: float = 1.0) -> float:
     return lo if x < lo else hi if x > hi else x
 
-def apply_support_delta(s: GameState, role: str, option_id: str, delta: float):
-    s.support[role][option_id] = clamp(s.support[role][option_id] + delta)
+def apply_support_delta(s: SimState, role: str, option_id: str, delta: float):
+    row = s.support[ROLE_INDEX[role]]
+    oi = s.option_index[option_id]
+    row[oi] = clamp(row[oi] + delta)
+    s.score_sum[oi] = weighted_support(s.support, oi)
 
-def option_by_id(s: GameState, option_id: str):
-    for o in s.options:
-        if o.id == option_id:
-            return o
-    return None
+def option_by_id(s: SimState, option_id: str):
+    oi = s.option_index.get(option_id)
+    return None if oi is None else s.options[oi]
 
-def transition(s: GameState, role: str, a: Action) -> GameState:
+def apply_option_effects(s: SimState, oi: int):
+    # scenario-defined side effects of the option (OptionEffects)
+    tab = s.table
+    if tab.restrict[oi]:
+        s.restriction_level = min(3, s.restriction_level + tab.restrict[oi])
+    if tab.fairness[oi]:
+        s.fairness_index = clamp(s.fairness_index + tab.fairness[oi])
+    if tab.public[oi]:
+        s.public_support = clamp(s.public_support + tab.public[oi])
+    if tab.infra[oi]:
+        s.infrastructure_status = clamp(s.infrastructure_status + tab.infra[oi])
+    if tab.budget[oi]:
+        s.budget_remaining += tab.budget[oi]
+
+def transition(s: SimState, role: str, a: Action) -> SimState:
     # Support / debate dynamics
     if a.type == "SUPPORT" and a.option_id:
         apply_support_delta(s, role, a.option_id, 0.15)
@@ -40,18 +56,18 @@ def transition(s: GameState, role: str, a: Action) -> GameState:
 
     # Hard impacts when a proposal is pushed often (simple proxy)
     if a.option_id:
-        o = option_by_id(s, a.option_id)
-        if o:
+        oi = s.option_index.get(a.option_id)
+        if oi is not None:
+            tab = s.table
             # Costs
-            s.budget_remaining -= (0.03 * o.capex_cost + 0.02 * o.opex_cost)
+            s.budget_remaining -= tab.cost[oi]
             # Benefits
-            s.groundwater_risk = clamp(s.groundwater_risk - 0.04 * o.water_saving - 0.03 * o.eco_benefit)
+            s.groundwater_risk = clamp(s.groundwater_risk - tab.water[oi] - tab.eco[oi])
             # Political risk hits public support
-            s.public_support = clamp(s.public_support - 0.03 * o.political_risk)
+            s.public_support = clamp(s.public_support - tab.political[oi])
 
-            if o.id == "quotas_enforce":
-                s.restriction_level = min(3, s.restriction_level + 1)
-                s.fairness_index = clamp(s.fairness_index - 0.05)
+            if tab.has_effect[oi]:
+                apply_option_effects(s, oi)
 
     # Budget deficit -> economic stress / feasibility perceptions
     if s.budget_remaining < 0:
@@ -60,33 +76,44 @@ def transition(s: GameState, role: str, a: Action) -> GameState:
 
     return s
 
-def compute_option_score(s: GameState, option_id: str) -> float:
-    # Weighted support across non-chair roles
-    w = {
-        "water_minister": 0.22,
-        "farmer": 0.22,
-        "environment": 0.22,
-        "citizen": 0.22,
-        "minister": 0.12,
-    }
-    sup = sum(w[r] * s.support[r].get(option_id, 0.0) for r in w)
-    o = option_by_id(s, option_id)
-    if not o:
-        return sup
+def feasibility(s: SimState) -> float:
     # feasibility proxy: budget + infra
-    feasibility = clamp(0.6 * clamp(s.budget_remaining) + 0.4 * s.infrastructure_status)
-    return clamp(0.75 * sup + 0.25 * feasibility)
+    return clamp(0.6 * clamp(s.budget_remaining) + 0.4 * s.infrastructure_status)
+
+def option_score(weighted: float, feas: float) -> float:
+    # an option's vote score from its weighted support and the state's feasibility;
+    # batch.option_scores computes the same, so ties fall the same way
+    return clamp(0.75 * weighted + 0.25 * feas)
+
+def compute_option_score(s: SimState, option_id: str) -> float:
+    oi = s.option_index.get(option_id)
+    if oi is None:
+        return 0.0
+    return option_score(s.score_sum[oi], feasibility(s))
+
+def top_options(s: SimState, k: int) -> List[int]:
+    # indices of the k best-scoring options, in option order; equal scores go to
+    # the earlier option, as in call_vote
+    n = len(s.score_sum)
+    if k >= n:
+        return list(range(n))
+    f = feasibility(s)
+    scores = [option_score(w, f) for w in s.score_sum]
+    return sorted(heapq.nlargest(k, range(n), key=scores.__getitem__))
 
-def call_vote(s: GameState) -> Optional[str]:
-    best_id = None
-    best = -1.0
-    for o in s.options:
-        sc = compute_option_score(s, o.id)
-        if sc > best:
-            best = sc
-            best_id = o.id
+def call_vote(s: SimState) -> Optional[str]:
+    ws = s.score_sum
+    if not ws:
+        return None
+    # first option with the highest score. The first-max tie-break is required for parity
+    # with batch.call_vote (np.argmax): options whose supports differ by a rounding, or are
+    # clamped alike, score the same, and the earlier one must win
+    f = feasibility(s)
+    scores = [option_score(w, f) for w in ws]
+    best = max(scores)
+    best_id = s.option_ids[scores.index(best)]
     # lock if sufficiently strong
-    if best_id and best >= 0.65:
+    if best >= 0.65:
         s.decision_locked = True
         s.decision_option = best_id
     return best_id
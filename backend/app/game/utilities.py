@@ -1,11 +1,11 @@
 from typing import Dict
-from .state import GameState
+from .state import SimState
 from .actions import RoleID
 
 def clamp(x: float, lo: float = 0.0, hi: float = 1.0) -> float:
     return lo if x < lo else hi if x > hi else x
 
-def utilities(s: GameState) -> Dict[RoleID, float]:
+def utilities(s: SimState) -> Dict[RoleID, float]:
     # normalize a few proxies
     budget = clamp(s.budget_remaining)
     water_safety = clamp(1.0 - s.groundwater_risk)
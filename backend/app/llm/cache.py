@@ -0,0 +1,153 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+# Content-addressed cache for LLM responses.
+#   off          - never consulted
+#   read_through - serve hits, call the model on a miss and store the result
+#   replay_only  - serve hits, fail on a miss (reruns sessions without a model server)
+LLM_CACHE_MODE = os.getenv("LLM_CACHE_MODE", "off")
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", "llm_cache.sqlite3")
+LLM_CACHE_MEMORY_ITEMS = int(os.getenv("LLM_CACHE_MEMORY_ITEMS", "512"))
+
+CACHE_MODES = ("off", "read_through", "replay_only")
+
+class CacheMissError(RuntimeError):
+    pass
+
+def cache_key(kind: str, model: str, messages: List[Dict[str, str]], temperature: float, seed: Optional[int],
+              options: Optional[Dict] = None, fmt: Any = None) -> str:
+    req = {"kind": kind, "model": model, "messages": messages, "temperature": temperature, "seed": seed}
+    if options:
+        # only when set, so keys recorded before generation options existed still match
+        req["options"] = options
+    if fmt is not None:
+        req["format"] = fmt
+    blob = json.dumps(req, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+class ResponseCache:
+    def __init__(self, mode: str = LLM_CACHE_MODE, path: str = LLM_CACHE_PATH, max_items: int = LLM_CACHE_MEMORY_ITEMS):
+        if mode not in CACHE_MODES:
+            raise ValueError(f"unknown LLM cache mode: {mode}")
+        self.mode = mode
+        self.path = path
+        self.max_items = max_items
+        self.memory: "OrderedDict[str, Any]" = OrderedDict()
+        # the disk tier is only touched off the event loop: lookups on the reader connection
+        # (one at a time), writes batched and committed on their own connection
+        self.db: Optional[sqlite3.Connection] = None
+        self.reading = threading.Lock()
+        self.writer: Optional[sqlite3.Connection] = None
+        self.pending: Dict[str, Tuple[str, str, float]] = {}
+        self.writing: Dict[str, Tuple[str, str, float]] = {}  # the batch being committed
+        self.flusher: Optional[asyncio.Task] = None
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "writes": 0, "commits": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode != "off"
+
+    def _open(self, **kw) -> sqlite3.Connection:
+        db = sqlite3.connect(self.path, **kw)
+        db.execute("CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, kind TEXT, value TEXT, created REAL)")
+        return db
+
+    def _read(self, key: str) -> Optional[Tuple[str]]:
+        # runs in a worker thread
+        with self.reading:
+            if self.db is None:
+                self.db = self._open(check_same_thread=False)
+            return self.db.execute("SELECT value FROM responses WHERE key = ?", (key,)).fetchone()
+
+    async def get(self, key: str) -> Optional[Any]:
+        if key in self.memory:
+            self.memory.move_to_end(key)
+            self.stats["memory_hits"] += 1
+            return self.memory[key]
+        unsaved = self.pending.get(key) or self.writing.get(key)
+        if unsaved is not None:
+            # written, not committed yet
+            value = json.loads(unsaved[1])
+            self._remember(key, value)
+            return value
+        row = await asyncio.to_thread(self._read, key) if self.path else None
+        if row is None:
+            self.stats["misses"] += 1
+            return None
+        self.stats["disk_hits"] += 1
+        value = json.loads(row[0])
+        self._remember(key, value)
+        return value
+
+    def put(self, key: str, kind: str, value: Any):
+        self._remember(key, value)
+        self.stats["writes"] += 1
+        if not self.path:
+            return
+        self.pending[key] = (kind, json.dumps(value, ensure_ascii=False), time.time())
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            # no event loop (a script): write right away
+            self._write(self._take())
+            return
+        if self.flusher is None:
+            self.flusher = asyncio.create_task(self._flush())
+
+    def _take(self) -> List[Tuple[str, str, str, float]]:
+        self.writing = self.pending
+        self.pending = {}
+        return [(k, kind, v, t) for k, (kind, v, t) in self.writing.items()]
+
+    def _write(self, batch: List[Tuple[str, str, str, float]]):
+        # one transaction per batch; runs in a worker thread while the loop is up
+        if self.writer is None:
+            self.writer = self._open(check_same_thread=False)
+        self.writer.executemany("INSERT OR REPLACE INTO responses (key, kind, value, created) VALUES (?, ?, ?, ?)", batch)
+        self.writer.commit()
+        self.writing = {}
+        self.stats["commits"] += 1
+
+    async def _flush(self):
+        # whatever was put while the previous batch was being written goes in the next one
+        try:
+            while self.pending:
+                await asyncio.to_thread(self._write, self._take())
+        finally:
+            self.flusher = None
+
+    def _remember(self, key: str, value: Any):
+        self.memory[key] = value
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.max_items:
+            self.memory.popitem(last=False)
+
+    async def close(self):
+        if self.flusher is not None:
+            await asyncio.wait([self.flusher])
+        if self.pending:
+            self._write(self._take())
+        with self.reading:
+            for db in (self.db, self.writer):
+                if db is not None:
+                    db.close()
+            self.db = self.writer = None
+
+    def snapshot(self) -> Dict[str, Any]:
+        hits = self.stats["memory_hits"] + self.stats["disk_hits"]
+        total = hits + self.stats["misses"]
+        return {
+            "mode": self.mode,
+            "memory_items": len(self.memory),
+            **self.stats,
+            "hit_ratio": round(hits / total, 4) if total else 0.0,
+        }
+
+CACHE = ResponseCache()
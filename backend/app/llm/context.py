@@ -0,0 +1,136 @@
+import asyncio
+import math
+import os
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+from .ollama_client import chat_json
+from .render import TAIL_BLOCK, build_render_messages
+from ..game.actions import Action, RoleID
+from ..game.state import SimState
+from ..roles import ROLES
+
+# Keeps render prompts inside a token budget however long the session runs:
+# older rounds are folded into a rolling summary (refreshed in the background),
+# recent turns are sent in full, over-long turns are clipped, and generation is
+# capped with num_predict / stop. Token counts are local estimates, no tokenizer.
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1536"))
+CONTEXT_TURN_MAX_TOKENS = int(os.getenv("CONTEXT_TURN_MAX_TOKENS", "320"))
+# "4-8 sentences" is roughly 80-250 tokens
+RENDER_NUM_PREDICT = int(os.getenv("RENDER_NUM_PREDICT", "320"))
+SUMMARY_NUM_PREDICT = int(os.getenv("SUMMARY_NUM_PREDICT", "200"))
+
+CHARS_PER_TOKEN = 4.0
+MESSAGE_OVERHEAD_TOKENS = 4  # chat template tokens around each message
+
+def approx_tokens(text: str) -> int:
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+def messages_tokens(msgs: List[Dict[str, str]]) -> int:
+    return sum(approx_tokens(m["content"]) + MESSAGE_OVERHEAD_TOKENS for m in msgs)
+
+def clip(text: str, max_tokens: int) -> str:
+    if approx_tokens(text) <= max_tokens:
+        return text
+    cut = text[:int(max_tokens * CHARS_PER_TOKEN)]
+    space = cut.rfind(" ")
+    return (cut[:space] if space > 0 else cut) + " …"
+
+@lru_cache(maxsize=16)
+def render_options(role_id: RoleID) -> Dict:
+    # stop as soon as the model starts writing another participant's line
+    stop = [f"\n{r['name']}:" for r in ROLES if r["id"] != role_id]
+    return {"num_predict": RENDER_NUM_PREDICT, "stop": stop}
+
+def summary_prompt(summary: str, turns: List[Dict]) -> List[Dict[str, str]]:
+    text = "\n".join(f'{m["role_name"]}: {clip(m["content"], CONTEXT_TURN_MAX_TOKENS)}' for m in turns)
+    return [
+        {"role": "system", "content": (
+            "You maintain a running summary of a policy deliberation.\n"
+            "Update the summary with the new turns: each participant's position, proposals made, "
+            "open disagreements. At most 120 words, plain text, no preamble."
+        )},
+        {"role": "user", "content": f"Current summary: {summary or '(none)'}\nNew turns:\n{text}"},
+    ]
+
+class SessionContext:
+    def __init__(self, model: str, seed: Optional[int] = None, session_id: Optional[str] = None,
+                 budget: int = CONTEXT_TOKEN_BUDGET):
+        self.model = model
+        self.seed = seed
+        self.session_id = session_id
+        self.budget = budget
+        self.summary = ""
+        self.summary_upto = 0  # transcript[:summary_upto] is covered by the summary
+        self.pending: Optional[Tuple[asyncio.Task, int]] = None
+        self.stats = {"summaries": 0, "summary_failures": 0, "summaries_late": 0, "dropped_turns": 0, "clipped_turns": 0}
+
+    def messages(self, role_id: RoleID, s: SimState, a: Action, transcript: List[Dict]) -> List[Dict[str, str]]:
+        tail, clipped, dropped = self._fit(role_id, s, a, transcript)
+        self.stats["clipped_turns"] += clipped
+        self.stats["dropped_turns"] += dropped
+        return build_render_messages(role_id, s, a, tail, self.summary)
+
+    def prefix(self, role_id: RoleID, s: SimState, a: Action, transcript: List[Dict]) -> List[Dict[str, str]]:
+        # messages() up to and including the last transcript turn, i.e. without the
+        # speaker's role prompt and request (last in the layout, see render.py)
+        tail, _, _ = self._fit(role_id, s, a, transcript)
+        return build_render_messages(role_id, s, a, tail, self.summary)[:-2]
+
+    def _fit(self, role_id: RoleID, s: SimState, a: Action, transcript: List[Dict]) -> Tuple[List[Dict], int, int]:
+        # (transcript turns to send, how many were clipped, how many dropped)
+        tail = []
+        clipped = 0
+        for m in transcript[self.summary_upto:]:
+            content = clip(m["content"], CONTEXT_TURN_MAX_TOKENS)
+            if content is not m["content"]:
+                clipped += 1
+                m = {**m, "content": content}
+            tail.append(m)
+
+        fixed = messages_tokens(build_render_messages(role_id, s, a, [], self.summary))
+        costs = [approx_tokens(f'{m["role_name"]}: {m["content"]}') + MESSAGE_OVERHEAD_TOKENS for m in tail]
+        total = fixed + sum(costs)
+        start = 0
+        # over budget (summary behind or failing): drop the oldest turns, whole
+        # rounds first so the prompt prefix stays stable turn to turn
+        while total > self.budget and len(tail) - start > TAIL_BLOCK:
+            total -= sum(costs[start:start + TAIL_BLOCK])
+            start += TAIL_BLOCK
+        while total > self.budget and start < len(tail):
+            total -= costs[start]
+            start += 1
+        return tail[start:], clipped, start
+
+    async def _summarize(self, summary: str, turns: List[Dict]) -> str:
+        j = await chat_json(model=self.model, messages=summary_prompt(summary, turns), temperature=0.2, seed=self.seed,
+                            session_id=self.session_id, priority="background",
+                            options={"num_predict": SUMMARY_NUM_PREDICT})
+        text = ((j.get("message") or {}).get("content") or "").strip()
+        return clip(text, SUMMARY_NUM_PREDICT)
+
+    def advance(self, transcript: List[Dict], background: List[asyncio.Task]):
+        # Called at every round boundary. Applies a refresh started at an earlier
+        # boundary if it has finished, then starts folding everything since into the
+        # summary. Never waits: the summarizer runs at background priority and could
+        # starve behind the session's own requests, so one still running is left
+        # for a later boundary and its turns stay in the raw tail until then.
+        if self.pending is not None:
+            task, upto = self.pending
+            if not task.done():
+                self.stats["summaries_late"] += 1
+                return
+            self.pending = None
+            if task.cancelled() or task.exception() is not None:
+                # keep the old summary; the budget still holds by dropping old turns
+                self.stats["summary_failures"] += 1
+            else:
+                self.summary = task.result()
+                self.summary_upto = upto
+                self.stats["summaries"] += 1
+        upto = len(transcript)
+        turns = transcript[self.summary_upto:upto]
+        if turns:
+            task = asyncio.create_task(self._summarize(self.summary, turns))
+            background.append(task)
+            self.pending = (task, upto)
@@ -0,0 +1,148 @@
+import json
+import re
+from typing import Any, Dict, List, Optional
+
+# Incremental reader for a model reply that should be one JSON object.
+# Chunks are fed as they stream in; every top-level key/value pair is parsed
+# as soon as its value is complete, so a caller can stop generation once it
+# has everything it needs. Text before the first "{" (prose, a code fence) is skipped.
+class JSONObjectStream:
+    def __init__(self):
+        self.buf = ""
+        self.pos = 0
+        self.depth = 0
+        self.in_str = False
+        self.esc = False
+        self.key: Optional[str] = None
+        self.key_start = -1
+        self.val_start = -1
+        self.done = False
+        self.pairs: Dict[str, Any] = {}
+
+    def feed(self, text: str) -> List[str]:
+        # returns the keys completed by this chunk
+        self.buf += text
+        out: List[str] = []
+        buf = self.buf
+        i = self.pos
+        while i < len(buf) and not self.done:
+            c = buf[i]
+            if self.depth == 0:
+                if c == "{":
+                    self.depth = 1
+            elif self.in_str:
+                if self.esc:
+                    self.esc = False
+                elif c == "\\":
+                    self.esc = True
+                elif c == '"':
+                    self.in_str = False
+                    if self.depth == 1:
+                        if self.key_start >= 0:
+                            self.key = self._loads(buf[self.key_start:i + 1])
+                            self.key_start = -1
+                        elif self.val_start >= 0 and buf[self.val_start] == '"':
+                            self._finish(i + 1, out)
+            elif c == '"':
+                self.in_str = True
+                if self.depth == 1 and self.val_start < 0:
+                    if self.key is None:
+                        self.key_start = i
+                    else:
+                        self.val_start = i
+            elif c in "{[":
+                if self.depth == 1 and self.key is not None and self.val_start < 0:
+                    self.val_start = i
+                self.depth += 1
+            elif c in "}]":
+                self.depth -= 1
+                if self.depth == 1 and self.val_start >= 0 and buf[self.val_start] in "{[":
+                    self._finish(i + 1, out)
+                elif self.depth == 0:
+                    if self.val_start >= 0:
+                        self._finish(i, out)
+                    self.done = True
+            elif self.depth == 1 and self.val_start >= 0:
+                # end of a bare scalar (number, true/false/null)
+                if c == "," or c.isspace():
+                    self._finish(i, out)
+            elif self.depth == 1 and self.key is not None and c not in ": \t\r\n,":
+                self.val_start = i
+            i += 1
+        self.pos = i
+        return out
+
+    def _loads(self, raw: str) -> Any:
+        try:
+            return json.loads(raw)
+        except ValueError:
+            return None
+
+    def _finish(self, end: int, out: List[str]):
+        raw = self.buf[self.val_start:end]
+        try:
+            self.pairs[self.key] = json.loads(raw)
+        except ValueError:
+            # left out of pairs; the caller falls back to parsing or repairing the whole reply
+            pass
+        out.append(self.key)
+        self.key = None
+        self.val_start = -1
+
+_FENCE = re.compile(r"```(?:json)?\s*(.*?)(?:```|$)", re.S)
+_PY_LITERALS = ((re.compile(r"\bTrue\b"), "true"), (re.compile(r"\bFalse\b"), "false"), (re.compile(r"\bNone\b"), "null"))
+_BARE_KEY = re.compile(r'([{,]\s*)([A-Za-z_][A-Za-z0-9_]*)\s*:')
+_TRAILING_COMMA = re.compile(r",\s*([}\]])")
+
+def _balance(text: str) -> str:
+    # cut after the first complete top-level object, or close whatever is still open
+    stack: List[str] = []
+    in_str = esc = False
+    for i, c in enumerate(text):
+        if in_str:
+            if esc:
+                esc = False
+            elif c == "\\":
+                esc = True
+            elif c == '"':
+                in_str = False
+        elif c == '"':
+            in_str = True
+        elif c in "{[":
+            stack.append("}" if c == "{" else "]")
+        elif c in "}]" and stack:
+            stack.pop()
+            if not stack:
+                return text[:i + 1]
+    if in_str:
+        text += '"'
+    text = text.rstrip().rstrip(",")
+    if text.endswith(":"):
+        text += " null"
+    return text + "".join(reversed(stack))
+
+def repair_json(text: str) -> Optional[Dict]:
+    # Cheap fixes for near-valid output: code fences and prose around the object,
+    # Python literals, single quotes, bare keys, trailing commas, and a reply cut
+    # off mid-object (num_predict). Returns None when it's still not an object.
+    m = _FENCE.search(text)
+    if m and "{" in m.group(1):
+        text = m.group(1)
+    start = text.find("{")
+    if start < 0:
+        return None
+    body = _balance(text[start:])
+    try:
+        obj = json.loads(body)
+    except ValueError:
+        for pat, rep in _PY_LITERALS:
+            body = pat.sub(rep, body)
+        if '"' not in body:
+            body = body.replace("'", '"')
+        body = _BARE_KEY.sub(r'\1"\2":', body)
+        body = _TRAILING_COMMA.sub(r"\1", _balance(body))
+        try:
+            obj = json.loads(body)
+        except ValueError:
+            return None
+    return obj if isinstance(obj, dict) else None
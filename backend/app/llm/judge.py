@@ -1,16 +1,34 @@
 import json
-from typing import Dict, List, Optional
-from .ollama_client import chat_json
-from ..game.state import GameState
+import os
+import time
+from typing import Any, Dict, List, Optional
+from .cache import CACHE, CacheMissError, cache_key
+from .jsonstream import JSONObjectStream, repair_json
+from .ollama_client import chat_json, stream_chat
+from .. import tracing
+from ..game.state import SimState
 from ..game.actions import RoleID
+from ..metrics import JUDGE_CALLS, JUDGE_LATENCY, JUDGE_OUTCOMES, JUDGE_PARSE_FAILURES, JUDGE_TOKENS
 
-def judge_prompt(s: GameState, round_transcript: List[Dict]) -> List[Dict[str, str]]:
+# Judge replies are constrained to a JSON schema (JUDGE_FORMAT=schema), or to
+# any JSON ("json"), or not at all ("off"). They are streamed and parsed as
+# they arrive; with JUDGE_EARLY_STOP the request is dropped as soon as every
+# key is in and valid, instead of waiting for the closing brace, trailing
+# whitespace or an explanation after it. Near-valid output is repaired
+# before falling back to neutral scores.
+JUDGE_FORMAT = os.getenv("JUDGE_FORMAT", "schema")
+JUDGE_STREAM = os.getenv("JUDGE_STREAM", "1") == "1"
+JUDGE_EARLY_STOP = os.getenv("JUDGE_EARLY_STOP", "1") == "1"
+JUDGE_NUM_PREDICT = int(os.getenv("JUDGE_NUM_PREDICT", "256"))
+JUDGE_NOTES_CHARS = int(os.getenv("JUDGE_NOTES_CHARS", "160"))
+
+def judge_prompt(s: SimState, round_transcript: List[Dict]) -> List[Dict[str, str]]:
     rubric = (
         "You are an evaluator for a policy deliberation.\n"
         "Score ONLY based on given transcript and state summary.\n"
-        "Return STRICT JSON with keys:\n"
-        "realism, public_acceptance, fairness_perception, conflict_level,\n"
-        "persuasion (object role->0..1), coherence (object role->0..1), notes.\n"
+        "Return STRICT JSON with keys, in this order:\n"
+        "notes (one short sentence), realism, public_acceptance, fairness_perception, conflict_level,\n"
+        "persuasion (object role->0..1), coherence (object role->0..1).\n"
         "All numeric scores must be in [0,1]. No extra text."
     )
     state_summary = {
@@ -32,28 +50,187 @@ def judge_prompt(s: GameState, round_transcript: List[Dict]) -> List[Dict[str, s
 def clamp01(x: float) -> float:
     return 0.0 if x < 0 else 1.0 if x > 1 else x
 
+def _score(x: Any) -> float:
+    try:
+        return clamp01(float(x))
+    except (TypeError, ValueError):
+        return 0.5
+
 def safe_parse_json(s: str) -> Optional[Dict]:
     try:
         return json.loads(s)
     except Exception:
         return None
 
-async def judge_round(model: str, s: GameState, round_transcript: List[Dict]) -> Dict:
-    msgs = judge_prompt(s, round_transcript)
-    j = await chat_json(model=model, messages=msgs, temperature=0.2)
-    content = (j.get("message") or {}).get("content") or ""
-    obj = safe_parse_json(content)
-    if not isinstance(obj, dict):
-        # fallback conservative scores
-        return {
-            "realism": 0.5, "public_acceptance": 0.5, "fairness_perception": 0.5, "conflict_level": 0.5,
-            "persuasion": {}, "coherence": {}, "notes": "Judge JSON parse failed."
-        }
-
-    # sanitize
-    for k in ["realism","public_acceptance","fairness_perception","conflict_level"]:
-        obj[k] = clamp01(float(obj.get(k, 0.5)))
+FALLBACK_SCORES = {
+    "realism": 0.5, "public_acceptance": 0.5, "fairness_perception": 0.5, "conflict_level": 0.5,
+    "persuasion": {}, "coherence": {}, "notes": "Judge JSON parse failed."
+}
+SCORE_KEYS = ["realism", "public_acceptance", "fairness_perception", "conflict_level"]
+# the order the model is asked to write them in; notes first, so an early stop never cuts them
+JUDGE_KEYS = ["notes"] + SCORE_KEYS + ["persuasion", "coherence"]
+
+def judge_schema(per_turn: bool) -> Dict:
+    score = {"type": "number", "minimum": 0, "maximum": 1}
+    side = score if per_turn else {"type": "object", "additionalProperties": score}
+    props = {"notes": {"type": "string", "maxLength": JUDGE_NOTES_CHARS}}
+    props.update({k: score for k in SCORE_KEYS})
+    props.update({"persuasion": side, "coherence": side})
+    return {"type": "object", "properties": props, "required": list(props)}
+
+def _judge_format(per_turn: bool):
+    if JUDGE_FORMAT == "schema":
+        return judge_schema(per_turn)
+    return "json" if JUDGE_FORMAT == "json" else None
+
+def _valid(key: str, v: Any, per_turn: bool) -> bool:
+    if key == "notes":
+        return isinstance(v, str)
+    if key in SCORE_KEYS or per_turn:
+        return isinstance(v, (int, float)) and not isinstance(v, bool)
+    return isinstance(v, dict)
+
+def _complete(pairs: Dict, per_turn: bool) -> bool:
+    return all(k in pairs and _valid(k, pairs[k], per_turn) for k in JUDGE_KEYS)
+
+def _sanitize(obj: Dict) -> Dict:
+    for k in SCORE_KEYS:
+        obj[k] = _score(obj.get(k, 0.5))
     obj["persuasion"] = obj.get("persuasion", {}) if isinstance(obj.get("persuasion", {}), dict) else {}
     obj["coherence"] = obj.get("coherence", {}) if isinstance(obj.get("coherence", {}), dict) else {}
     obj["notes"] = str(obj.get("notes", ""))[:400]
     return obj
+
+async def _stream_judge(model: str, msgs: List[Dict[str, str]], per_turn: bool, fmt, seed: Optional[int],
+                        session_id: Optional[str]) -> tuple:
+    # -> (object or None, outcome, tokens used, tokens wasted)
+    parser = JSONObjectStream()
+    used = wasted = 0
+    complete = early = False
+    gen = stream_chat(model=model, messages=msgs, temperature=0.2, seed=seed, session_id=session_id,
+                      priority="judge", role="judge", options={"num_predict": JUDGE_NUM_PREDICT}, fmt=fmt)
+    try:
+        async for delta in gen:
+            if complete:
+                # everything needed is in; the rest is the closing brace, whitespace or prose
+                wasted += 1
+                continue
+            used += 1
+            if parser.feed(delta) and _complete(parser.pairs, per_turn):
+                complete = True
+                if JUDGE_EARLY_STOP:
+                    early = True
+                    break
+    finally:
+        # closing the stream drops the request, which stops generation on the server
+        await gen.aclose()
+    if complete:
+        return dict(parser.pairs), "early" if early else "complete", used, wasted
+    obj = safe_parse_json(parser.buf)
+    if isinstance(obj, dict):
+        return obj, "complete", used, wasted
+    obj = repair_json(parser.buf)
+    if obj is not None:
+        return obj, "repaired", used, wasted
+    return None, "fallback", 0, used
+
+async def _ask(model: str, msgs: List[Dict[str, str]], mode: str, seed: Optional[int], session_id: Optional[str]) -> Optional[Dict]:
+    per_turn = mode == "turn"
+    fmt = _judge_format(per_turn)
+    key = None
+    if CACHE.enabled and JUDGE_STREAM:
+        # the parsed object is cached, since an early-stopped stream never completes
+        key = cache_key("judge", model, msgs, 0.2, seed, {"num_predict": JUDGE_NUM_PREDICT}, fmt)
+        hit = await CACHE.get(key)
+        if hit is not None:
+            return dict(hit)
+        if CACHE.mode == "replay_only":
+            raise CacheMissError(f"no cached judge response for {key}")
+    t0 = time.perf_counter()
+    if JUDGE_STREAM:
+        obj, outcome, used, wasted = await _stream_judge(model, msgs, per_turn, fmt, seed, session_id)
+        JUDGE_TOKENS.inc(model, "used", amount=used)
+        JUDGE_TOKENS.inc(model, "wasted", amount=wasted)
+    else:
+        j = await chat_json(model=model, messages=msgs, temperature=0.2, seed=seed, session_id=session_id,
+                            priority="judge", fmt=fmt)
+        content = (j.get("message") or {}).get("content") or ""
+        obj, outcome = safe_parse_json(content), "complete"
+        if not isinstance(obj, dict):
+            obj, outcome = repair_json(content), "repaired"
+            if obj is None:
+                outcome = "fallback"
+    JUDGE_LATENCY.observe(time.perf_counter() - t0, model, mode)
+    JUDGE_CALLS.inc(model)
+    JUDGE_OUTCOMES.inc(model, outcome)
+    if obj is None:
+        JUDGE_PARSE_FAILURES.inc(model)
+        return None
+    if key is not None:
+        CACHE.put(key, "judge", obj)
+    return obj
+
+async def judge_round(model: str, s: SimState, round_transcript: List[Dict], seed: Optional[int] = None,
+                      session_id: Optional[str] = None) -> Dict:
+    msgs = judge_prompt(s, round_transcript)
+    with tracing.span("judge_round", track="judge", round=s.round_idx):
+        obj = await _ask(model, msgs, "round", seed, session_id)
+    if obj is None:
+        # fallback conservative scores
+        return dict(FALLBACK_SCORES)
+    return _sanitize(obj)
+
+# Incremental mode: each turn is scored on its own, in the background while the
+# next speaker renders, and the per-turn scores are merged at round end.
+def judge_turn_prompt(s: SimState, turn: Dict, context: List[Dict]) -> List[Dict[str, str]]:
+    rubric = (
+        "You are an evaluator for a policy deliberation.\n"
+        "Score ONLY the last turn, given the state summary and the earlier turns of the round.\n"
+        "Return STRICT JSON with keys, in this order:\n"
+        "notes (one short sentence), realism, public_acceptance, fairness_perception, conflict_level,\n"
+        "persuasion (0..1), coherence (0..1).\n"
+        "All numeric scores must be in [0,1]. No extra text."
+    )
+    state_summary = {
+        "budget_remaining": s.budget_remaining,
+        "restriction_level": s.restriction_level,
+        "groundwater_risk": s.groundwater_risk,
+        "public_support": s.public_support,
+        "fairness_index": s.fairness_index,
+        "decision_locked": s.decision_locked,
+        "decision_option": s.decision_option,
+    }
+    earlier = "\n".join([f'{m["role_name"]}: {m["content"]}' for m in context]) or "(none)"
+    return [
+        {"role": "system", "content": rubric},
+        {"role": "user", "content": (
+            f"State summary: {state_summary}\nEarlier turns:\n{earlier}\n"
+            f'Last turn:\n{turn["role_name"]}: {turn["content"]}'
+        )},
+    ]
+
+async def judge_turn(model: str, msgs: List[Dict[str, str]], role_id: RoleID, seed: Optional[int] = None,
+                     session_id: Optional[str] = None) -> Dict:
+    # runs alongside the next turns; a track per role, so overlapping calls don't stack
+    with tracing.span("judge_turn", track=f"judge:{role_id}", role=role_id):
+        obj = await _ask(model, msgs, "turn", seed, session_id)
+    if obj is None:
+        return dict(FALLBACK_SCORES)
+    # per-turn persuasion/coherence are scalars for the speaker; shape them like the round judge's
+    p, c = obj.get("persuasion"), obj.get("coherence")
+    obj["persuasion"] = {role_id: _score(p)} if isinstance(p, (int, float)) else {}
+    obj["coherence"] = {role_id: _score(c)} if isinstance(c, (int, float)) else {}
+    return _sanitize(obj)
+
+def merge_turn_scores(scores: List[Dict]) -> Dict:
+    # in turn order, not completion order, so the fused state doesn't depend on timing
+    if not scores:
+        return dict(FALLBACK_SCORES)
+    out: Dict = {k: sum(sc[k] for sc in scores) / len(scores) for k in SCORE_KEYS}
+    out["persuasion"] = {}
+    out["coherence"] = {}
+    for sc in scores:
+        out["persuasion"].update(sc["persuasion"])
+        out["coherence"].update(sc["coherence"])
+    out["notes"] = " ".join(sc["notes"] for sc in scores if sc["notes"])[:400]
+    return out
@@ -1,31 +1,390 @@
+import asyncio
+import os
+import time
 import httpx
 import json
-from typing import AsyncGenerator, Dict, List
+from typing import AsyncGenerator, Dict, List, Optional
+from .cache import CACHE, CacheMissError, cache_key
+from .pool import BackendPool, Endpoint
+from .scheduler import SCHEDULER
+from .. import tracing
+from ..metrics import LLM_ERRORS, observe_stream
 
-OLLAMA_CHAT_URL = "http://localhost:11434/api/chat"
+# Pool sizing for the shared client. Keep-alive connections are reused across
+# turns, judge calls and sessions instead of reconnecting per request.
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "32"))
+LLM_MAX_KEEPALIVE = int(os.getenv("LLM_MAX_KEEPALIVE", "16"))
+LLM_KEEPALIVE_EXPIRY = float(os.getenv("LLM_KEEPALIVE_EXPIRY", "60"))
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "180"))
 
-async def stream_chat(model: str, messages: List[Dict[str, str]], temperature: float = 0.4) -> AsyncGenerator[str, None]:
-    payload = {"model": model, "messages": messages, "stream": True, "options": {"temperature": temperature}}
-    async with httpx.AsyncClient(timeout=httpx.Timeout(180.0)) as client:
-        async with client.stream("POST", OLLAMA_CHAT_URL, json=payload) as r:
-            r.raise_for_status()
-            async for line in r.aiter_lines():
-                if not line:
-                    continue
-                try:
-                    obj = json.loads(line)
-                except Exception:
-                    continue
-                msg = obj.get("message") or {}
-                delta = msg.get("content") or ""
-                if delta:
+# Max concurrent requests per model on each endpoint; the rest wait instead of piling onto the server.
+LLM_PER_MODEL_CONCURRENCY = int(os.getenv("LLM_PER_MODEL_CONCURRENCY", "4"))
+
+# How long the server keeps a model loaded after each request: "30m", seconds, or
+# -1 (until unloaded). Empty leaves it to the server's default (5 minutes for Ollama),
+# so quiet periods unload models; the warm pool (warm.py) unloads idle ones itself.
+LLM_KEEP_ALIVE = os.getenv("LLM_KEEP_ALIVE", "30m")
+
+# Prefill requests (speculation.py) only put their prompt into the server's prompt
+# cache. num_predict 0 is prompt processing only to llama.cpp's server but "no limit"
+# to others, so by default they generate a single token.
+LLM_PREFILL_NUM_PREDICT = int(os.getenv("LLM_PREFILL_NUM_PREDICT", "1"))
+
+def keep_alive_value(v: str):
+    # Ollama takes a duration string or a number of seconds
+    try:
+        return int(v)
+    except ValueError:
+        return v
+
+def _record_timings(meta: Dict, final: Dict):
+    # Ollama reports durations in ns on the last chunk; prompt_eval_* covers
+    # only the prompt tokens it had to evaluate (cached prefix excluded)
+    for k in ("prompt_eval_count", "eval_count"):
+        if k in final:
+            meta[k] = final[k]
+    for k in ("prompt_eval_duration", "eval_duration", "load_duration", "total_duration"):
+        if k in final:
+            meta[k + "_ms"] = round(final[k] / 1e6, 3)
+    if final.get("eval_count") and final.get("eval_duration"):
+        meta["tokens_per_s"] = round(final["eval_count"] / (final["eval_duration"] / 1e9), 2)
+
+def _trace_stream(tr: tracing.SessionTrace, model: str, url: str, marks: List[int], end: int, deltas: int):
+    # queued -> acquired -> response headers -> first token -> end, as child spans of one stream_chat span
+    tq, ta, th, tf = marks
+    sid = tr.add("stream_chat", tq, end, model=model, endpoint=url, deltas=deltas)
+    tr.add("llm.queue", tq, ta or end, parent=sid)
+    if ta:
+        tr.add("llm.connect", ta, th or end, parent=sid)
+    if th:
+        tr.add("llm.ttft", th, tf or end, parent=sid)
+    if tf:
+        tr.add("llm.stream", tf, end, parent=sid)
+
+def _retryable(e: httpx.HTTPError) -> bool:
+    # connection trouble, a server error, or a node that doesn't have the model
+    if isinstance(e, httpx.HTTPStatusError):
+        return e.response.status_code >= 500 or e.response.status_code == 404
+    return isinstance(e, httpx.TransportError)
+
+class LLMClient:
+    def __init__(self,
+                 max_connections: int = LLM_MAX_CONNECTIONS,
+                 max_keepalive: int = LLM_MAX_KEEPALIVE,
+                 keepalive_expiry: float = LLM_KEEPALIVE_EXPIRY,
+                 per_model_concurrency: int = LLM_PER_MODEL_CONCURRENCY,
+                 pool: Optional[BackendPool] = None):
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.per_model_concurrency = per_model_concurrency
+        self.client: Optional[httpx.AsyncClient] = None
+        self.pool = pool if pool is not None else BackendPool()
+        self.prober: Optional[asyncio.Task] = None
+        self.semaphores: Dict[tuple, asyncio.Semaphore] = {}
+        self.stats = {"requests": 0, "connections_opened": 0, "errors": 0}
+        self.in_flight: Dict[str, int] = {}
+        self.waiting: Dict[str, int] = {}
+
+    async def start(self):
+        if self.client is None:
+            self.client = httpx.AsyncClient(timeout=httpx.Timeout(LLM_TIMEOUT), limits=self.limits)
+        if self.prober is None:
+            # health + model list of every endpoint, refreshed in the background
+            await self.pool.probe_all(self.client)
+            self.prober = asyncio.create_task(self.pool.probe_forever(self.client))
+
+    async def close(self):
+        if self.prober is not None:
+            self.prober.cancel()
+            self.prober = None
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+
+    def _http(self) -> httpx.AsyncClient:
+        # lazily created so scripts can use the client without the app lifespan
+        if self.client is None:
+            self.client = httpx.AsyncClient(timeout=httpx.Timeout(LLM_TIMEOUT), limits=self.limits)
+        return self.client
+
+    def _sem(self, ep: Endpoint, model: str) -> asyncio.Semaphore:
+        sem = self.semaphores.get((ep.url, model))
+        if sem is None:
+            sem = asyncio.Semaphore(self.per_model_concurrency)
+            self.semaphores[(ep.url, model)] = sem
+        return sem
+
+    async def _trace(self, event: str, info: Dict):
+        if event == "connection.connect_tcp.complete":
+            self.stats["connections_opened"] += 1
+
+    async def _acquire(self, ep: Endpoint, model: str, session_id: Optional[str], priority: str, meta: Optional[Dict]):
+        # scheduler slot on the endpoint first (priority + fair share), then the per-model limit
+        ep.outstanding += 1
+        try:
+            ticket = await SCHEDULER.acquire(ep.url, session_id, priority)
+        except BaseException:
+            ep.outstanding -= 1
+            raise
+        self.waiting[model] = self.waiting.get(model, 0) + 1
+        try:
+            await self._sem(ep, model).acquire()
+        except BaseException:
+            SCHEDULER.release(ticket)
+            ep.outstanding -= 1
+            raise
+        finally:
+            self.waiting[model] -= 1
+        self.in_flight[model] = self.in_flight.get(model, 0) + 1
+        self.stats["requests"] += 1
+        ep.requests += 1
+        if meta is not None:
+            meta["queue_wait_ms"] = round(ticket.wait_ms, 3)
+            meta["endpoint"] = ep.url
+        return ticket
+
+    def _release(self, ep: Endpoint, model: str, ticket):
+        self.in_flight[model] -= 1
+        ep.outstanding -= 1
+        self._sem(ep, model).release()
+        SCHEDULER.release(ticket)
+
+    def _failed(self, ep: Endpoint, model: str, e: httpx.HTTPError):
+        self.stats["errors"] += 1
+        LLM_ERRORS.inc(model, type(e).__name__)
+        self.pool.failed(ep, e)
+
+    def _payload(self, model: str, messages: List[Dict[str, str]], temperature: float, seed: Optional[int], stream: bool,
+                 extra: Optional[Dict] = None, fmt=None) -> Dict:
+        options = {"temperature": temperature}
+        if seed is not None:
+            options["seed"] = seed
+        if extra:
+            # e.g. num_predict / stop
+            options.update(extra)
+        payload = {"model": model, "messages": messages, "stream": stream, "options": options}
+        if LLM_KEEP_ALIVE:
+            payload["keep_alive"] = keep_alive_value(LLM_KEEP_ALIVE)
+        if fmt is not None:
+            # "json" or a JSON schema; the server constrains decoding to it
+            payload["format"] = fmt
+        return payload
+
+    async def stream_chat(self, model: str, messages: List[Dict[str, str]], temperature: float = 0.4,
+                          seed: Optional[int] = None, session_id: Optional[str] = None,
+                          priority: str = "interactive", meta: Optional[Dict] = None,
+                          role: str = "", options: Optional[Dict] = None, fmt=None) -> AsyncGenerator[str, None]:
+        if meta is None:
+            meta = {}
+        tr = tracing.current()
+        key = None
+        if CACHE.enabled:
+            key = cache_key("stream", model, messages, temperature, seed, options, fmt)
+            hit = await CACHE.get(key)
+            if hit is not None:
+                meta["cached"] = True
+                if tr is not None:
+                    now = time.perf_counter_ns()
+                    tr.add("stream_chat", now, now, model=model, cached=True, deltas=len(hit))
+                for delta in hit:
                     yield delta
-                if obj.get("done") is True:
-                    break
+                return
+            if CACHE.mode == "replay_only":
+                raise CacheMissError(f"no cached stream_chat response for {key}")
+
+        payload = self._payload(model, messages, temperature, seed, stream=True, extra=options, fmt=fmt)
+        acc: List[str] = []
+        tried: List[str] = []
+        while True:
+            # a session's turns all go to one endpoint (its prompt cache lives there)
+            ep = self.pool.pick(model, session_id, sticky=True, exclude=tried)
+            # span marks (ns): queued, acquired, headers, first token
+            marks = [time.perf_counter_ns(), 0, 0, 0]
+            deltas = 0
+            ticket = await self._acquire(ep, model, session_id, priority, meta)
+            marks[1] = time.perf_counter_ns()
+            t0 = time.perf_counter()
+            first = None
+            retry = False
+            try:
+                async with self._http().stream("POST", ep.url, json=payload, extensions={"trace": self._trace}) as r:
+                    marks[2] = time.perf_counter_ns()
+                    r.raise_for_status()
+                    async for line in r.aiter_lines():
+                        if not line:
+                            continue
+                        try:
+                            obj = json.loads(line)
+                        except Exception:
+                            continue
+                        msg = obj.get("message") or {}
+                        delta = msg.get("content") or ""
+                        if obj.get("done") is True:
+                            _record_timings(meta, obj)
+                        if delta:
+                            deltas += 1
+                            if first is None:
+                                first = time.perf_counter()
+                                marks[3] = time.perf_counter_ns()
+                                meta["ttft_ms"] = round((first - t0) * 1000.0, 3)
+                            if key is not None:
+                                acc.append(delta)
+                            yield delta
+                        # no break on "done": draining the body to EOF lets the
+                        # connection go back to the keep-alive pool
+            except httpx.HTTPError as e:
+                self._failed(ep, model, e)
+                tried.append(ep.url)
+                # nothing streamed yet, so the session can move to another endpoint
+                if first is None and _retryable(e) and self.pool.candidates(model, tried):
+                    retry = True
+                else:
+                    raise
+            finally:
+                self._release(ep, model, ticket)
+                meta["total_ms"] = round((time.perf_counter() - t0) * 1000.0, 3)
+                if tr is not None:
+                    _trace_stream(tr, model, ep.url, marks, time.perf_counter_ns(), deltas)
+            if not retry:
+                break
+        # only reached when the stream ran to completion
+        observe_stream(model, role, meta)
+        if key is not None:
+            CACHE.put(key, "stream", acc)
+
+    async def chat_json(self, model: str, messages: List[Dict[str, str]], temperature: float = 0.2,
+                        seed: Optional[int] = None, session_id: Optional[str] = None,
+                        priority: str = "judge", meta: Optional[Dict] = None, options: Optional[Dict] = None,
+                        fmt=None) -> Dict:
+        key = None
+        if CACHE.enabled:
+            key = cache_key("json", model, messages, temperature, seed, options, fmt)
+            hit = await CACHE.get(key)
+            if hit is not None:
+                return hit
+            if CACHE.mode == "replay_only":
+                raise CacheMissError(f"no cached chat_json response for {key}")
+
+        payload = self._payload(model, messages, temperature, seed, stream=False, extra=options, fmt=fmt)
+        tr = tracing.current()
+        tried: List[str] = []
+        while True:
+            ep = self.pool.pick(model, session_id, exclude=tried)
+            tq = time.perf_counter_ns()
+            ticket = await self._acquire(ep, model, session_id, priority, meta)
+            ta = time.perf_counter_ns()
+            try:
+                r = await self._http().post(ep.url, json=payload, extensions={"trace": self._trace})
+                r.raise_for_status()
+                out = r.json()
+                if key is not None:
+                    CACHE.put(key, "json", out)
+                return out
+            except httpx.HTTPError as e:
+                self._failed(ep, model, e)
+                tried.append(ep.url)
+                # non-streaming, so a failed call can simply be retried on another node
+                if not (_retryable(e) and self.pool.candidates(model, tried)):
+                    raise
+            finally:
+                self._release(ep, model, ticket)
+                if tr is not None:
+                    end = time.perf_counter_ns()
+                    sid = tr.add("chat_json", tq, end, model=model, endpoint=ep.url)
+                    tr.add("llm.queue", tq, ta, parent=sid)
+                    tr.add("llm.request", ta, end, parent=sid)
+
+    async def prefill(self, model: str, messages: List[Dict[str, str]], session_id: Optional[str] = None,
+                      meta: Optional[Dict] = None) -> Dict:
+        # speculative, so lowest priority, no retry and no response cache; on the endpoint
+        # the session's turns go to, whose prompt cache the next turn will use
+        if meta is None:
+            meta = {}
+        payload = self._payload(model, messages, 0.0, None, stream=False,
+                                extra={"num_predict": LLM_PREFILL_NUM_PREDICT})
+        ep = self.pool.pick(model, session_id, sticky=True)
+        tr = tracing.current()
+        tq = time.perf_counter_ns()
+        ticket = await self._acquire(ep, model, session_id, "background", meta)
+        ta = time.perf_counter_ns()
+        try:
+            r = await self._http().post(ep.url, json=payload, extensions={"trace": self._trace})
+            r.raise_for_status()
+            _record_timings(meta, r.json())
+            return meta
+        except httpx.HTTPError as e:
+            self._failed(ep, model, e)
+            raise
+        finally:
+            self._release(ep, model, ticket)
+            if tr is not None:
+                end = time.perf_counter_ns()
+                sid = tr.add("prefill", tq, end, model=model, endpoint=ep.url)
+                tr.add("llm.queue", tq, ta, parent=sid)
+                tr.add("llm.request", ta, end, parent=sid)
 
-async def chat_json(model: str, messages: List[Dict[str, str]], temperature: float = 0.2) -> Dict:
-    payload = {"model": model, "messages": messages, "stream": False, "options": {"temperature": temperature}}
-    async with httpx.AsyncClient(timeout=httpx.Timeout(180.0)) as client:
-        r = await client.post(OLLAMA_CHAT_URL, json=payload)
+    async def load_model(self, ep: Endpoint, model: str, keep_alive=None) -> Dict:
+        # an empty chat request only loads the model (and resets its keep_alive when
+        # resident; keep_alive=0 unloads it). It generates nothing, so no scheduler slot
+        body = {"model": model, "messages": []}
+        if keep_alive is not None:
+            body["keep_alive"] = keep_alive
+        r = await self._http().post(ep.url, json=body)
         r.raise_for_status()
         return r.json()
+
+    async def running_models(self, ep: Endpoint) -> List[Dict]:
+        # the models resident on the endpoint (/api/ps)
+        r = await self._http().get(ep.base + "/api/ps", timeout=5.0)
+        r.raise_for_status()
+        return r.json().get("models") or []
+
+    def pool_stats(self) -> Dict:
+        req = self.stats["requests"]
+        opened = self.stats["connections_opened"]
+        return {
+            "requests": req,
+            "connections_opened": opened,
+            "connections_reused": max(0, req - opened),
+            "reuse_ratio": round(1.0 - opened / req, 4) if req else 0.0,
+            "errors": self.stats["errors"],
+            "max_connections": self.limits.max_connections,
+            "max_keepalive_connections": self.limits.max_keepalive_connections,
+            "per_model_concurrency": self.per_model_concurrency,
+            "models": {
+                m: {"in_flight": self.in_flight.get(m, 0), "waiting": self.waiting.get(m, 0)}
+                for m in self.in_flight
+            },
+            "endpoints": self.pool.stats(),
+        }
+
+CLIENT = LLMClient()
+
+async def stream_chat(model: str, messages: List[Dict[str, str]], temperature: float = 0.4,
+                      seed: Optional[int] = None, session_id: Optional[str] = None,
+                      priority: str = "interactive", meta: Optional[Dict] = None,
+                      role: str = "", options: Optional[Dict] = None, fmt=None) -> AsyncGenerator[str, None]:
+    gen = CLIENT.stream_chat(model=model, messages=messages, temperature=temperature, seed=seed,
+                             session_id=session_id, priority=priority, meta=meta, role=role,
+                             options=options, fmt=fmt)
+    try:
+        async for delta in gen:
+            yield delta
+    finally:
+        # a consumer that stops early closes this wrapper; close the inner stream
+        # right away too, so the upstream request is dropped instead of left to GC
+        await gen.aclose()
+
+async def chat_json(model: str, messages: List[Dict[str, str]], temperature: float = 0.2,
+                    seed: Optional[int] = None, session_id: Optional[str] = None,
+                    priority: str = "judge", meta: Optional[Dict] = None, options: Optional[Dict] = None,
+                    fmt=None) -> Dict:
+    return await CLIENT.chat_json(model=model, messages=messages, temperature=temperature, seed=seed,
+                                  session_id=session_id, priority=priority, meta=meta, options=options, fmt=fmt)
+
+async def prefill(model: str, messages: List[Dict[str, str]], session_id: Optional[str] = None,
+                  meta: Optional[Dict] = None) -> Dict:
+    return await CLIENT.prefill(model=model, messages=messages, session_id=session_id, meta=meta)
@@ -0,0 +1,140 @@
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Set
+
+import httpx
+
+# Model server endpoints. OLLAMA_CHAT_URLS is a comma-separated list of
+# /api/chat URLs; a single OLLAMA_CHAT_URL still works.
+OLLAMA_CHAT_URL = os.getenv("OLLAMA_CHAT_URL", "http://localhost:11434/api/chat")
+OLLAMA_CHAT_URLS = [u.strip() for u in os.getenv("OLLAMA_CHAT_URLS", OLLAMA_CHAT_URL).split(",") if u.strip()]
+LLM_PROBE_INTERVAL = float(os.getenv("LLM_PROBE_INTERVAL", "10"))
+LLM_PROBE_TIMEOUT = float(os.getenv("LLM_PROBE_TIMEOUT", "2"))
+LLM_STICKY_SESSIONS = int(os.getenv("LLM_STICKY_SESSIONS", "4096"))
+
+class NoEndpointError(RuntimeError):
+    pass
+
+def _model_names(name: str) -> List[str]:
+    # "llama3:latest" is also reachable as "llama3"
+    return [name, name[:-len(":latest")]] if name.endswith(":latest") else [name]
+
+class Endpoint:
+    def __init__(self, url: str):
+        self.url = url
+        self.base = url.rsplit("/api/", 1)[0]
+        self.healthy = True       # optimistic until the first probe says otherwise
+        self.probed = False
+        self.models: Set[str] = set()
+        self.loaded: Set[str] = set()  # in memory right now (/api/ps), when the server reports it
+        self.outstanding = 0      # routed here and not finished yet (queued or in flight)
+        self.requests = 0
+        self.failures = 0
+        self.last_probe = 0.0
+        self.last_error: Optional[str] = None
+
+    def serves(self, model: str) -> bool:
+        # before the first successful probe the model list is unknown; assume yes
+        return not self.probed or not self.models or model in self.models
+
+    def snapshot(self) -> Dict:
+        return {
+            "url": self.url,
+            "healthy": self.healthy,
+            "models": sorted(self.models),
+            "loaded": sorted(self.loaded),
+            "outstanding": self.outstanding,
+            "requests": self.requests,
+            "failures": self.failures,
+            "last_error": self.last_error,
+        }
+
+class BackendPool:
+    def __init__(self, urls: Iterable[str] = OLLAMA_CHAT_URLS):
+        self.endpoints = [Endpoint(u) for u in urls]
+        if not self.endpoints:
+            raise ValueError("no LLM endpoints configured")
+        self.by_url = {e.url: e for e in self.endpoints}
+        # session -> endpoint url for streaming; bounded LRU
+        self.sticky: "OrderedDict[str, str]" = OrderedDict()
+        self._rr = 0
+
+    def candidates(self, model: str, exclude: Iterable[str] = ()) -> List[Endpoint]:
+        ex = set(exclude)
+        eps = [e for e in self.endpoints if e.url not in ex and e.healthy and e.serves(model)]
+        if not eps:
+            # everything marked down: try the rest anyway rather than failing outright
+            eps = [e for e in self.endpoints if e.url not in ex and e.serves(model)]
+        return eps
+
+    def pick(self, model: str, session_id: Optional[str] = None, sticky: bool = False,
+             exclude: Iterable[str] = ()) -> Endpoint:
+        ex = set(exclude)
+        if sticky and session_id:
+            url = self.sticky.get(session_id)
+            ep = self.by_url.get(url) if url else None
+            if ep is not None and ep.url not in ex and ep.healthy and ep.serves(model):
+                self.sticky.move_to_end(session_id)
+                return ep
+        eps = self.candidates(model, ex)
+        if not eps:
+            raise NoEndpointError(f"no endpoint serves model {model!r}")
+        # least outstanding requests, then prefer a node that already has the model
+        # in memory; rotate the start so remaining ties spread out
+        self._rr = (self._rr + 1) % len(eps)
+        ep = min(eps[self._rr:] + eps[:self._rr], key=lambda e: (e.outstanding, model not in e.loaded))
+        if sticky and session_id:
+            self.sticky[session_id] = ep.url
+            self.sticky.move_to_end(session_id)
+            while len(self.sticky) > LLM_STICKY_SESSIONS:
+                self.sticky.popitem(last=False)
+        return ep
+
+    def failed(self, ep: Endpoint, err: BaseException):
+        ep.failures += 1
+        ep.last_error = f"{type(err).__name__}: {err}"[:200]
+        if isinstance(err, httpx.TransportError) or (
+                isinstance(err, httpx.HTTPStatusError) and err.response.status_code >= 500):
+            # down until the next probe succeeds
+            ep.healthy = False
+
+    async def probe(self, client: httpx.AsyncClient, ep: Endpoint):
+        try:
+            r = await client.get(ep.base + "/api/tags", timeout=LLM_PROBE_TIMEOUT)
+            r.raise_for_status()
+            models: Set[str] = set()
+            for m in r.json().get("models") or []:
+                models.update(_model_names(m.get("name") or m.get("model") or ""))
+            models.discard("")
+            ep.models = models
+            ep.healthy = True
+            ep.probed = True
+        except Exception as e:
+            ep.healthy = False
+            ep.last_error = f"probe: {type(e).__name__}: {e}"[:200]
+            ep.last_probe = time.time()
+            return
+        try:
+            r = await client.get(ep.base + "/api/ps", timeout=LLM_PROBE_TIMEOUT)
+            r.raise_for_status()
+            loaded: Set[str] = set()
+            for m in r.json().get("models") or []:
+                loaded.update(_model_names(m.get("name") or m.get("model") or ""))
+            ep.loaded = loaded
+        except Exception:
+            # older servers have no /api/ps; routing just ignores it
+            pass
+        ep.last_probe = time.time()
+
+    async def probe_all(self, client: httpx.AsyncClient):
+        await asyncio.gather(*[self.probe(client, ep) for ep in self.endpoints])
+
+    async def probe_forever(self, client: httpx.AsyncClient, interval: float = LLM_PROBE_INTERVAL):
+        while True:
+            await self.probe_all(client)
+            await asyncio.sleep(interval)
+
+    def stats(self) -> List[Dict]:
+        return [e.snapshot() for e in self.endpoints]
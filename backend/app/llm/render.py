@@ -1,7 +1,14 @@
+import os
 from typing import Dict, List
 from ..roles import ROLE_BY_ID
 from ..game.actions import Action, RoleID
-from ..game.state import GameState
+from ..game.state import SimState
+from ..game.transition import top_options
+
+# Larger scenarios don't list every option: the stable prefix only says how many
+# there are, and the current front-runners (plus any the action names) go in
+# the final message so the cached prefix stays the same turn to turn.
+RENDER_MAX_OPTIONS = int(os.getenv("RENDER_MAX_OPTIONS", "12"))
 
 def action_to_instruction(a: Action) -> str:
     if a.type == "PROPOSE":
@@ -28,7 +35,18 @@ def action_to_instruction(a: Action) -> str:
         return f"Make the final decision selecting '{a.option_id}'. Provide action plan + tradeoffs + metrics."
     return "Summarize progress and set next agenda."
 
-def build_render_messages(role_id: RoleID, s: GameState, a: Action, transcript_tail: List[Dict]) -> List[Dict[str, str]]:
+# Prompt layout is ordered for the model server's prompt (KV) cache: it reuses the
+# longest prefix shared with the previous request, so everything that is the same
+# across speakers and turns goes first and stays byte-identical:
+#   topic, options, summary of earlier rounds, transcript window (append-only within a block)
+# and what changes per turn goes last:
+#   speaker's role prompt, state summary, chosen action + instruction.
+# The role prompt is per speaker, so putting it first would break the shared
+# prefix at the first message on every speaker change.
+TAIL_BLOCK = 5
+
+def build_render_messages(role_id: RoleID, s: SimState, a: Action, transcript_tail: List[Dict],
+                          summary: str = "") -> List[Dict[str, str]]:
     role = ROLE_BY_ID[role_id]
     state_summary = {
         "budget_remaining": round(s.budget_remaining, 3),
@@ -39,18 +57,33 @@ def build_render_messages(role_id: RoleID, s: GameState, a: Action, transcript_t
         "decision_locked": s.decision_locked,
         "decision_option": s.decision_option,
     }
-    opt_summary = [{ "id": o.id, "name": o.name } for o in s.options]
+    shortlist = ""
+    if len(s.options) <= RENDER_MAX_OPTIONS:
+        opt_summary = [{ "id": o.id, "name": o.name } for o in s.options]
+        options_msg = f"Options: {opt_summary}"
+    else:
+        options_msg = f"Options: {len(s.options)} policy options are on the table; the front-runners are listed with each request."
+        picked = set(top_options(s, RENDER_MAX_OPTIONS))
+        picked.update(s.option_index[o] for o in (a.option_id, a.option_id_a, a.option_id_b) if o in s.option_index)
+        front = [{ "id": s.options[i].id, "name": s.options[i].name } for i in sorted(picked)]
+        shortlist = f"Front-runner options: {front}\n"
 
     msgs = [
-        {"role": "system", "content": role["system"]},
         {"role": "system", "content": f"Topic: {s.topic}"},
-        {"role": "system", "content": f"State summary: {state_summary}"},
-        {"role": "system", "content": f"Options: {opt_summary}"},
+        {"role": "system", "content": options_msg},
     ]
+    if summary:
+        msgs.append({"role": "system", "content": f"Summary of earlier rounds: {summary}"})
 
     for m in transcript_tail:
         msgs.append({"role": "user", "content": f'{m["role_name"]}: {m["content"]}'})
 
     instr = action_to_instruction(a)
-    msgs.append({"role": "user", "content": f"Chosen action: {a.model_dump()}\nInstruction: {instr}\nWrite 4-8 sentences. Be specific. Do not invent numeric facts."})
+    msgs.append({"role": "system", "content": role["system"]})
+    msgs.append({"role": "user", "content": (
+        f"{shortlist}"
+        f"State summary: {state_summary}\n"
+        f"Chosen action: {a.model_dump()}\nInstruction: {instr}\n"
+        "Write 4-8 sentences. Be specific. Do not invent numeric facts."
+    )})
     return msgs
@@ -0,0 +1,149 @@
+import asyncio
+import os
+import time
+from collections import OrderedDict, deque
+from typing import Deque, Dict, List, Optional
+
+# Admission control in front of the model server(s). Every LLM request takes a
+# slot here first: at most LLM_MAX_IN_FLIGHT per backend, higher priority
+# classes first, round-robin across sessions within a class.
+LLM_MAX_IN_FLIGHT = int(os.getenv("LLM_MAX_IN_FLIGHT", "4"))
+# /api/sim/start is refused with 429 once this many requests are queued
+LLM_MAX_QUEUE = int(os.getenv("LLM_MAX_QUEUE", "32"))
+
+PRIORITIES = {"interactive": 0, "judge": 1, "background": 2}
+
+def pct(xs, p):
+    if not xs:
+        return 0.0
+    s = sorted(xs)
+    return round(s[min(len(s) - 1, int(p / 100.0 * len(s)))], 3)
+
+class Ticket:
+    __slots__ = ("backend", "session_id", "priority", "enqueued", "started", "future")
+
+    def __init__(self, backend: str, session_id: str, priority: int):
+        self.backend = backend
+        self.session_id = session_id
+        self.priority = priority
+        self.enqueued = time.perf_counter()
+        self.started: Optional[float] = None
+        self.future: asyncio.Future = asyncio.get_running_loop().create_future()
+
+    @property
+    def wait_ms(self) -> float:
+        end = self.started if self.started is not None else time.perf_counter()
+        return (end - self.enqueued) * 1000.0
+
+class _Backend:
+    def __init__(self):
+        self.in_flight = 0
+        # one level per priority; each level is session_id -> FIFO of tickets
+        self.levels: List["OrderedDict[str, Deque[Ticket]]"] = [OrderedDict() for _ in PRIORITIES]
+
+    def queued(self, below: int = len(PRIORITIES)) -> int:
+        # tickets of the priority classes before `below`
+        return sum(len(q) for level in self.levels[:below] for q in level.values())
+
+    def pop_next(self) -> Optional[Ticket]:
+        for level in self.levels:
+            if not level:
+                continue
+            sid, q = next(iter(level.items()))
+            t = q.popleft()
+            # rotate the session to the back so other sessions get the next slot
+            del level[sid]
+            if q:
+                level[sid] = q
+            return t
+        return None
+
+    def remove(self, t: Ticket):
+        level = self.levels[t.priority]
+        q = level.get(t.session_id)
+        if q is None:
+            return
+        try:
+            q.remove(t)
+        except ValueError:
+            return
+        if not q:
+            del level[t.session_id]
+
+class LLMScheduler:
+    def __init__(self, max_in_flight: int = LLM_MAX_IN_FLIGHT, max_queue: int = LLM_MAX_QUEUE):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.backends: Dict[str, _Backend] = {}
+        self.granted = 0
+        self.waits: Dict[str, Deque[float]] = {p: deque(maxlen=1000) for p in PRIORITIES}
+
+    def _backend(self, name: str) -> _Backend:
+        b = self.backends.get(name)
+        if b is None:
+            b = _Backend()
+            self.backends[name] = b
+        return b
+
+    async def acquire(self, backend: str, session_id: Optional[str], priority: str = "interactive") -> Ticket:
+        b = self._backend(backend)
+        t = Ticket(backend, session_id or "", PRIORITIES[priority])
+        level = b.levels[t.priority]
+        level.setdefault(t.session_id, deque()).append(t)
+        self._dispatch(b)
+        try:
+            await t.future
+        except asyncio.CancelledError:
+            if t.future.done() and not t.future.cancelled():
+                # granted just as we were cancelled: give the slot back
+                self.release(t)
+            else:
+                b.remove(t)
+            raise
+        return t
+
+    def release(self, t: Ticket):
+        b = self._backend(t.backend)
+        b.in_flight -= 1
+        self._dispatch(b)
+
+    def _dispatch(self, b: _Backend):
+        while b.in_flight < self.max_in_flight:
+            t = b.pop_next()
+            if t is None:
+                return
+            if t.future.done():
+                continue
+            b.in_flight += 1
+            t.started = time.perf_counter()
+            self.granted += 1
+            name = next(k for k, v in PRIORITIES.items() if v == t.priority)
+            self.waits[name].append(t.wait_ms)
+            t.future.set_result(None)
+
+    def queue_depth(self) -> int:
+        return sum(b.queued() for b in self.backends.values())
+
+    def saturated(self) -> bool:
+        # background work (summaries, prefills) yields to everything else, so a backlog
+        # of it alone is no reason to turn sessions away
+        return sum(b.queued(PRIORITIES["background"]) for b in self.backends.values()) >= self.max_queue
+
+    def stats(self) -> Dict:
+        return {
+            "max_in_flight": self.max_in_flight,
+            "max_queue": self.max_queue,
+            "queue_depth": self.queue_depth(),
+            "granted": self.granted,
+            "backends": {
+                name: {
+                    "in_flight": b.in_flight,
+                    "queued": {p: sum(len(q) for q in b.levels[i].values()) for p, i in PRIORITIES.items()},
+                    "sessions_waiting": len({sid for level in b.levels for sid in level}),
+                }
+                for name, b in self.backends.items()
+            },
+            "wait_ms": {p: {"p50": pct(w, 50), "p95": pct(w, 95), "n": len(w)} for p, w in self.waits.items()},
+        }
+
+SCHEDULER = LLMScheduler()
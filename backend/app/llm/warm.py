@@ -0,0 +1,187 @@
+import asyncio
+import os
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional, Set
+
+import httpx
+
+from .ollama_client import CLIENT, LLM_KEEP_ALIVE, LLMClient, keep_alive_value
+from .pool import Endpoint, NoEndpointError, _model_names
+from .scheduler import pct
+from ..metrics import FIRST_TURN_TTFT
+
+# Model warm pool, run by the app lifespan. A model the server has to load first
+# costs seconds on the first turn that needs it, so:
+#   - LLM_WARM_MODELS are loaded on every endpoint serving them at startup
+#   - /api/sim/start warms the session's model on the endpoint its turns will use,
+#     while the viewer is still connecting (LLM_WARM_ON_START)
+#   - requests carry keep_alive (LLM_KEEP_ALIVE, ollama_client.py), so models in use
+#     stay loaded through quiet periods
+#   - with LLM_WARM_MAX_MODELS / LLM_WARM_MAX_BYTES set, every LLM_WARM_INTERVAL each
+#     endpoint's resident models (/api/ps) are checked, and over the limit, models no
+#     running session uses and idle for LLM_WARM_IDLE seconds are unloaded, least
+#     recently used first (configured ones last); a warm-up makes room the same way
+# Each session's first-turn TTFT is recorded as cold (the server reported a model
+# load over LLM_COLD_LOAD_MS) or warm.
+LLM_WARM_MODELS = [m.strip() for m in os.getenv("LLM_WARM_MODELS", "").split(",") if m.strip()]
+LLM_WARM_ON_START = os.getenv("LLM_WARM_ON_START", "1") == "1"
+LLM_WARM_INTERVAL = float(os.getenv("LLM_WARM_INTERVAL", "15"))
+LLM_WARM_IDLE = float(os.getenv("LLM_WARM_IDLE", "120"))
+LLM_WARM_MAX_MODELS = int(os.getenv("LLM_WARM_MAX_MODELS", "0"))
+LLM_WARM_MAX_BYTES = int(float(os.getenv("LLM_WARM_MAX_BYTES", "0")))
+LLM_COLD_LOAD_MS = float(os.getenv("LLM_COLD_LOAD_MS", "250"))
+
+def _short(name: str) -> str:
+    return _model_names(name)[-1]
+
+class WarmPool:
+    def __init__(self, client: LLMClient = CLIENT, preload: List[str] = LLM_WARM_MODELS):
+        self.client = client
+        self.preload = list(preload)
+        self.users: Dict[str, int] = {}         # model -> running sessions
+        self.last_used: Dict[str, float] = {}
+        self.resident: Dict[str, Dict[str, int]] = {}  # endpoint url -> {name: bytes}, from /api/ps
+        self.loading: Dict[tuple, asyncio.Task] = {}
+        self.tasks: Set[asyncio.Task] = set()
+        self.manager: Optional[asyncio.Task] = None
+        self.counters = {"loads": 0, "already_warm": 0, "unloads": 0, "failures": 0}
+        self.first_turns: Dict[str, Deque[float]] = {"cold": deque(maxlen=1000), "warm": deque(maxlen=1000)}
+
+    async def start(self):
+        now = time.time()
+        for m in self.preload:
+            self.last_used[m] = now
+            for ep in self.client.pool.candidates(m):
+                self._spawn(self.warm(m, ep=ep))
+        if LLM_WARM_MAX_MODELS or LLM_WARM_MAX_BYTES:
+            self.manager = asyncio.create_task(self.manage_forever())
+
+    async def close(self):
+        if self.manager is not None:
+            self.manager.cancel()
+            self.manager = None
+        for t in list(self.tasks):
+            t.cancel()
+
+    def _spawn(self, coro):
+        # fire and forget, but keep a reference until done
+        t = asyncio.create_task(coro)
+        self.tasks.add(t)
+        t.add_done_callback(self.tasks.discard)
+
+    def prewarm(self, model: str, session_id: Optional[str] = None):
+        # a session was created; its first turn comes once a viewer connects
+        self.last_used[model] = time.time()
+        if LLM_WARM_ON_START:
+            self._spawn(self.warm(model, session_id))
+
+    def acquire(self, model: str):
+        self.users[model] = self.users.get(model, 0) + 1
+        self.last_used[model] = time.time()
+
+    def release(self, model: str):
+        self.users[model] = max(0, self.users.get(model, 0) - 1)
+        self.last_used[model] = time.time()
+
+    async def warm(self, model: str, session_id: Optional[str] = None, ep: Optional[Endpoint] = None) -> bool:
+        if ep is None:
+            try:
+                # sticky: the endpoint this session's turns will be routed to
+                ep = self.client.pool.pick(model, session_id, sticky=session_id is not None)
+            except NoEndpointError:
+                return False
+        key = (ep.url, model)
+        task = self.loading.get(key)
+        if task is None:
+            task = self.loading[key] = asyncio.create_task(self._load(ep, model))
+            task.add_done_callback(lambda _: self.loading.pop(key, None))
+        return await asyncio.shield(task)
+
+    async def _load(self, ep: Endpoint, model: str) -> bool:
+        if LLM_WARM_MAX_MODELS or LLM_WARM_MAX_BYTES:
+            await self._relieve(ep, model)
+        try:
+            j = await self.client.load_model(ep, model, keep_alive_value(LLM_KEEP_ALIVE) if LLM_KEEP_ALIVE else None)
+            load_ms = (j.get("load_duration") or 0) / 1e6
+        except (httpx.HTTPError, ValueError):
+            self.counters["failures"] += 1
+            return False
+        ep.loaded.update(_model_names(model))
+        self.counters["loads" if load_ms >= LLM_COLD_LOAD_MS else "already_warm"] += 1
+        return True
+
+    async def _unload(self, ep: Endpoint, name: str) -> bool:
+        try:
+            await self.client.load_model(ep, name, keep_alive=0)
+        except (httpx.HTTPError, ValueError):
+            self.counters["failures"] += 1
+            return False
+        ep.loaded.difference_update(_model_names(name))
+        self.resident.get(ep.url, {}).pop(name, None)
+        self.counters["unloads"] += 1
+        return True
+
+    async def _ps(self, ep: Endpoint) -> Dict[str, int]:
+        try:
+            models = await self.client.running_models(ep)
+        except (httpx.HTTPError, ValueError):
+            return self.resident.get(ep.url, {})
+        resident = {m.get("name") or m.get("model"): int(m.get("size") or 0) for m in models}
+        resident.pop(None, None)
+        self.resident[ep.url] = resident
+        ep.loaded = {n for name in resident for n in _model_names(name)}
+        return resident
+
+    async def _relieve(self, ep: Endpoint, model: Optional[str] = None):
+        resident = dict(await self._ps(ep))
+        now = time.time()
+        # room for a model about to be loaded
+        incoming = int(model is not None and _short(model) not in {_short(n) for n in resident})
+
+        def over() -> bool:
+            if LLM_WARM_MAX_MODELS and len(resident) + incoming > LLM_WARM_MAX_MODELS:
+                return True
+            return bool(LLM_WARM_MAX_BYTES) and sum(resident.values()) > LLM_WARM_MAX_BYTES
+
+        idle = [name for name in resident
+                if not self.users.get(_short(name)) and now - self.last_used.get(_short(name), 0.0) >= LLM_WARM_IDLE]
+        idle.sort(key=lambda n: (_short(n) in self.preload, self.last_used.get(_short(n), 0.0)))
+        for name in idle:
+            if not over():
+                break
+            if await self._unload(ep, name):
+                resident.pop(name, None)
+
+    async def manage_forever(self, interval: float = LLM_WARM_INTERVAL):
+        while True:
+            await asyncio.sleep(interval)
+            for ep in self.client.pool.endpoints:
+                if ep.healthy:
+                    await self._relieve(ep)
+
+    def first_turn(self, model: str, meta: Dict):
+        # called with the first rendered turn's meta (ollama_client.stream_chat)
+        if meta.get("cached") or "ttft_ms" not in meta or "load_duration_ms" not in meta:
+            return
+        kind = "cold" if meta["load_duration_ms"] >= LLM_COLD_LOAD_MS else "warm"
+        self.first_turns[kind].append(meta["ttft_ms"])
+        FIRST_TURN_TTFT.observe(meta["ttft_ms"] / 1000.0, model, kind)
+
+    def stats(self) -> Dict:
+        now = time.time()
+        return {
+            "keep_alive": LLM_KEEP_ALIVE or None,
+            "preload": self.preload,
+            "warm_on_start": LLM_WARM_ON_START,
+            "max_models": LLM_WARM_MAX_MODELS,
+            "max_bytes": LLM_WARM_MAX_BYTES,
+            **self.counters,
+            "models": {m: {"sessions": self.users.get(m, 0), "idle_s": round(now - t, 1)}
+                       for m, t in self.last_used.items()},
+            "resident": {url: sorted(r) for url, r in self.resident.items()},
+            "first_turn_ttft_ms": {k: {"p50": pct(v, 50), "p95": pct(v, 95), "n": len(v)}
+                                   for k, v in self.first_turns.items()},
+        }
+
+WARM = WarmPool()
@@ -1,13 +1,50 @@
 import uuid
 import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse
 
 from .schemas import StartSimRequest
-from .store import STORE
+from .store import SESSION_ABANDON_ACTION, SESSION_ABANDON_GRACE, STORE
 from .orchestrator import run_simulation
+from .llm.ollama_client import CLIENT
+from .llm.cache import CACHE
+from .llm.scheduler import SCHEDULER
+from .llm.warm import WARM
+from .broadcast import BroadcastHub
+from .cluster.backend import CLUSTER
+from .cluster.resp import BackendUnavailable
+from .eventlog import EventLog, compact, log_path, read_lines
+from .protocol import ENCODINGS, PROTOCOL_VERSION, PROTOCOL_VERSIONS, encode_event, encode_frame
+from .metrics import REGISTRY, monitor_loop_lag
+from .game.search import shutdown_pool, start_pool
+from .scenario.engine import ScenarioError, resolve_scenario
+from .tracing import FORMATS as TRACE_FORMATS, load_trace, new_trace
+from .speculation import stats as speculation_stats
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # one pooled LLM client shared by every session for the process lifetime
+    await CLIENT.start()
+    # preloads LLM_WARM_MODELS in the background
+    await WARM.start()
+    await CLUSTER.start()
+    sweeper = asyncio.create_task(STORE.sweep_forever())
+    lag = asyncio.create_task(monitor_loop_lag())
+    try:
+        yield
+    finally:
+        sweeper.cancel()
+        lag.cancel()
+        shutdown_pool()
+        await STORE.drain()
+        await CLUSTER.close()
+        await WARM.close()
+        await CLIENT.close()
+        await CACHE.close()
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -17,69 +54,323 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.exception_handler(BackendUnavailable)
+async def backend_unavailable(request, exc: BackendUnavailable):
+    # the shared session backend is down or being redialled (see cluster/resp.py)
+    return JSONResponse(status_code=503, content={"ok": False, "error": "session_backend_unavailable"})
+
+def _on_finished(session_id: str, state: dict, task: asyncio.Task):
+    # whole event log on disk, so the session stays replayable after eviction; replays
+    # of a finished session read the file, so the ring needn't stay in memory until then
+    state["hub"].log.flush()
+    if state.get("trace") is not None:
+        state["trace"].save()
+    _cancel_abandon_timer(state)
+    if task.cancelled():
+        outcome = state.get("stop_reason") or "cancelled"
+    elif task.exception() is not None:
+        outcome = "error"
+    else:
+        outcome = "stopped" if state.get("stop") else "done"
+    STORE.finish(session_id, outcome)
+    CLUSTER.finished(session_id, outcome)
+    WARM.release(state["model"])
+
+def _stop(session_id: str, state: dict, reason: str):
+    # cancels the orchestrator mid-turn: the in-flight LLM stream is closed, so
+    # the model server stops generating, and background judge calls go with it
+    state["stop"] = True
+    state.setdefault("stop_reason", reason)
+    task = state.get("task")
+    if task is not None and not task.done():
+        task.cancel()
+    elif task is None:
+        STORE.finish(session_id, reason)
+
+def _cancel_abandon_timer(state: dict):
+    timer = state.pop("abandon_timer", None)
+    if timer is not None:
+        timer.cancel()
+
+def _watchers(state: dict) -> int:
+    # this worker's viewers, plus those following the session from other workers
+    return len(state["hub"].subscribers) + state.get("remote_viewers", 0)
+
+def _abandoned(session_id: str, state: dict):
+    state.pop("abandon_timer", None)
+    task = state.get("task")
+    if _watchers(state) or task is None or task.done():
+        return
+    if SESSION_ABANDON_ACTION == "cancel":
+        _stop(session_id, state, "abandoned")
+    else:
+        # the orchestrator waits on this; a turn being rendered is dropped and
+        # rendered again on resume, so nothing is generated in the meantime
+        state["resume"].clear()
+        turn = state.get("turn_task")
+        if turn is not None and not turn.done():
+            turn.cancel()
+        STORE.mark(session_id, "paused")
+        CLUSTER.status(session_id, "paused")
+
+def _viewer_left(session_id: str, state: dict):
+    if state.get("follower"):
+        n = len(state["hub"].subscribers)
+        CLUSTER.viewers(session_id, n)
+        if not n:
+            # nobody here watches it any more; a later viewer follows it afresh
+            CLUSTER.unfollow(session_id)
+            STORE.detach(session_id)
+        return
+    if _watchers(state) or SESSION_ABANDON_ACTION not in ("pause", "cancel"):
+        return
+    task = state.get("task")
+    if task is not None and not task.done() and "abandon_timer" not in state:
+        state["abandon_timer"] = asyncio.get_running_loop().call_later(
+            SESSION_ABANDON_GRACE, _abandoned, session_id, state)
+
+def _viewer_joined(session_id: str, state: dict):
+    if state.get("follower"):
+        CLUSTER.viewers(session_id, len(state["hub"].subscribers))
+        return
+    _cancel_abandon_timer(state)
+    if not state["resume"].is_set():
+        state["resume"].set()
+        STORE.mark(session_id, "running")
+        CLUSTER.status(session_id, "running")
+
 @app.post("/api/sim/start")
 async def start_sim(req: StartSimRequest):
-    session_id = str(uuid.uuid4())
+    # backpressure: don't admit new sessions while the LLM queue is saturated
+    if SCHEDULER.saturated():
+        return JSONResponse(
+            status_code=429,
+            headers={"Retry-After": "5"},
+            content={"ok": False, "error": "llm_saturated", "queue_depth": SCHEDULER.queue_depth()},
+        )
 
-    state = {
-        "topic": req.topic,
+    try:
+        scenario = resolve_scenario(req.scenario)
+    except ScenarioError as e:
+        return JSONResponse(status_code=400, content={"ok": False, "error": "invalid_scenario", "detail": str(e)})
+    # a scenario's own topic applies unless the request names one
+    topic = scenario.topic if scenario.topic and "topic" not in req.model_fields_set else req.topic
+
+    session_id = str(uuid.uuid4())
+    config = {
+        "topic": topic,
         "rounds": req.rounds,
         "model": req.model,
         "temperature": req.temperature,
-        "scenario": req.scenario or {},
+        "seed": req.seed,
+        "policy": req.policy,
+        "judge_mode": req.judge_mode,
+        "round_mode": req.round_mode,
+        "scenario": req.scenario,
+        "trace": req.trace,
+    }
+    if CLUSTER.enabled:
+        # any worker may end up running it: the one that gets its first websocket
+        await CLUSTER.create(session_id, config)
+    elif not STORE.create(session_id, _new_state(session_id, config, scenario)):
+        return JSONResponse(status_code=503, content={"ok": False, "error": "too_many_sessions"})
+    # admitted: load the model while the viewer connects, on the endpoint the session will use
+    WARM.prewarm(req.model, session_id)
+    return {"session_id": session_id}
+
+def _new_state(session_id: str, config: dict, scenario) -> dict:
+    state = {
+        **config,
+        "scenario": scenario,
         "transcript": [],
         "stop": False,
         "round_idx": 0,
-        "ws_clients": set(),
+        "hub": BroadcastHub(session_id),
         "task": None,
+        "resume": asyncio.Event(),
+        "trace": new_trace(session_id, config.get("trace")),
     }
-    STORE.create(session_id, state)
-    return {"session_id": session_id}
+    state["resume"].set()
+    return state
+
+def _control(session_id: str, state: dict, msg: str):
+    # owner side of a shared session: messages from the other workers
+    if msg == "stop" and state.get("status") != "finished":
+        _stop(session_id, state, "stopped")
+    elif msg == "viewers":
+        asyncio.create_task(_recount(session_id, state))
+
+async def _recount(session_id: str, state: dict):
+    try:
+        state["remote_viewers"] = await CLUSTER.remote_viewers(session_id)
+    except BackendUnavailable:
+        # counted again once the backend is back
+        return
+    if _watchers(state):
+        _viewer_joined(session_id, state)
+    else:
+        _viewer_left(session_id, state)
+
+async def _attach(session_id: str):
+    # a session created through the shared backend: run it here if nobody does yet, else follow it
+    rec = await CLUSTER.record(session_id)
+    if rec is None or rec["status"] == "finished":
+        return None
+    if await CLUSTER.claim(session_id):
+        state = _new_state(session_id, {k: rec[k] for k in rec if k not in ("status", "outcome", "stop", "owner")},
+                           resolve_scenario(rec["scenario"]))
+        state["stop"] = rec["stop"]
+        if not STORE.create(session_id, state):
+            return None
+        state["hub"].forward = lambda data: CLUSTER.forward(session_id, data)
+        CLUSTER.own(session_id, lambda msg: _control(session_id, state, msg))
+        return state
+    existing = STORE.get(session_id)
+    if existing is not None:
+        # another viewer on this worker attached while we waited
+        return existing
+    state = {
+        "topic": rec["topic"],
+        "rounds": rec["rounds"],
+        "model": rec["model"],
+        "status": "following",
+        "follower": True,
+        "hub": BroadcastHub(session_id, log=EventLog(session_id, persist=False)),
+        "task": None,
+    }
+    if not STORE.create(session_id, state):
+        return None
+    try:
+        await CLUSTER.follow(session_id, state["hub"].ingest)
+    except BackendUnavailable:
+        STORE.detach(session_id)
+        raise
+    return state
 
 @app.post("/api/sim/stop/{session_id}")
 async def stop_sim(session_id: str):
     state = STORE.get(session_id)
-    if not state:
+    if state and not state.get("follower"):
+        if state.get("status") != "finished":
+            _stop(session_id, state, "stopped")
+        return {"ok": True}
+    rec = await CLUSTER.record(session_id)
+    if not rec:
         return {"ok": False, "error": "session_not_found"}
-    state["stop"] = True
+    if rec["status"] != "finished":
+        # to whichever worker runs it
+        await CLUSTER.stop(session_id)
     return {"ok": True}
 
+@app.get("/api/sim/result/{session_id}")
+async def sim_result(session_id: str):
+    state = STORE.get(session_id)
+    if state is not None and not state.get("follower") and state.get("status") != "finished":
+        return {"ok": False, "error": "session_not_finished", "status": state.get("status")}
+    if state is None or state.get("follower"):
+        rec = await CLUSTER.record(session_id)
+        if rec is not None and rec["status"] != "finished":
+            return {"ok": False, "error": "session_not_finished", "status": rec["status"]}
+    result = await STORE.load_result(session_id)
+    if result is None:
+        return {"ok": False, "error": "session_not_found"}
+    return {"ok": True, "result": result}
+
+@app.get("/api/sim/trace/{session_id}")
+async def sim_trace(session_id: str, format: str = "chrome"):
+    # Chrome trace JSON (chrome://tracing, ui.perfetto.dev) or OTLP/JSON of a traced session
+    if format not in TRACE_FORMATS:
+        return JSONResponse(status_code=400, content={"ok": False, "error": "invalid_format", "formats": list(TRACE_FORMATS)})
+    state = STORE.get(session_id)
+    trace = state.get("trace") if state is not None else None
+    if trace is None:
+        trace = load_trace(session_id)
+    if trace is None:
+        return JSONResponse(status_code=404, content={"ok": False, "error": "trace_not_found"})
+    return trace.export(format)
+
+@app.get("/api/sim/sessions")
+async def list_sessions():
+    return {"max_sessions": STORE.max_sessions, "evicted": STORE.evicted, "sessions": STORE.summary()}
+
+@app.get("/api/llm/stats")
+async def llm_stats():
+    return {"pool": CLIENT.pool_stats(), "cache": CACHE.snapshot(), "scheduler": SCHEDULER.stats(),
+            "sessions": CLUSTER.stats(), "warm": WARM.stats(), "speculation": speculation_stats()}
+
+@app.get("/metrics")
+async def metrics():
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/api/sim/hub/{session_id}")
+async def hub_stats(session_id: str):
+    state = STORE.get(session_id)
+    if not state:
+        return {"ok": False, "error": "session_not_found"}
+    return {"ok": True, "hub": state["hub"].stats()}
+
 @app.websocket("/ws/sim/{session_id}")
 async def ws_sim(websocket: WebSocket, session_id: str):
     await websocket.accept()
+    q = websocket.query_params
+    from_seq = q.get("from")
+    from_seq = int(from_seq) if from_seq and from_seq.isdigit() else None
+    # protocol negotiation (see protocol.py): ?proto=3[&enc=bin]; unknown values fall back to v2 / json
+    proto = q.get("proto")
+    proto = int(proto) if proto and proto.isdigit() and int(proto) in PROTOCOL_VERSIONS else PROTOCOL_VERSION
+    enc = q.get("enc") if q.get("enc") in ENCODINGS else "json"
+
     state = STORE.get(session_id)
+    if not state and CLUSTER.enabled:
+        try:
+            state = await _attach(session_id)
+        except BackendUnavailable:
+            await websocket.send_json({"type": "error", "message": "session_backend_unavailable"})
+            await websocket.close(code=1013)
+            return
     if not state:
-        await websocket.send_json({"type": "error", "message": "session_not_found"})
+        # evicted (or from another run): replay the on-disk log if there is one
+        lines = await asyncio.to_thread(read_lines, log_path(session_id), from_seq or 1)
+        events = compact(lines) if lines else [{"type": "error", "message": "session_not_found"}]
+        if proto >= 3:
+            frame = encode_frame([(e, encode_event(e)) for e in events], enc)
+            await (websocket.send_bytes(frame) if isinstance(frame, bytes) else websocket.send_text(frame))
+        else:
+            for evt in events:
+                await websocket.send_json(evt)
         await websocket.close()
         return
 
-    state["ws_clients"].add(websocket)
-
-    async def ws_send(evt):
-        # fan-out to all clients in this session
-        dead = []
-        for ws in list(state["ws_clients"]):
-            try:
-                await ws.send_json(evt)
-            except Exception:
-                dead.append(ws)
-        for ws in dead:
-            state["ws_clients"].discard(ws)
+    hub = state["hub"]
+    if from_seq is None and state.get("status") == "finished":
+        from_seq = 1
+    sub = await hub.subscribe(websocket, from_seq, proto=proto, enc=enc)
 
     try:
         # Start orchestration once per session when first client connects
-        if state["task"] is None:
-            state["task"] = asyncio.create_task(run_simulation(session_id, state, ws_send))
+        if state["task"] is None and state.get("status") != "finished" and not state.get("follower"):
+            if state.get("policy") == "lookahead":
+                start_pool()
+            state["task"] = asyncio.create_task(run_simulation(session_id, state, hub.send))
+            state["task"].add_done_callback(lambda t: _on_finished(session_id, state, t))
+            STORE.mark(session_id, "running")
+            WARM.acquire(state["model"])
+        else:
+            _viewer_joined(session_id, state)
 
         while True:
-            # keep connection alive; ignore any inbound messages for now
-            await websocket.receive_text()
+            # inbound: {"type": "resync"} after a seq gap; anything else is ignored
+            msg = await websocket.receive_text()
+            if '"resync"' in msg:
+                hub.resync(sub)
 
     except WebSocketDisconnect:
-        state["ws_clients"].discard(websocket)
+        pass
     except Exception:
-        state["ws_clients"].discard(websocket)
         try:
             await websocket.close()
         except Exception:
             pass
+    finally:
+        hub.unsubscribe(sub)
+        _viewer_left(session_id, state)
@@ -0,0 +1,179 @@
+import asyncio
+import os
+from bisect import bisect_left
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from .store import STORE
+
+# In-process metrics, exposed in the Prometheus text format at /metrics.
+# Recording is a dict lookup plus a bisect over a short bucket list, cheap
+# enough to stay on under load; nothing is computed until a scrape.
+METRICS_LOOP_LAG_INTERVAL = float(os.getenv("METRICS_LOOP_LAG_INTERVAL", "0.5"))
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+FAST_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+RATE_BUCKETS = (1, 2, 5, 10, 20, 30, 50, 75, 100, 150, 200, 400)
+
+def _escape(v: str) -> str:
+    return str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{k}="{_escape(v)}"' for k, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+def _num(x: float) -> str:
+    if x == float("inf"):
+        return "+Inf"
+    return repr(float(x)) if isinstance(x, float) else str(x)
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help, labelnames)
+        self.values: Dict[Tuple, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0):
+        self.values[labels] = self.values.get(labels, 0.0) + amount
+
+    def render(self) -> List[str]:
+        out = self.header()
+        for lv, v in self.values.items():
+            out.append(f"{self.name}{_labels(self.labelnames, lv)} {_num(v)}")
+        return out
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (),
+                 fn: Optional[Callable[[], Dict[Tuple, float]]] = None):
+        super().__init__(name, help, labelnames)
+        self.values: Dict[Tuple, float] = {}
+        # read at scrape time instead of being kept up to date on the hot path
+        self.fn = fn
+
+    def set(self, value: float, *labels: str):
+        self.values[labels] = value
+
+    def render(self) -> List[str]:
+        out = self.header()
+        values = self.fn() if self.fn is not None else self.values
+        for lv, v in values.items():
+            out.append(f"{self.name}{_labels(self.labelnames, lv)} {_num(v)}")
+        return out
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [per-bucket counts (+Inf last), sum, count]
+        self.series: Dict[Tuple, list] = {}
+
+    def observe(self, value: float, *labels: str):
+        s = self.series.get(labels)
+        if s is None:
+            s = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            self.series[labels] = s
+        s[0][bisect_left(self.buckets, value)] += 1
+        s[1] += value
+        s[2] += 1
+
+    def render(self) -> List[str]:
+        out = self.header()
+        for lv, (counts, total, n) in self.series.items():
+            acc = 0
+            for le, c in zip(self.buckets + (float("inf"),), counts):
+                acc += c
+                le_label = 'le="%s"' % _num(le)
+                out.append(f"{self.name}_bucket{_labels(self.labelnames, lv, le_label)} {acc}")
+            out.append(f"{self.name}_sum{_labels(self.labelnames, lv)} {_num(total)}")
+            out.append(f"{self.name}_count{_labels(self.labelnames, lv)} {n}")
+        return out
+
+class Registry:
+    def __init__(self):
+        self.metrics: List[_Metric] = []
+
+    def register(self, m: _Metric) -> _Metric:
+        self.metrics.append(m)
+        return m
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for m in self.metrics:
+            lines.extend(m.render())
+        return "\n".join(lines) + "\n"
+
+REGISTRY = Registry()
+
+LLM_TTFT = REGISTRY.register(Histogram(
+    "sim_llm_ttft_seconds", "Time from request to first streamed token.", ("model", "role")))
+LLM_TOKENS_PER_SECOND = REGISTRY.register(Histogram(
+    "sim_llm_tokens_per_second", "Generation rate of a streamed reply.", ("model", "role"), RATE_BUCKETS))
+LLM_RENDER = REGISTRY.register(Histogram(
+    "sim_llm_render_seconds", "Total time of a streamed render call, queueing included.", ("model", "role")))
+LLM_ERRORS = REGISTRY.register(Counter(
+    "sim_llm_errors_total", "LLM requests that failed.", ("model", "kind")))
+JUDGE_LATENCY = REGISTRY.register(Histogram(
+    "sim_judge_seconds", "Judge call latency, per round or per turn.", ("model", "mode")))
+JUDGE_PARSE_FAILURES = REGISTRY.register(Counter(
+    "sim_judge_parse_failures_total", "Judge replies that were not a JSON object.", ("model",)))
+JUDGE_CALLS = REGISTRY.register(Counter(
+    "sim_judge_calls_total", "judge_round calls that got a reply.", ("model",)))
+JUDGE_OUTCOMES = REGISTRY.register(Counter(
+    "sim_judge_outcomes_total", "Judge replies by how they were read: early, complete, repaired or fallback.",
+    ("model", "outcome")))
+JUDGE_TOKENS = REGISTRY.register(Counter(
+    "sim_judge_tokens_total", "Streamed judge tokens: used, or wasted (past the last key, or in a reply that failed).",
+    ("model", "kind")))
+FIRST_TURN_TTFT = REGISTRY.register(Histogram(
+    "sim_first_turn_ttft_seconds", "Time to first token of a session's first turn, by whether the model had to load.",
+    ("model", "start")))
+WS_FANOUT = REGISTRY.register(Histogram(
+    "sim_ws_fanout_seconds", "Event publish to websocket write completed, per viewer.", (), FAST_BUCKETS))
+LOOP_LAG = REGISTRY.register(Histogram(
+    "sim_event_loop_lag_seconds", "How late the event loop woke a periodic timer.", (), FAST_BUCKETS))
+
+def observe_stream(model: str, role: str, meta: Dict):
+    if "ttft_ms" in meta:
+        LLM_TTFT.observe(meta["ttft_ms"] / 1000.0, model, role)
+    if "tokens_per_s" in meta:
+        LLM_TOKENS_PER_SECOND.observe(meta["tokens_per_s"], model, role)
+    if "total_ms" in meta:
+        LLM_RENDER.observe(meta["total_ms"] / 1000.0, model, role)
+
+async def monitor_loop_lag(interval: float = METRICS_LOOP_LAG_INTERVAL):
+    loop = asyncio.get_running_loop()
+    while True:
+        t0 = loop.time()
+        await asyncio.sleep(interval)
+        LOOP_LAG.observe(max(0.0, loop.time() - t0 - interval))
+
+# sessions and clients are read from the store at scrape time
+def _sessions_by_status() -> Dict[Tuple, float]:
+    out: Dict[Tuple, float] = {}
+    for s in STORE.sessions.values():
+        k = (s.get("status") or "unknown",)
+        out[k] = out.get(k, 0) + 1
+    return out
+
+def _clients() -> Dict[Tuple, float]:
+    return {(): sum(len(s["hub"].subscribers) for s in STORE.sessions.values() if s.get("hub") is not None)}
+
+REGISTRY.register(Gauge("sim_sessions", "Sessions held in memory, by status.", ("status",), fn=_sessions_by_status))
+REGISTRY.register(Gauge("sim_ws_clients", "Connected websocket viewers.", fn=_clients))
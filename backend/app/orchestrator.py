@@ -1,96 +1,288 @@
 import asyncio
+import random
+import time
 from typing import Dict, Any, List
 from .roles import ROLE_BY_ID
-from .scenario.defaults import default_options
-from .game.state import init_state, GameState
+from .scenario.engine import resolve_scenario
+from .game.state import SimState
 from .game.transition import transition, call_vote
 from .game.policy import choose_action
+from .game.search import choose_action_lookahead
 from .game.utilities import utilities
-from .llm.render import build_render_messages
+from .llm.context import SessionContext, messages_tokens, render_options
 from .llm.ollama_client import stream_chat
-from .llm.judge import judge_round
+from .llm.warm import WARM
+from .llm.judge import judge_round, judge_turn, judge_turn_prompt, merge_turn_scores
+from .protocol import PROTOCOL_VERSION, StateTracker
+from .speculation import SPECULATIVE_PREFILL, Speculation
+from . import tracing
 
 ROLE_ORDER = ["water_minister", "farmer", "environment", "citizen", "minister"]
+# the chair closes every round; in simultaneous mode the others move at once before it
+CHAIR = "minister"
 
-def fuse_soft_into_state(s: GameState, judge: Dict):
+def fuse_soft_into_state(s: SimState, judge: Dict):
     # hybrid fusion
     s.public_support = min(1.0, max(0.0, 0.60 * s.public_support + 0.40 * float(judge.get("public_acceptance", 0.5))))
     s.fairness_index = min(1.0, max(0.0, 0.70 * s.fairness_index + 0.30 * float(judge.get("fairness_perception", 0.5))))
 
+async def wait_resumed(state: Dict[str, Any], ws_send):
+    resume = state.get("resume")
+    if resume is not None and not resume.is_set():
+        # nobody watching (see main.py); wait for a viewer instead of generating
+        await ws_send({"type": "paused"})
+        await resume.wait()
+        await ws_send({"type": "resumed"})
+
+async def render_turn(state: Dict[str, Any], session_id: str, role_id: str, msgs: List[Dict[str, str]], seed,
+                      meta: Dict[str, Any], acc: List[str], ws_send, on_delta=None):
+    with tracing.span("render", track=role_id, prompt_tokens=meta.get("prompt_tokens_est")):
+        async for delta in stream_chat(model=state["model"], messages=msgs, temperature=state["temperature"], seed=seed,
+                                       session_id=session_id, priority="interactive", meta=meta, role=role_id,
+                                       options=render_options(role_id)):
+            acc.append(delta)
+            if on_delta is not None:
+                on_delta(acc)
+            await ws_send({"type": "delta", "role": role_id, "text": delta})
+
+async def render_turns(state: Dict[str, Any], session_id: str, jobs: Dict[str, List[Dict[str, str]]], seed,
+                       ws_send, on_delta=None) -> Dict[str, tuple]:
+    # Renders the given turns (role -> prompt) concurrently, each one's deltas tagged
+    # with its role, and returns role -> (message, meta). A pause (main.py) cancels
+    # the ones still rendering; their streams are closed already, and they are
+    # rendered again, from scratch, once resumed.
+    done: Dict[str, tuple] = {}
+
+    async def one(role_id: str, msgs: List[Dict[str, str]]):
+        acc: List[str] = []
+        meta: Dict[str, Any] = {"prompt_tokens_est": messages_tokens(msgs)}
+        await render_turn(state, session_id, role_id, msgs, seed, meta, acc, ws_send, on_delta)
+        done[role_id] = ("".join(acc).strip(), meta)
+        await ws_send({"type": "turn_end", "role": role_id, "message": done[role_id][0], "data": meta})
+
+    async def render_all(coros):
+        tasks = [asyncio.create_task(c) for c in coros]
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            # one failed: don't leave the others streaming
+            for t in tasks:
+                t.cancel()
+            raise
+
+    while True:
+        group = asyncio.create_task(render_all([one(r, m) for r, m in jobs.items() if r not in done]))
+        state["turn_task"] = group
+        try:
+            await group
+            return done
+        except asyncio.CancelledError:
+            if not group.cancelled() or state.get("stop") or state["resume"].is_set():
+                raise
+            for role_id in jobs:
+                if role_id not in done:
+                    await ws_send({"type": "turn_reset", "role": role_id})
+            await wait_resumed(state, ws_send)
+        finally:
+            state["turn_task"] = None
+
+def _traced_send(ws_send):
+    async def send(evt: Dict[str, Any]):
+        with tracing.span("ws_send", type=evt["type"]):
+            await ws_send(evt)
+    return send
+
 async def run_simulation(session_id: str, state: Dict[str, Any], ws_send):
-    # Init structured state
-    opts = default_options()
-    gs = init_state(topic=state["topic"], options=opts)
+    # LLM calls running alongside the turn loop (incremental judge); never outlive the session
+    background: List[asyncio.Task] = []
+    trace = state.get("trace")
+    if trace is not None:
+        # sampled for tracing (see tracing.py): this task and the tasks it starts record spans
+        tracing.activate(trace)
+        ws_send = _traced_send(ws_send)
+    try:
+        await _run_simulation(session_id, state, ws_send, background)
+    except asyncio.CancelledError:
+        # stopped, or abandoned by its viewers (main.py): cancelled mid-turn, so the
+        # in-flight stream is already closed; tell anyone still watching why
+        if state.get("stop"):
+            await ws_send({"type": "stopped", "reason": state.get("stop_reason", "stopped")})
+        raise
+    except Exception as e:
+        # surface failures (e.g. model server errors) instead of leaving viewers hanging
+        await ws_send({"type": "error", "message": f"{type(e).__name__}: {e}"})
+        raise
+    finally:
+        for t in background:
+            if not t.done():
+                t.cancel()
+            elif not t.cancelled():
+                t.exception()  # mark retrieved; a failure only matters if the round awaited it
+
+async def _run_simulation(session_id: str, state: Dict[str, Any], ws_send, background: List[asyncio.Task]):
+    # Init structured state from the session's compiled scenario (see scenario/engine.py)
+    scenario = state.get("scenario") or resolve_scenario()
+    gs = scenario.new_state(state["topic"])
+
+    seed = state.get("seed")
+    # the session's own generator, seeded from the OS when there is no seed; speculation
+    # rewinds it, which must not touch the module-level one other sessions draw from
+    rng = random.Random(seed)
 
     transcript: List[Dict] = []
     state["transcript"] = transcript
     state["game_state"] = gs
 
-    await ws_send({"type": "session_start", "state": gs.model_dump()})
+    # one full state up front, then only what changed (see protocol.py)
+    tracker = StateTracker()
+    await ws_send({"type": "session_start", "proto": PROTOCOL_VERSION, "state": tracker.full(gs)})
+
+    incremental = state.get("judge_mode") == "incremental"
+    simultaneous = state.get("round_mode") == "simultaneous"
+    ctx = SessionContext(state["model"], seed=seed, session_id=session_id)
+
+    async def choose(role_id: str, s: SimState):
+        search_meta: Dict[str, Any] = {}
+        with tracing.span("choose_action", track=role_id, policy=state.get("policy")):
+            if state.get("policy") == "lookahead":
+                a = await choose_action_lookahead(s, role_id, state["rounds"], rng=rng,
+                                                  deterministic=seed is not None, meta=search_meta)
+            else:
+                option_ids = [o.id for o in s.options]
+                a = choose_action(role_id, option_ids, round_idx=s.round_idx, last_decision_locked=s.decision_locked, rng=rng)
+        return a, search_meta
 
+    # the next speaker's action and prompt prefix, worked out during the current turn (speculation.py)
+    spec = None
+
+    trace = tracing.current()
     for r in range(1, state["rounds"] + 1):
         gs.round_idx = r
+        t_round = time.perf_counter_ns()
         round_msgs = []
+        judge_tasks: List[asyncio.Task] = []
+
+        # sequential: one speaker at a time, each hearing the ones before. simultaneous: every
+        # role but the chair moves at once, from the state the round started with; their
+        # turns are applied afterwards in ROLE_ORDER, and the chair speaks last
+        if simultaneous:
+            groups = [[role_id for role_id in ROLE_ORDER if role_id != CHAIR], [CHAIR]]
+        else:
+            groups = [[role_id] for role_id in ROLE_ORDER]
 
-        for role_id in ROLE_ORDER:
+        for gi, group in enumerate(groups):
             if state.get("stop"):
                 await ws_send({"type": "stopped"})
                 return
+            await wait_resumed(state, ws_send)
 
-            gs.t += 1
-            gs.speaker = role_id
-            await ws_send({"type": "turn_start", "role": role_id, "state": gs.model_dump()})
-
-            option_ids = [o.id for o in gs.options]
-            a = choose_action(role_id, option_ids, round_idx=r, last_decision_locked=gs.decision_locked)
-
-            await ws_send({"type": "action_selected", "role": role_id, "action": a.model_dump()})
-
-            # Render message using LLM based on action
-            tail = transcript[-6:]  # small context window
-            msgs = build_render_messages(role_id, gs, a, tail)
-
-            acc = []
-            async for delta in stream_chat(model=state["model"], messages=msgs, temperature=state["temperature"]):
-                acc.append(delta)
-                await ws_send({"type": "delta", "role": role_id, "text": delta})
-
-            final = "".join(acc).strip()
-            await ws_send({"type": "turn_end", "role": role_id, "message": final})
-
-            turn = {
-                "role_id": role_id,
-                "role_name": ROLE_BY_ID[role_id]["name"],
-                "action": a.model_dump(),
-                "content": final,
-                "round_idx": r,
-                "t": gs.t,
-            }
-            transcript.append(turn)
-            round_msgs.append(turn)
-
-            # Apply deterministic transition
-            gs = transition(gs, role_id, a)
-            await ws_send({"type": "state_update", "state": gs.model_dump()})
-
-            # If Minister decides, end early
-            if role_id == "minister" and a.type == "DECIDE":
-                gs.decision_locked = True
-                gs.decision_option = a.option_id or gs.decision_option
-                await ws_send({"type": "decision", "data": {"decision_option": gs.decision_option}, "state": gs.model_dump()})
-                pay = utilities(gs)
-                await ws_send({"type": "payoffs", "data": {"utilities": pay}, "state": gs.model_dump()})
-                await ws_send({"type": "done"})
-                return
+            moves = []
+            for role_id in group:
+                gs.t += 1
+                gs.speaker = role_id
+                t_turn = time.perf_counter_ns()
+                await ws_send({"type": "turn_start", "role": role_id, "patch": tracker.patch(gs)})
+
+                if spec is not None and spec.matches(role_id, gs):
+                    a, search_meta = await spec.take()
+                else:
+                    if spec is not None:
+                        # something besides the last turn changed the state
+                        await spec.discard()
+                    a, search_meta = await choose(role_id, gs)
+                spec = None
+
+                evt = {"type": "action_selected", "role": role_id, "action": a.model_dump()}
+                if search_meta:
+                    evt["data"] = search_meta
+                await ws_send(evt)
+
+                # Render message using LLM based on action; prompt fitted to the token budget
+                with tracing.span("build_render_messages", track=role_id):
+                    msgs = ctx.messages(role_id, gs, a, transcript)
+                moves.append((role_id, a, msgs, gs.t, t_turn))
+
+            if SPECULATIVE_PREFILL and not simultaneous and gi + 1 < len(groups):
+                role_id, a = moves[0][:2]
+                if a.type != "DECIDE":
+                    # the state the next speaker will see; judge scores are only fused at round end
+                    basis = transition(gs.copy(), role_id, a)
+                    basis.t += 1
+                    basis.speaker = groups[gi + 1][0]
+                    spec = Speculation(basis.speaker, basis, rng, choose, role_id, transcript, ctx, state["model"],
+                                       session_id)
+                    background.extend(spec.tasks())
+
+            rendered = await render_turns(state, session_id, {m[0]: m[2] for m in moves}, seed, ws_send,
+                                          spec.on_delta if spec is not None else None)
+
+            for role_id, a, msgs, t, t_turn in moves:
+                final, meta = rendered[role_id]
+                if t == 1:
+                    # cold vs warm start of the session's model (llm/warm.py)
+                    WARM.first_turn(state["model"], meta)
+
+                turn = {
+                    "role_id": role_id,
+                    "role_name": ROLE_BY_ID[role_id]["name"],
+                    "action": a.model_dump(),
+                    "content": final,
+                    "round_idx": r,
+                    "t": t,
+                }
+                transcript.append(turn)
+                round_msgs.append(turn)
+
+                # Apply deterministic transition
+                with tracing.span("transition", track=role_id, action=a.type):
+                    gs = transition(gs, role_id, a)
+                await ws_send({"type": "state_update", "patch": tracker.patch(gs)})
+
+                if incremental:
+                    # score this turn while the next speaker renders; prompt built now, from this turn's state
+                    jmsgs = judge_turn_prompt(gs, turn, round_msgs[:-1])
+                    task = asyncio.create_task(judge_turn(state["model"], jmsgs, role_id, seed=seed, session_id=session_id))
+                    judge_tasks.append(task)
+                    background.append(task)
+
+                if trace is not None:
+                    trace.add("turn", t_turn, time.perf_counter_ns(), role=role_id, t=t, action=a.type)
+
+                # If Minister decides, end early
+                if role_id == CHAIR and a.type == "DECIDE":
+                    # the game is over; this round's turn scores would change nothing
+                    for task in judge_tasks:
+                        task.cancel()
+                    gs.decision_locked = True
+                    gs.decision_option = a.option_id or gs.decision_option
+                    await ws_send({"type": "decision", "data": {"decision_option": gs.decision_option}, "patch": tracker.patch(gs)})
+                    pay = utilities(gs)
+                    await ws_send({"type": "payoffs", "data": {"utilities": pay}, "patch": tracker.patch(gs)})
+                    await ws_send({"type": "done"})
+                    return
 
         # End of round: judge + fuse
-        judge = await judge_round(model=state["model"], s=gs, round_transcript=round_msgs)
-        fuse_soft_into_state(gs, judge)
-        await ws_send({"type": "judge_scores", "data": judge, "state": gs.model_dump()})
+        if incremental:
+            # earlier turns were scored while later ones rendered; only the last turn's call is left to wait on
+            judge = merge_turn_scores(list(await asyncio.gather(*judge_tasks)))
+            background[:] = [t for t in background if not t.done()]
+        else:
+            judge = await judge_round(model=state["model"], s=gs, round_transcript=round_msgs, seed=seed, session_id=session_id)
+        with tracing.span("fuse_soft_into_state"):
+            fuse_soft_into_state(gs, judge)
+        await ws_send({"type": "judge_scores", "round_idx": r, "data": judge, "patch": tracker.patch(gs)})
 
         # Minister vote-lock heuristic
         best = call_vote(gs)
-        await ws_send({"type": "round_end", "data": {"best_option": best}, "state": gs.model_dump()})
+        await ws_send({"type": "round_end", "data": {"best_option": best}, "patch": tracker.patch(gs)})
+
+        if r < state["rounds"]:
+            # fold older rounds into the rolling summary (see llm/context.py)
+            with tracing.span("context_advance"):
+                ctx.advance(transcript, background)
+
+        if trace is not None:
+            trace.add("round", t_round, time.perf_counter_ns(), round=r)
 
         # If decision locked, next minister likely decides
         if gs.decision_locked and r < state["rounds"]:
@@ -101,7 +293,7 @@ async def run_simulation(session_id: str, state: Dict[str, Any], ws_send):
         best = call_vote(gs)
         gs.decision_option = best
 
-    await ws_send({"type": "decision", "data": {"decision_option": gs.decision_option}, "state": gs.model_dump()})
+    await ws_send({"type": "decision", "data": {"decision_option": gs.decision_option}, "patch": tracker.patch(gs)})
     pay = utilities(gs)
-    await ws_send({"type": "payoffs", "data": {"utilities": pay}, "state": gs.model_dump()})
+    await ws_send({"type": "payoffs", "data": {"utilities": pay}, "patch": tracker.patch(gs)})
     await ws_send({"type": "done"})
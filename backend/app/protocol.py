@@ -0,0 +1,171 @@
+import json
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+from .game.state import SimState
+from .roles import ROLE_ORDER
+
+# Wire protocol for /ws/sim.
+#   v2: every event carries a per-session "seq". State travels as one full
+#       "state" (session_start, or a "snapshot" sent on join/resync) followed by
+#       "patch" objects holding only what changed since the previous event.
+#       Patches deep-merge into the client's copy: nested objects merge,
+#       any other value (including null) replaces.
+#       A client that sees a seq gap sends {"type": "resync"} and gets a fresh snapshot.
+#   v3: opt-in with ?proto=3 on the websocket URL; same events and seq rules as v2
+#       (events still say "proto": 2), only the framing differs.
+#       Events are batched into frames (bounded by time and size, see broadcast.py);
+#       runs of deltas from one role in a frame are merged into a single delta
+#       carrying "from_seq" (first) and "seq" (last), as in log catch-up.
+#       Text frames ("enc=json", the default) are JSON arrays of events.
+#       Binary frames ("enc=bin") are a sequence of records:
+#         0x01 delta: varint seq, varint seq - from_seq, u8 role index (ROLE_ORDER),
+#                     varint byte length, UTF-8 text
+#         0x00 other: varint byte length, UTF-8 JSON of the event
+#       permessage-deflate is negotiated by the websocket handshake (on in uvicorn).
+PROTOCOL_VERSION = 2
+PROTOCOL_VERSIONS = (2, 3)
+ENCODINGS = ("json", "bin")
+
+_ROLE_CODE = {r: i for i, r in enumerate(ROLE_ORDER)}
+
+_SCALARS = (
+    "t", "round_idx", "speaker", "budget_remaining", "infrastructure_status", "restriction_level",
+    "groundwater_risk", "economic_stress", "public_support", "fairness_index",
+    "decision_locked", "decision_option",
+)
+
+class StateTracker:
+    # Remembers what was last sent for one SimState and produces patches against it.
+
+    def __init__(self):
+        self.scalars: Optional[List[Any]] = None
+        self.support: Optional[List[List[float]]] = None
+
+    def full(self, s: SimState) -> Dict[str, Any]:
+        self._remember(s)
+        return s.snapshot()
+
+    def patch(self, s: SimState) -> Dict[str, Any]:
+        if self.scalars is None:
+            return self.full(s)
+        out: Dict[str, Any] = {}
+        for i, k in enumerate(_SCALARS):
+            v = getattr(s, k)
+            if v != self.scalars[i]:
+                out[k] = v
+                self.scalars[i] = v
+        sup: Dict[str, Dict[str, float]] = {}
+        ids = s.option_ids
+        for role, row, prev in zip(ROLE_ORDER, s.support, self.support):
+            for oi, v in enumerate(row):
+                if v != prev[oi]:
+                    sup.setdefault(role, {})[ids[oi]] = v
+                    prev[oi] = v
+        if sup:
+            out["support"] = sup
+        return out
+
+    def _remember(self, s: SimState):
+        self.scalars = [getattr(s, k) for k in _SCALARS]
+        self.support = [list(row) for row in s.support]
+
+def apply_patch(target: Dict[str, Any], patch: Dict[str, Any]):
+    for k, v in patch.items():
+        cur = target.get(k)
+        if isinstance(v, dict) and isinstance(cur, dict):
+            apply_patch(cur, v)
+        else:
+            target[k] = v
+
+def encode_event(evt: Dict[str, Any]) -> str:
+    # same encoding as starlette's WebSocket.send_json
+    return json.dumps(evt, separators=(",", ":"), ensure_ascii=False)
+
+def coalesce(events: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    # runs of deltas from the same role become one delta carrying "from_seq"
+    # (first) and "seq" (last) of the merged range
+    out: List[Dict[str, Any]] = []
+    for evt in events:
+        prev = out[-1] if out else None
+        if (evt.get("type") == "delta" and prev is not None and prev.get("type") == "delta"
+                and prev.get("role") == evt.get("role")):
+            prev.setdefault("from_seq", prev["seq"])
+            prev["text"] = (prev.get("text") or "") + (evt.get("text") or "")
+            prev["seq"] = evt["seq"]
+        else:
+            out.append(evt)
+    return out
+
+def _varint(n: int, out: bytearray):
+    while n > 0x7F:
+        out.append((n & 0x7F) | 0x80)
+        n >>= 7
+    out.append(n)
+
+def _read_varint(b: bytes, i: int) -> Tuple[int, int]:
+    n = shift = 0
+    while True:
+        x = b[i]
+        i += 1
+        n |= (x & 0x7F) << shift
+        if x < 0x80:
+            return n, i
+        shift += 7
+
+def encode_frame(items: List[Tuple[Dict[str, Any], Optional[str]]], enc: str = "json") -> Union[str, bytes]:
+    # items: (event, its JSON encoding or None). Encoded events are reused as-is;
+    # only merged deltas are encoded here.
+    merged: List[Tuple[Dict[str, Any], Optional[str]]] = []
+    for evt, data in items:
+        if evt.get("type") == "delta" and merged:
+            prev, _ = merged[-1]
+            if prev.get("type") == "delta" and prev.get("role") == evt.get("role"):
+                merged[-1] = ({
+                    "type": "delta", "role": prev.get("role"),
+                    "text": (prev.get("text") or "") + (evt.get("text") or ""),
+                    "from_seq": prev.get("from_seq", prev["seq"]), "seq": evt["seq"],
+                }, None)
+                continue
+        merged.append((evt, data))
+    if enc == "json":
+        return "[" + ",".join(d if d is not None else encode_event(e) for e, d in merged) + "]"
+    out = bytearray()
+    for evt, data in merged:
+        code = _ROLE_CODE.get(evt.get("role")) if evt.get("type") == "delta" else None
+        if code is not None and set(evt) <= {"type", "role", "text", "seq", "from_seq"}:
+            text = (evt.get("text") or "").encode("utf-8")
+            out.append(1)
+            _varint(evt["seq"], out)
+            _varint(evt["seq"] - evt.get("from_seq", evt["seq"]), out)
+            out.append(code)
+            _varint(len(text), out)
+            out += text
+        else:
+            raw = (data if data is not None else encode_event(evt)).encode("utf-8")
+            out.append(0)
+            _varint(len(raw), out)
+            out += raw
+    return bytes(out)
+
+def decode_frame(frame: Union[str, bytes]) -> List[Dict[str, Any]]:
+    # inverse of encode_frame (v3), for clients written in Python
+    if isinstance(frame, str):
+        return json.loads(frame)
+    out: List[Dict[str, Any]] = []
+    i = 0
+    while i < len(frame):
+        kind = frame[i]
+        i += 1
+        if kind == 1:
+            seq, i = _read_varint(frame, i)
+            span, i = _read_varint(frame, i)
+            role = ROLE_ORDER[frame[i]]
+            n, i = _read_varint(frame, i + 1)
+            evt = {"type": "delta", "role": role, "text": frame[i:i + n].decode("utf-8"), "seq": seq}
+            if span:
+                evt["from_seq"] = seq - span
+            out.append(evt)
+        else:
+            n, i = _read_varint(frame, i)
+            out.append(json.loads(frame[i:i + n]))
+        i += n
+    return out
@@ -1,4 +1,4 @@
-from ..game.state import PolicyOption
+from ..game.state import OptionEffects, PolicyOption
 
 def default_options():
     return [
@@ -18,7 +18,8 @@ def default_options():
             id="quotas_enforce",
             name="Usage quotas + enforcement",
             description="Set strict limits and enforce; reduces demand but may raise fairness concerns.",
-            capex_cost=0.10, opex_cost=0.25, water_saving=0.50, political_risk=0.55, eco_benefit=0.30
+            capex_cost=0.10, opex_cost=0.25, water_saving=0.50, political_risk=0.55, eco_benefit=0.30,
+            effects=OptionEffects(restriction=1, fairness=-0.05),
         ),
         PolicyOption(
             id="leak_repair",
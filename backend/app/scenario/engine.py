@@ -0,0 +1,98 @@
+import hashlib
+import json
+import os
+import re
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from pydantic import BaseModel, Field, ValidationError, field_validator
+
+from .defaults import default_options
+from ..game.state import OptionTable, PolicyOption, SimState, init_state
+
+# Scenarios come from the start request ({"options": [...]}, inline) or from
+# <SCENARIO_DIR>/<name>.json ({"name": "..."}). Each distinct content is
+# validated and compiled once (option table, effect coefficients) and cached
+# by its hash, so sessions started from the same scenario share it.
+SCENARIO_DIR = os.getenv("SCENARIO_DIR", "scenarios")
+SCENARIO_MAX_OPTIONS = int(os.getenv("SCENARIO_MAX_OPTIONS", "1000"))
+SCENARIO_CACHE_SIZE = int(os.getenv("SCENARIO_CACHE_SIZE", "64"))
+
+_NAME = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+class ScenarioError(ValueError):
+    pass
+
+class Scenario(BaseModel):
+    name: str = "custom"
+    topic: Optional[str] = None
+    options: List[PolicyOption] = Field(min_length=1)
+
+    @field_validator("options")
+    @classmethod
+    def _check_options(cls, options: List[PolicyOption]) -> List[PolicyOption]:
+        if len(options) > SCENARIO_MAX_OPTIONS:
+            raise ValueError(f"at most {SCENARIO_MAX_OPTIONS} options")
+        seen = set()
+        for o in options:
+            if o.id in seen:
+                raise ValueError(f"duplicate option id {o.id!r}")
+            seen.add(o.id)
+        return options
+
+class CompiledScenario:
+    __slots__ = ("key", "name", "topic", "options", "table")
+
+    def __init__(self, key: str, spec: Scenario):
+        self.key = key
+        self.name = spec.name
+        self.topic = spec.topic
+        self.options = spec.options
+        self.table = OptionTable(spec.options)
+
+    def new_state(self, topic: str) -> SimState:
+        return init_state(topic, self.options, self.table)
+
+_CACHE: "OrderedDict[str, CompiledScenario]" = OrderedDict()
+
+def scenario_key(spec: Dict[str, Any]) -> str:
+    raw = json.dumps(spec, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+def compile_scenario(spec: Dict[str, Any]) -> CompiledScenario:
+    key = scenario_key(spec)
+    sc = _CACHE.get(key)
+    if sc is not None:
+        _CACHE.move_to_end(key)
+        return sc
+    try:
+        sc = CompiledScenario(key, Scenario.model_validate(spec))
+    except ValidationError as e:
+        raise ScenarioError(f"invalid scenario: {e.errors(include_url=False, include_input=False)}") from None
+    _CACHE[key] = sc
+    while len(_CACHE) > SCENARIO_CACHE_SIZE:
+        _CACHE.popitem(last=False)
+    return sc
+
+def load_scenario(name: str, directory: str = SCENARIO_DIR) -> Dict[str, Any]:
+    if not _NAME.match(name):
+        raise ScenarioError(f"bad scenario name {name!r}")
+    try:
+        with open(os.path.join(directory, f"{name}.json"), encoding="utf-8") as f:
+            spec = json.load(f)
+    except FileNotFoundError:
+        raise ScenarioError(f"unknown scenario {name!r}") from None
+    except (OSError, ValueError) as e:
+        raise ScenarioError(f"unreadable scenario {name!r}: {e}") from None
+    if not isinstance(spec, dict):
+        raise ScenarioError(f"scenario {name!r} is not an object")
+    spec.setdefault("name", name)
+    return spec
+
+def resolve_scenario(spec: Optional[Dict[str, Any]] = None) -> CompiledScenario:
+    # {} -> built-in default, {"name": n} -> scenario file, anything with options -> inline
+    if not spec:
+        return compile_scenario({"name": "default", "options": [o.model_dump() for o in default_options()]})
+    if "options" not in spec and isinstance(spec.get("name"), str):
+        return compile_scenario(load_scenario(spec["name"]))
+    return compile_scenario(spec)
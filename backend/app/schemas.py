@@ -8,19 +8,35 @@ class StartSimRequest(BaseModel):
     rounds: int = Field(default=2, ge=1, le=10)
     model: str = "llama3"
     temperature: float = Field(default=0.4, ge=0.0, le=2.0)
+    # fixes the action policy RNG and the model sampling seed, making a session reproducible
+    seed: Optional[int] = None
+    # "lookahead" searches ahead on the rules simulator (game/search.py) instead of the baseline mix
+    policy: Literal["baseline", "lookahead"] = "baseline"
+    # "incremental" scores each turn in the background while the next speaker renders
+    judge_mode: Literal["round", "incremental"] = "round"
+    # "simultaneous": every role but the chair moves at once from the same state (rendered
+    # concurrently), then the chair speaks; "sequential" is one speaker after another
+    round_mode: Literal["sequential", "simultaneous"] = "sequential"
+    # {} built-in options, {"name": "..."} a file in SCENARIO_DIR, or an inline {"options": [...]}
     scenario: Dict = Field(default_factory=dict)
+    # span tracing for this session (tracing.py); unset = sampled at TRACE_SAMPLE
+    trace: Optional[bool] = None
 
 WSEventType = Literal[
     "session_start","turn_start","action_selected","delta","turn_end",
     "round_end","judge_scores","state_update","decision","payoffs",
-    "done","stopped","error"
+    "done","stopped","error","snapshot","patch","paused","resumed","turn_reset"
 ]
 
 class WSEvent(BaseModel):
     type: WSEventType
+    seq: Optional[int] = None
+    proto: Optional[int] = None
+    round_idx: Optional[int] = None
     role: Optional[RoleID] = None
     action: Optional[Action] = None
     text: Optional[str] = None
     message: Optional[str] = None
     state: Optional[GameState] = None
+    patch: Optional[Dict[str, Any]] = None
     data: Optional[Dict[str, Any]] = None
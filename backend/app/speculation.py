@@ -0,0 +1,112 @@
+import asyncio
+import os
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from .game.actions import Action
+from .game.state import SimState
+from .llm.context import SessionContext, approx_tokens
+from .llm.ollama_client import prefill
+from .roles import ROLE_BY_ID
+
+# Speculative work on the next speaker of a sequential round. Who speaks next and the
+# state they will see are known once the current speaker's action is (transitions don't
+# depend on the text), so while the current turn streams:
+#   - the next speaker's action is chosen (a lookahead search runs in its worker pool)
+#   - the prefix of their prompt, up to and including the current turn as streamed so
+#     far, is sent as a prefill request every SPECULATIVE_PREFILL_TOKENS tokens, so the
+#     server's prompt cache already holds it when the real request comes
+# The real request then only evaluates the last stretch of the current turn plus its
+# own tail. The next turn first compares the state it sees with the one speculated on;
+# if anything else changed it the speculation is discarded and the rng rewound, so the
+# run is the same as one without speculation.
+SPECULATIVE_PREFILL = os.getenv("SPECULATIVE_PREFILL", "0") == "1"
+SPECULATIVE_PREFILL_TOKENS = int(os.getenv("SPECULATIVE_PREFILL_TOKENS", "24"))
+
+COUNTERS = {"speculated": 0, "used": 0, "discarded": 0, "prefills": 0, "prefill_failures": 0,
+            "prefill_prompt_tokens": 0}
+
+def stats() -> Dict[str, Any]:
+    return {"enabled": SPECULATIVE_PREFILL, "every_tokens": SPECULATIVE_PREFILL_TOKENS, **COUNTERS}
+
+class Speculation:
+    def __init__(self, role_id: str, basis: SimState, rng, choose: Callable[[str, SimState], Awaitable],
+                 speaker: str, transcript: List[Dict], ctx: SessionContext, model: str, session_id: str):
+        # basis: the state role_id's turn will start from if nothing but the current turn's
+        # transition happens first; rng: the session's own random.Random;
+        # choose(role_id, state) -> (action, search meta)
+        self.role_id = role_id
+        self.basis = basis
+        self.snapshot = basis.snapshot()
+        self.rng = rng
+        self.rng_state = rng.getstate()
+        self.speaker = speaker
+        self.transcript = list(transcript)
+        self.ctx = ctx
+        self.model = model
+        self.session_id = session_id
+        self.acc: List[str] = []
+        self.grew = asyncio.Event()
+        self.sending: Optional[Dict] = None  # meta of the prefill request in flight
+        self.stopping = False
+        self.choose = asyncio.create_task(choose(role_id, basis))
+        self.prefiller = asyncio.create_task(self._prefill_forever())
+        COUNTERS["speculated"] += 1
+
+    def tasks(self) -> List[asyncio.Task]:
+        return [self.choose, self.prefiller]
+
+    def on_delta(self, acc: List[str]):
+        # the current turn's text so far (a new list when a paused turn starts over)
+        self.acc = acc
+        self.grew.set()
+
+    async def _prefill_forever(self):
+        a, _ = await asyncio.shield(self.choose)
+        acc, sent = None, 0
+        while True:
+            await self.grew.wait()
+            self.grew.clear()
+            if self.acc is not acc:
+                acc, sent = self.acc, 0
+            text = "".join(acc).strip()
+            if approx_tokens(text) - sent < SPECULATIVE_PREFILL_TOKENS:
+                continue
+            turn = {"role_id": self.speaker, "role_name": ROLE_BY_ID[self.speaker]["name"], "content": text}
+            msgs = self.ctx.prefix(self.role_id, self.basis, a, self.transcript + [turn])
+            self.sending = {}
+            try:
+                await prefill(self.model, msgs, session_id=self.session_id, meta=self.sending)
+                COUNTERS["prefills"] += 1
+                COUNTERS["prefill_prompt_tokens"] += self.sending.get("prompt_eval_count", 0)
+            except Exception:
+                # only ever an optimization
+                COUNTERS["prefill_failures"] += 1
+            finally:
+                self.sending = None
+            if self.stopping:
+                return
+            sent = approx_tokens(text)
+
+    def matches(self, role_id: str, s: SimState) -> bool:
+        return role_id == self.role_id and s.snapshot() == self.snapshot
+
+    async def take(self) -> Tuple[Action, Dict[str, Any]]:
+        # the speculated action. A prefill already on the wire is let finish, so the real
+        # request finds the prompt cache filled rather than busy; one still queued is dropped
+        a, search_meta = await self.choose
+        if self.sending is not None and "endpoint" in self.sending:
+            self.stopping = True
+            await asyncio.wait([self.prefiller])
+        self.prefiller.cancel()
+        COUNTERS["used"] += 1
+        return a, search_meta
+
+    async def discard(self):
+        self.prefiller.cancel()
+        self.choose.cancel()
+        await asyncio.wait([self.choose])
+        if not self.choose.cancelled():
+            self.choose.exception()
+        # the speculative choice drew from the rng; draw the same numbers again
+        self.rng.setstate(self.rng_state)
+        COUNTERS["discarded"] += 1
@@ -1,23 +1,214 @@
 import asyncio
+import json
+import os
+import sys
+import time
 from typing import Dict, List, Any, Optional
 
+# Session lifecycle: pending (created, no viewer yet) -> running (<-> paused) -> finished -> expired (evicted).
+# A worker that only relays another worker's session keeps it as "following" (see cluster/backend.py).
+SESSION_MAX = int(os.getenv("SESSION_MAX", "256"))
+SESSION_IDLE_TTL = float(os.getenv("SESSION_IDLE_TTL", "600"))
+SESSION_FINISHED_TTL = float(os.getenv("SESSION_FINISHED_TTL", "300"))
+SESSION_SWEEP_INTERVAL = float(os.getenv("SESSION_SWEEP_INTERVAL", "15"))
+SESSION_SPILL_DIR = os.getenv("SESSION_SPILL_DIR", "sessions")
+# A running session whose last viewer left is, after SESSION_ABANDON_GRACE seconds
+# with nobody connected, paused (the next viewer resumes it) or cancelled outright
+# ("cancel"); "off" lets it run to the end unwatched.
+SESSION_ABANDON_ACTION = os.getenv("SESSION_ABANDON_ACTION", "pause")
+SESSION_ABANDON_GRACE = float(os.getenv("SESSION_ABANDON_GRACE", "30"))
+
+# session state left out of its resident_bytes: shared with other sessions (the compiled
+# scenario is cached), reported elsewhere (the hub) or handles rather than session data
+NOT_RESIDENT = ("scenario", "hub", "task", "turn_task", "resume", "trace", "abandon_timer")
+
+def approx_size(obj: Any, _seen: Optional[set] = None) -> int:
+    # rough resident size: sys.getsizeof over containers, slotted objects and their contents
+    seen = _seen if _seen is not None else set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(approx_size(k, seen) + approx_size(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(approx_size(v, seen) for v in obj)
+    elif hasattr(obj, "__slots__"):
+        size += sum(approx_size(getattr(obj, k), seen) for k in obj.__slots__ if hasattr(obj, k))
+    return size
+
 class SessionStore:
-    def __init__(self):
+    def __init__(self, max_sessions: int = SESSION_MAX, spill_dir: str = SESSION_SPILL_DIR):
         self.sessions: Dict[str, Dict[str, Any]] = {}
         self.locks: Dict[str, asyncio.Lock] = {}
+        self.max_sessions = max_sessions
+        self.spill_dir = spill_dir
+        self.spills: Dict[str, asyncio.Task] = {}  # results being written, by session
+        self.evicted = 0
 
-    def create(self, session_id: str, state: Dict[str, Any]):
+    def create(self, session_id: str, state: Dict[str, Any]) -> bool:
+        if len(self.sessions) >= self.max_sessions:
+            self._evict_finished(len(self.sessions) - self.max_sessions + 1)
+            if len(self.sessions) >= self.max_sessions:
+                return False
+        now = time.time()
+        state.setdefault("status", "pending")
+        state["created_at"] = now
+        state["updated_at"] = now
+        state["finished_at"] = None
         self.sessions[session_id] = state
         self.locks[session_id] = asyncio.Lock()
+        return True
 
     def get(self, session_id: str) -> Optional[Dict[str, Any]]:
         return self.sessions.get(session_id)
 
     def delete(self, session_id: str):
+        state = self.sessions.pop(session_id, None)
+        self.locks.pop(session_id, None)
+        if state is not None:
+            state["status"] = "expired"
+            self.evicted += 1
+
+    def detach(self, session_id: str):
+        # drop a local copy (a follower, see cluster/backend.py) without counting an eviction
         self.sessions.pop(session_id, None)
         self.locks.pop(session_id, None)
 
     def lock(self, session_id: str) -> asyncio.Lock:
         return self.locks[session_id]
 
+    def mark(self, session_id: str, status: str):
+        state = self.sessions.get(session_id)
+        if state is not None:
+            state["status"] = status
+            state["updated_at"] = time.time()
+
+    def finish(self, session_id: str, outcome: str = "done"):
+        # spill the transcript and final state to disk, keep only a stub in memory; the
+        # file is written off the event loop, the transcript dropped once it is there
+        state = self.sessions.get(session_id)
+        if state is None or state.get("status") == "finished":
+            return
+        now = time.time()
+        state["status"] = "finished"
+        state["outcome"] = outcome
+        state["updated_at"] = now
+        state["finished_at"] = now
+        gs = state.get("game_state")
+        record = {
+            "session_id": session_id,
+            "outcome": outcome,
+            "topic": state.get("topic"),
+            "rounds": state.get("rounds"),
+            "model": state.get("model"),
+            "created_at": state.get("created_at"),
+            "finished_at": now,
+            "transcript": state.get("transcript") or [],
+            "final_state": gs.snapshot() if gs is not None else None,
+        }
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            # no event loop (a script): write right away
+            self._spilled(state, self._write(session_id, record))
+            return
+        self.spills[session_id] = asyncio.create_task(self._spill(session_id, state, record))
+
+    async def _spill(self, session_id: str, state: Dict[str, Any], record: Dict[str, Any]):
+        try:
+            self._spilled(state, await asyncio.to_thread(self._write, session_id, record))
+        finally:
+            self.spills.pop(session_id, None)
+
+    def _write(self, session_id: str, record: Dict[str, Any]) -> bool:
+        try:
+            os.makedirs(self.spill_dir, exist_ok=True)
+            tmp = self._spill_path(session_id) + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(record, f, ensure_ascii=False)
+            os.replace(tmp, self._spill_path(session_id))
+        except OSError:
+            return False
+        return True
+
+    def _spilled(self, state: Dict[str, Any], ok: bool):
+        if ok:
+            state["transcript"] = []
+            state["game_state"] = None
+            state["spilled"] = True
+
+    async def drain(self):
+        # spills and event logs still being written (shutdown)
+        if self.spills:
+            await asyncio.wait(list(self.spills.values()))
+        for s in list(self.sessions.values()):
+            if s.get("hub") is not None:
+                await s["hub"].log.drain()
+
+    async def load_result(self, session_id: str) -> Optional[Dict[str, Any]]:
+        spill = self.spills.get(session_id)
+        if spill is not None:
+            await asyncio.wait([spill])
+        return await asyncio.to_thread(self._read, session_id)
+
+    def _read(self, session_id: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self._spill_path(session_id), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _spill_path(self, session_id: str) -> str:
+        return os.path.join(self.spill_dir, f"{session_id}.json")
+
+    def _evict_finished(self, n: int):
+        done = sorted(
+            (s["finished_at"] or 0.0, sid) for sid, s in self.sessions.items() if s.get("status") == "finished"
+        )
+        for _, sid in done[:n]:
+            self.delete(sid)
+
+    def sweep(self, now: Optional[float] = None) -> int:
+        now = time.time() if now is None else now
+        expired = []
+        for sid, s in self.sessions.items():
+            status = s.get("status")
+            if status in ("pending", "paused") and now - s["updated_at"] > SESSION_IDLE_TTL:
+                expired.append(sid)
+            elif status == "finished" and now - s["finished_at"] > SESSION_FINISHED_TTL:
+                expired.append(sid)
+        for sid in expired:
+            state = self.sessions[sid]
+            task = state.get("task")
+            if task is not None and not task.done():
+                # paused and never picked up again: the task's done callback finishes it
+                # (transcript spilled, result kept), and it goes once finished like any other
+                state.setdefault("stop_reason", "expired")
+                task.cancel()
+                continue
+            self.delete(sid)
+        return len(expired)
+
+    async def sweep_forever(self, interval: float = SESSION_SWEEP_INTERVAL):
+        while True:
+            await asyncio.sleep(interval)
+            self.sweep()
+
+    def summary(self) -> List[Dict[str, Any]]:
+        now = time.time()
+        out = []
+        for sid, s in self.sessions.items():
+            hub = s.get("hub")
+            out.append({
+                "session_id": sid,
+                "status": s.get("status"),
+                "age_s": round(now - s["created_at"], 1),
+                "idle_s": round(now - s["updated_at"], 1),
+                "clients": len(hub.subscribers) if hub is not None else 0,
+                "resident_bytes": approx_size({k: v for k, v in s.items() if k not in NOT_RESIDENT})
+                                  + (approx_size(hub.state) + approx_size(hub.log.ring) if hub is not None else 0),
+            })
+        return out
+
 STORE = SessionStore()
@@ -0,0 +1,205 @@
+import contextvars
+import json
+import os
+import random
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional
+
+# Per-session span tracing, for finding out why one session was slow. A sampled
+# session gets a SessionTrace; its orchestrator task makes it current, and the
+# phases of the turn loop, the LLM client and the judge record spans into it
+# (a bounded ring buffer: the newest TRACE_MAX_SPANS are kept). Exported as a
+# Chrome trace (chrome://tracing, Perfetto) or OTLP/JSON at /api/sim/trace/{id}.
+# Unsampled sessions pay one context variable lookup per span site.
+TRACE_SAMPLE = float(os.getenv("TRACE_SAMPLE", "0"))
+TRACE_MAX_SPANS = int(os.getenv("TRACE_MAX_SPANS", "8192"))
+TRACE_DIR = os.getenv("TRACE_DIR", "traces")
+TRACE_SERVICE = os.getenv("TRACE_SERVICE", "policy-sim")
+
+FORMATS = ("chrome", "otlp")
+
+class Span:
+    __slots__ = ("id", "parent", "name", "track", "start", "end", "args")
+
+    def __init__(self, id: int, parent: int, name: str, track: str, start: int, args: Dict[str, Any]):
+        self.id = id
+        self.parent = parent
+        self.name = name
+        self.track = track
+        self.start = start
+        self.end = start
+        self.args = args
+
+_CURRENT: contextvars.ContextVar[Optional["SessionTrace"]] = contextvars.ContextVar("trace", default=None)
+_PARENT: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("trace_parent", default=None)
+
+class _SpanCtx:
+    __slots__ = ("trace", "span", "token")
+
+    def __init__(self, trace: "SessionTrace", span: Span):
+        self.trace = trace
+        self.span = span
+        self.token = None
+
+    def __enter__(self) -> Span:
+        self.token = _PARENT.set(self.span)
+        return self.span
+
+    def __exit__(self, exc_type, exc, tb):
+        _PARENT.reset(self.token)
+        self.span.end = time.perf_counter_ns()
+        if exc_type is not None:
+            self.span.args["error"] = exc_type.__name__
+        self.trace.spans.append(self.span)
+        return False
+
+class _NoopSpan:
+    # what span() returns for an untraced session: one shared object, nothing recorded
+    __slots__ = ("args",)
+
+    def __init__(self):
+        self.args: Dict[str, Any] = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.args.clear()
+        return False
+
+NOOP = _NoopSpan()
+
+class SessionTrace:
+    def __init__(self, session_id: str, max_spans: int = TRACE_MAX_SPANS):
+        self.session_id = session_id
+        self.spans: Deque[Span] = deque(maxlen=max_spans)
+        self.started = 0
+        # perf_counter_ns -> unix ns, for exporters that want wall-clock times
+        self.epoch_ns = time.time_ns() - time.perf_counter_ns()
+
+    def span(self, name: str, track: Optional[str] = None, **args) -> _SpanCtx:
+        parent = _PARENT.get()
+        if track is None:
+            track = parent.track if parent is not None else "session"
+        self.started += 1
+        return _SpanCtx(self, Span(self.started, parent.id if parent is not None else 0, name, track,
+                                   time.perf_counter_ns(), args))
+
+    def add(self, name: str, start: int, end: int, parent: Optional[int] = None, **args) -> int:
+        # a span measured after the fact (e.g. the phases of a finished LLM stream)
+        ctx = _PARENT.get()
+        track = ctx.track if ctx is not None else "session"
+        if parent is None:
+            parent = ctx.id if ctx is not None else 0
+        self.started += 1
+        s = Span(self.started, parent, name, track, start, args)
+        s.end = end
+        self.spans.append(s)
+        return s.id
+
+    @property
+    def dropped(self) -> int:
+        return self.started - len(self.spans)
+
+    def chrome(self) -> Dict[str, Any]:
+        spans = sorted(self.spans, key=lambda s: s.start)
+        t0 = spans[0].start if spans else 0
+        tids: Dict[str, int] = {}
+        events: List[Dict[str, Any]] = []
+        for s in spans:
+            tid = tids.get(s.track)
+            if tid is None:
+                tid = tids[s.track] = len(tids) + 1
+                events.append({"name": "thread_name", "ph": "M", "pid": 1, "tid": tid, "args": {"name": s.track}})
+            events.append({"name": s.name, "cat": s.name.split(".", 1)[0], "ph": "X", "pid": 1, "tid": tid,
+                           "ts": (s.start - t0) / 1000.0, "dur": (s.end - s.start) / 1000.0,
+                           "args": {"id": s.id, "parent": s.parent, **s.args}})
+        events.insert(0, {"name": "process_name", "ph": "M", "pid": 1, "args": {"name": f"session {self.session_id}"}})
+        return {"traceEvents": events, "displayTimeUnit": "ms",
+                "otherData": {"session_id": self.session_id, "spans": len(spans), "dropped": self.dropped}}
+
+    def otlp(self) -> Dict[str, Any]:
+        trace_id = self.session_id.replace("-", "")[:32].rjust(32, "0")
+        out = []
+        for s in sorted(self.spans, key=lambda s: s.start):
+            span = {
+                "traceId": trace_id,
+                "spanId": f"{s.id:016x}",
+                "name": s.name,
+                "kind": 1,  # SPAN_KIND_INTERNAL
+                "startTimeUnixNano": str(self.epoch_ns + s.start),
+                "endTimeUnixNano": str(self.epoch_ns + s.end),
+                "attributes": [_attr("track", s.track)] + [_attr(k, v) for k, v in s.args.items()],
+            }
+            if s.parent:
+                span["parentSpanId"] = f"{s.parent:016x}"
+            if "error" in s.args:
+                span["status"] = {"code": 2, "message": s.args["error"]}
+            out.append(span)
+        return {"resourceSpans": [{
+            "resource": {"attributes": [_attr("service.name", TRACE_SERVICE), _attr("session.id", self.session_id)]},
+            "scopeSpans": [{"scope": {"name": "app.tracing"}, "spans": out}],
+        }]}
+
+    def export(self, fmt: str = "chrome") -> Dict[str, Any]:
+        return self.otlp() if fmt == "otlp" else self.chrome()
+
+    def save(self, trace_dir: str = TRACE_DIR):
+        # kept after the session is evicted; the raw spans, so either format can be exported later
+        record = {"session_id": self.session_id, "epoch_ns": self.epoch_ns, "started": self.started,
+                  "spans": [[s.id, s.parent, s.name, s.track, s.start, s.end, s.args] for s in self.spans]}
+        try:
+            os.makedirs(trace_dir, exist_ok=True)
+            path = trace_path(self.session_id, trace_dir)
+            with open(path + ".tmp", "w", encoding="utf-8") as f:
+                json.dump(record, f, default=str)
+            os.replace(path + ".tmp", path)
+        except OSError:
+            pass
+
+def _attr(key: str, v: Any) -> Dict[str, Any]:
+    if isinstance(v, bool):
+        return {"key": key, "value": {"boolValue": v}}
+    if isinstance(v, int):
+        return {"key": key, "value": {"intValue": str(v)}}
+    if isinstance(v, float):
+        return {"key": key, "value": {"doubleValue": v}}
+    return {"key": key, "value": {"stringValue": str(v)}}
+
+def trace_path(session_id: str, trace_dir: str = TRACE_DIR) -> str:
+    return os.path.join(trace_dir, f"{session_id}.json")
+
+def load_trace(session_id: str, trace_dir: str = TRACE_DIR) -> Optional[SessionTrace]:
+    try:
+        with open(trace_path(session_id, trace_dir), encoding="utf-8") as f:
+            record = json.load(f)
+    except (OSError, ValueError):
+        return None
+    t = SessionTrace(session_id, max_spans=max(1, len(record["spans"])))
+    t.epoch_ns = record["epoch_ns"]
+    t.started = record["started"]
+    for sid, parent, name, track, start, end, args in record["spans"]:
+        s = Span(sid, parent, name, track, start, args)
+        s.end = end
+        t.spans.append(s)
+    return t
+
+def new_trace(session_id: str, requested: Optional[bool] = None) -> Optional[SessionTrace]:
+    # an explicit request wins; otherwise sampled at TRACE_SAMPLE
+    if requested is None:
+        requested = TRACE_SAMPLE > 0 and random.random() < TRACE_SAMPLE
+    return SessionTrace(session_id) if requested else None
+
+def activate(trace: Optional[SessionTrace]):
+    # for the calling task and the tasks it creates from now on
+    _CURRENT.set(trace)
+
+def current() -> Optional[SessionTrace]:
+    return _CURRENT.get()
+
+def span(name: str, track: Optional[str] = None, **args):
+    t = _CURRENT.get()
+    if t is None:
+        return NOOP
+    return t.span(name, track, **args)
@@ -0,0 +1,329 @@
+"""Local stand-in for the Ollama chat API, for benchmarks.
+
+Serves /api/chat (streaming NDJSON and the non-streaming JSON path used by
+chat_json), /api/tags and /api/ps. Timing and failure behaviour are configurable.
+
+Streamed tokens are "t<unix_ns> " when --stamp is on, so a viewer can
+measure generation-to-screen latency per token.
+
+Judge requests (a "format" in the body, or the judge rubric as system prompt)
+get a JSON reply generated token by token at --tps, streamed or not. With a
+format it's only the object plus --judge-tail tokens of trailing whitespace,
+as constrained decoding tends to produce; without one, --judge-prose of them
+are wrapped in prose and a code fence and --judge-malformed carry a syntax slip.
+
+With --prefill-tps set, prompt processing is simulated like a server with a
+prompt (KV) cache: each of --slots keeps its last prompt, a request reuses
+the slot with the longest common prefix, and only the rest (4 chars ~ one
+token) costs prefill time and counts toward prompt_eval_count. A non-streaming
+request with num_predict 0 or 1 (a prefill, app/speculation.py) returns once its
+prompt is processed, with at most one token.
+
+Models are loaded on first use (--load-time seconds, reported as load_duration)
+and stay resident for the request's keep_alive (default --keep-alive seconds);
+at most --max-loaded are resident at once, least recently used out first.
+/api/ps lists what is resident. A request with no messages only loads the
+model, or unloads it with keep_alive 0, as with Ollama.
+
+    cd backend && python -m bench.fake_ollama --port 11435 --ttft 0.15 --tps 40 --jitter 0.2
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+CONFIG = {
+    "ttft": 0.15,        # seconds before the first token
+    "tps": 40.0,         # tokens per second after the first
+    "jitter": 0.2,       # +/- fraction applied to every sleep
+    "tokens": 60,        # tokens per streamed reply
+    "error_rate": 0.0,   # fraction of requests answered with HTTP 500
+    "judge_delay": 0.0,  # extra seconds for a non-streaming reply, on top of generating it
+    "judge_notes": 12,   # words in the judge's notes
+    "judge_tail": 40,    # tokens generated after the judge's object
+    "judge_prose": 0.3,  # fraction of unconstrained judge replies wrapped in prose
+    "judge_malformed": 0.0,  # fraction of unconstrained judge replies with a syntax slip
+    "stamp": True,
+    "models": ["llama3"],
+    "prefill_tps": 0.0,  # prompt tokens per second; 0 = prompt processing is free
+    "slots": 1,          # prompt cache slots per model
+    "load_time": 0.0,    # seconds to load a model that isn't resident
+    "keep_alive": 300.0, # seconds a model stays resident after its last request
+    "max_loaded": 0,     # resident models at most; 0 = no limit
+    "model_size": 4_700_000_000,
+}
+
+app = FastAPI()
+STATS = {"stream": 0, "json": 0, "prefills": 0, "errors": 0, "tokens": 0, "prompt_tokens": 0, "prompt_tokens_cached": 0,
+         "judge_tokens": 0, "cancelled": 0, "loads": 0, "unloads": 0}
+SLOTS = {}  # model -> list of last prompts, most recently used last
+LOADED = {}  # model -> unix time it expires (None: never), least recently used first
+LOADING = {}  # model -> asyncio.Event set once loaded
+
+def _keep_alive(v) -> float:
+    # seconds; "5m" / "1h" / "30s" / a number; negative = forever
+    if v is None:
+        return CONFIG["keep_alive"]
+    if isinstance(v, (int, float)):
+        return float(v)
+    v = str(v).strip()
+    scale = {"s": 1, "m": 60, "h": 3600}.get(v[-1:], None)
+    return float(v[:-1]) * scale if scale else float(v)
+
+def _expire():
+    now = time.time()
+    for m in [m for m, t in LOADED.items() if t is not None and t <= now]:
+        del LOADED[m]
+
+def _unload(model: str):
+    if model in LOADED:
+        del LOADED[model]
+        STATS["unloads"] += 1
+
+async def _ensure_loaded(model: str, keep_alive) -> float:
+    # returns the seconds this request spent waiting for the model to load
+    ttl = _keep_alive(keep_alive)
+    expires = None if ttl < 0 else time.time() + ttl
+    _expire()
+    if model in LOADED:
+        LOADED.pop(model)
+        LOADED[model] = expires
+        return 0.0
+    t0 = time.perf_counter()
+    ev = LOADING.get(model)
+    if ev is not None:
+        await ev.wait()
+    else:
+        ev = LOADING[model] = asyncio.Event()
+        try:
+            await asyncio.sleep(CONFIG["load_time"])
+        finally:
+            del LOADING[model]
+            ev.set()
+        STATS["loads"] += 1
+        while CONFIG["max_loaded"] and len(LOADED) >= CONFIG["max_loaded"]:
+            _unload(next(iter(LOADED)))
+    LOADED.pop(model, None)
+    LOADED[model] = expires
+    return time.perf_counter() - t0
+
+def _serialize(messages) -> str:
+    return "".join(f"<{m.get('role', '')}>{m.get('content', '')}\n" for m in messages)
+
+def _common_prefix(a: str, b: str) -> int:
+    n = min(len(a), len(b))
+    i = 0
+    while i < n and a[i] == b[i]:
+        i += 1
+    return i
+
+def _prefill(model: str, messages) -> tuple:
+    # returns (evaluated tokens, cached tokens, seconds of prefill)
+    prompt = _serialize(messages)
+    slots = SLOTS.setdefault(model, [])
+    best, best_len = None, 0
+    for i, p in enumerate(slots):
+        n = _common_prefix(p, prompt)
+        if n > best_len:
+            best, best_len = i, n
+    if best is not None:
+        slots.pop(best)
+    elif len(slots) >= max(1, CONFIG["slots"]):
+        slots.pop(0)
+    slots.append(prompt)
+    cached = best_len // 4
+    evaluated = max(1, len(prompt) // 4 - cached)
+    STATS["prompt_tokens"] += evaluated
+    STATS["prompt_tokens_cached"] += cached
+    seconds = evaluated / CONFIG["prefill_tps"] if CONFIG["prefill_tps"] > 0 else 0.0
+    return evaluated, cached, seconds
+
+def _sleep_for(base: float) -> float:
+    j = CONFIG["jitter"]
+    return max(0.0, base * (1.0 + random.uniform(-j, j)))
+
+ROLES = ["water_minister", "farmer", "environment", "citizen", "minister"]
+WORDS = "the proposal balances supply and fairness but leaves enforcement costs unclear for farmers".split()
+
+def _is_judge(body) -> bool:
+    msgs = body.get("messages") or [{}]
+    return body.get("format") is not None or "evaluator for a policy deliberation" in (msgs[0].get("content") or "")
+
+def _tokens(text: str) -> list:
+    # ~4 characters per token
+    return [text[i:i + 4] for i in range(0, len(text), 4)]
+
+def _judge_reply(body) -> list:
+    # the reply as a list of tokens
+    per_turn = "ONLY the last turn" in ((body.get("messages") or [{}])[0].get("content") or "")
+    r = lambda lo, hi: round(random.uniform(lo, hi), 2)
+    obj = {
+        "notes": " ".join(random.choice(WORDS) for _ in range(CONFIG["judge_notes"])).capitalize() + ".",
+        "realism": r(0.4, 0.9), "public_acceptance": r(0.3, 0.8),
+        "fairness_perception": r(0.3, 0.8), "conflict_level": r(0.1, 0.6),
+    }
+    if per_turn:
+        obj.update(persuasion=r(0.3, 0.9), coherence=r(0.4, 0.9))
+    else:
+        obj.update(persuasion={k: r(0.3, 0.9) for k in ROLES}, coherence={k: r(0.4, 0.9) for k in ROLES})
+    text = json.dumps(obj, indent=2)
+    tail = CONFIG["judge_tail"]
+    if body.get("format") is not None:
+        return _tokens(text) + ["\n"] * tail
+    if random.random() < CONFIG["judge_malformed"]:
+        slip = random.choice(["comma", "quotes", "cut"])
+        if slip == "comma":
+            text = text[:-2] + ",\n}"
+        elif slip == "quotes":
+            text = text.replace('"', "'")
+        else:
+            text = text[:int(len(text) * 0.9)]
+    if random.random() >= CONFIG["judge_prose"]:
+        return _tokens(text)
+    prose = [f" {random.choice(WORDS)}" for _ in range(tail)]
+    return ["Here", " is", " my", " evaluation", ":\n```json\n"] + _tokens(text) + ["\n```\n", "Overall", ","] + prose + ["."]
+
+def _final_chunk(model: str, prompt_tokens: int, prefill_s: float, n_tokens: int, started: float, first: float,
+                 load_s: float = 0.0) -> dict:
+    now = time.perf_counter()
+    return {
+        "model": model, "message": {"role": "assistant", "content": ""}, "done": True,
+        "load_duration": int(load_s * 1e9),
+        "prompt_eval_count": prompt_tokens,
+        "prompt_eval_duration": int(prefill_s * 1e9),
+        "eval_count": n_tokens,
+        "eval_duration": int((now - first) * 1e9),
+        "total_duration": int((now - started) * 1e9),
+    }
+
+@app.post("/api/chat")
+async def chat(req: Request):
+    body = await req.json()
+    model = body.get("model", "llama3")
+    if random.random() < CONFIG["error_rate"]:
+        STATS["errors"] += 1
+        return JSONResponse(status_code=500, content={"error": "injected failure"})
+    if model.endswith(":latest"):
+        model = model[:-len(":latest")]
+    if not body.get("messages"):
+        if body.get("keep_alive") is not None and _keep_alive(body["keep_alive"]) == 0:
+            _unload(model)
+            return {"model": model, "message": {"role": "assistant", "content": ""}, "done": True, "done_reason": "unload"}
+        load_s = await _ensure_loaded(model, body.get("keep_alive"))
+        return {"model": model, "message": {"role": "assistant", "content": ""}, "done": True, "done_reason": "load",
+                "load_duration": int(load_s * 1e9)}
+    load_s = await _ensure_loaded(model, body.get("keep_alive"))
+    prompt_tokens, _, prefill_s = _prefill(model, body.get("messages", []))
+    limit = (body.get("options") or {}).get("num_predict")
+    limit = -1 if limit is None else int(limit)
+    judge = _is_judge(body)
+    if not judge and body.get("stream", True) is False and 0 <= limit <= 1:
+        STATS["prefills"] += 1
+        await asyncio.sleep(prefill_s + (_sleep_for(1.0 / CONFIG["tps"]) if limit else 0.0))
+        return {"model": model, "message": {"role": "assistant", "content": "tok0 " if limit else ""}, "done": True,
+                "done_reason": "length", "load_duration": int(load_s * 1e9), "prompt_eval_count": prompt_tokens,
+                "prompt_eval_duration": int(prefill_s * 1e9), "eval_count": limit}
+    pieces = _judge_reply(body) if judge else []
+    if judge and limit > 0:
+        pieces = pieces[:limit]
+
+    if body.get("stream", True) is False:
+        STATS["json"] += 1
+        if judge:
+            STATS["judge_tokens"] += len(pieces)
+            # token by token like the streamed path, so both pay the same timer overhead
+            await asyncio.sleep(_sleep_for(CONFIG["ttft"]) + _sleep_for(CONFIG["judge_delay"]) + prefill_s)
+            for _ in pieces[1:]:
+                await asyncio.sleep(_sleep_for(1.0 / CONFIG["tps"]))
+            content = "".join(pieces)
+        else:
+            await asyncio.sleep(_sleep_for(CONFIG["judge_delay"]) + prefill_s)
+            content = "".join(_judge_reply({"format": "json"}))
+        return {"model": model, "message": {"role": "assistant", "content": content}, "done": True}
+
+    STATS["stream"] += 1
+    n_tokens = limit if limit > 0 else CONFIG["tokens"]
+    n_tokens = len(pieces) if judge else min(n_tokens, CONFIG["tokens"])
+
+    async def gen():
+        started = time.perf_counter() - load_s
+        await asyncio.sleep(_sleep_for(CONFIG["ttft"]) + prefill_s)
+        first = time.perf_counter()
+        sent = 0
+        try:
+            for i in range(n_tokens):
+                if i:
+                    await asyncio.sleep(_sleep_for(1.0 / CONFIG["tps"]))
+                if judge:
+                    text = pieces[i]
+                    STATS["judge_tokens"] += 1
+                else:
+                    text = f"t{time.time_ns()} " if CONFIG["stamp"] else f"tok{i} "
+                STATS["tokens"] += 1
+                sent += 1
+                yield json.dumps({"model": model, "message": {"role": "assistant", "content": text}, "done": False}) + "\n"
+        finally:
+            # client went away mid-reply (an early-stopped judge, a stopped session)
+            if sent < n_tokens:
+                STATS["cancelled"] += 1
+        yield json.dumps(_final_chunk(model, prompt_tokens, prefill_s, n_tokens, started, first, load_s)) + "\n"
+
+    return StreamingResponse(gen(), media_type="application/x-ndjson")
+
+@app.get("/api/tags")
+async def tags():
+    return {"models": [{"name": f"{m}:latest", "model": f"{m}:latest"} for m in CONFIG["models"]]}
+
+@app.get("/api/ps")
+async def ps():
+    _expire()
+    return {"models": [
+        {"name": f"{m}:latest", "model": f"{m}:latest", "size": CONFIG["model_size"], "size_vram": CONFIG["model_size"],
+         "expires_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(t if t is not None else 2 ** 31 - 1))}
+        for m, t in LOADED.items()
+    ]}
+
+@app.get("/stats")
+async def stats():
+    return STATS
+
+def main():
+    import uvicorn
+
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=11435)
+    ap.add_argument("--ttft", type=float, default=CONFIG["ttft"])
+    ap.add_argument("--tps", type=float, default=CONFIG["tps"])
+    ap.add_argument("--jitter", type=float, default=CONFIG["jitter"])
+    ap.add_argument("--tokens", type=int, default=CONFIG["tokens"])
+    ap.add_argument("--error-rate", type=float, default=CONFIG["error_rate"])
+    ap.add_argument("--judge-delay", type=float, default=CONFIG["judge_delay"])
+    ap.add_argument("--judge-notes", type=int, default=CONFIG["judge_notes"])
+    ap.add_argument("--judge-tail", type=int, default=CONFIG["judge_tail"])
+    ap.add_argument("--judge-prose", type=float, default=CONFIG["judge_prose"])
+    ap.add_argument("--judge-malformed", type=float, default=CONFIG["judge_malformed"])
+    ap.add_argument("--no-stamp", action="store_true")
+    ap.add_argument("--models", default=",".join(CONFIG["models"]))
+    ap.add_argument("--prefill-tps", type=float, default=CONFIG["prefill_tps"])
+    ap.add_argument("--slots", type=int, default=CONFIG["slots"])
+    ap.add_argument("--load-time", type=float, default=CONFIG["load_time"])
+    ap.add_argument("--keep-alive", type=float, default=CONFIG["keep_alive"])
+    ap.add_argument("--max-loaded", type=int, default=CONFIG["max_loaded"])
+    args = ap.parse_args()
+
+    CONFIG.update(
+        ttft=args.ttft, tps=args.tps, jitter=args.jitter, tokens=args.tokens, error_rate=args.error_rate,
+        judge_delay=args.judge_delay, stamp=not args.no_stamp, models=args.models.split(","),
+        prefill_tps=args.prefill_tps, slots=args.slots, judge_notes=args.judge_notes,
+        judge_tail=args.judge_tail, judge_prose=args.judge_prose, judge_malformed=args.judge_malformed,
+        load_time=args.load_time, keep_alive=args.keep_alive, max_loaded=args.max_loaded,
+    )
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
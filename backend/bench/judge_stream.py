@@ -0,0 +1,151 @@
+"""Judge latency, wasted tokens and fallback rate: legacy vs streamed judge.
+
+Runs the same round-judge prompts through each configuration against
+bench.fake_ollama (or a real Ollama via --url):
+  legacy          - non-streaming, no format, plain json.loads (the old judge)
+  schema          - schema-constrained, streamed, read to the end
+  schema_early    - schema-constrained, streamed, stopped once every key is in (default)
+  free_early      - no format, streamed with early stop, repair pass on failure
+
+and reports per-call latency, tokens the server generated, tokens the judge
+did not need, and how replies were read (early/complete/repaired/fallback).
+
+    cd backend && python -m bench.judge_stream --calls 40
+    cd backend && python -m bench.judge_stream --fake-args "--tps 60 --judge-tail 80 --judge-malformed 0.2"
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+
+import httpx
+
+from bench.run_bench import free_port, percentiles, wait_port
+
+CONFIGS = {
+    "legacy": None,
+    "schema": {"JUDGE_FORMAT": "schema", "JUDGE_EARLY_STOP": False},
+    "schema_early": {"JUDGE_FORMAT": "schema", "JUDGE_EARLY_STOP": True},
+    "free_early": {"JUDGE_FORMAT": "off", "JUDGE_EARLY_STOP": True},
+}
+
+def round_transcript(i: int):
+    from app.roles import ROLE_BY_ID
+
+    roles = ["water_minister", "farmer", "environment", "citizen", "minister"]
+    return [{"role_id": r, "role_name": ROLE_BY_ID[r]["name"], "content": f"Call {i}: {r} argues its case. " * 4}
+            for r in roles]
+
+async def legacy_judge(model: str, msgs, seed: int):
+    from app.llm import judge
+    from app.llm.ollama_client import chat_json
+
+    j = await chat_json(model=model, messages=msgs, temperature=0.2, seed=seed, priority="judge")
+    obj = judge.safe_parse_json((j.get("message") or {}).get("content") or "")
+    return "complete" if isinstance(obj, dict) else "fallback"
+
+async def run(name: str, model: str, calls: int, concurrency: int, stats_url: str) -> dict:
+    from app.game.state import init_state
+    from app.llm import judge
+    from app.metrics import JUDGE_OUTCOMES, JUDGE_TOKENS
+    from app.scenario.defaults import default_options
+
+    cfg = CONFIGS[name]
+    if cfg:
+        for k, v in cfg.items():
+            setattr(judge, k, v)
+    gs = init_state(topic="Drought response for the river basin", options=default_options())
+    outcomes_before = dict(JUDGE_OUTCOMES.values)
+    used_before = JUDGE_TOKENS.values.get((model, "used"), 0.0)
+    async with httpx.AsyncClient() as http:
+        gen_before = (await http.get(stats_url)).json()["judge_tokens"] if stats_url else 0
+        lat = []
+        legacy_outcomes = {}
+        sem = asyncio.Semaphore(concurrency)
+
+        async def one(i: int):
+            async with sem:
+                msgs = judge.judge_prompt(gs, round_transcript(i))
+                t0 = time.perf_counter()
+                if cfg is None:
+                    o = await legacy_judge(model, msgs, seed=i)
+                    legacy_outcomes[o] = legacy_outcomes.get(o, 0) + 1
+                else:
+                    await judge.judge_round(model, gs, round_transcript(i), seed=i)
+                lat.append((time.perf_counter() - t0) * 1000.0)
+
+        t0 = time.perf_counter()
+        await asyncio.gather(*[one(i) for i in range(calls)])
+        wall = time.perf_counter() - t0
+        # let cancelled streams settle before reading the server's count
+        await asyncio.sleep(0.2)
+        generated = ((await http.get(stats_url)).json()["judge_tokens"] - gen_before) if stats_url else None
+
+    if cfg is None:
+        outcomes = legacy_outcomes
+        used = None
+    else:
+        outcomes = {lv[1]: int(v - outcomes_before.get(lv, 0.0)) for lv, v in JUDGE_OUTCOMES.values.items()
+                    if lv[0] == model and v - outcomes_before.get(lv, 0.0)}
+        used = JUDGE_TOKENS.values.get((model, "used"), 0.0) - used_before
+    out = {
+        "calls": calls,
+        "wall_s": round(wall, 3),
+        "latency_ms": percentiles(lat),
+        "outcomes": outcomes,
+        "fallback_rate": round(outcomes.get("fallback", 0) / calls, 3),
+    }
+    if generated is not None:
+        out["generated_tokens_per_call"] = round(generated / calls, 1)
+        if used is not None:
+            out["wasted_tokens_per_call"] = round((generated - used) / calls, 1)
+    return out
+
+async def run_all(names, model: str, calls: int, concurrency: int, stats_url: str) -> dict:
+    from app.llm.ollama_client import CLIENT
+
+    report = {}
+    try:
+        for name in names:
+            report[name] = await run(name, model, calls, concurrency, stats_url)
+    finally:
+        await CLIENT.close()
+    return report
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--url", default="", help="Ollama /api/chat URL (default: start bench.fake_ollama)")
+    ap.add_argument("--model", default="llama3")
+    ap.add_argument("--calls", type=int, default=40)
+    ap.add_argument("--concurrency", type=int, default=4)
+    ap.add_argument("--configs", default=",".join(CONFIGS))
+    ap.add_argument("--fake-args", default="--ttft 0.1 --tps 80 --judge-tail 40 --judge-malformed 0.1",
+                    help="arguments for bench.fake_ollama")
+    args = ap.parse_args()
+
+    proc = None
+    url = args.url
+    stats_url = ""
+    if not url:
+        port = free_port()
+        proc = subprocess.Popen([sys.executable, "-m", "bench.fake_ollama", "--port", str(port), *args.fake_args.split()])
+        wait_port(port)
+        url = f"http://127.0.0.1:{port}/api/chat"
+        stats_url = f"http://127.0.0.1:{port}/stats"
+    # the client reads its config at import time
+    os.environ["OLLAMA_CHAT_URL"] = url
+    os.environ["OLLAMA_CHAT_URLS"] = url
+    os.environ["LLM_CACHE_MODE"] = "off"
+    try:
+        report = asyncio.run(run_all(args.configs.split(","), args.model, args.calls, args.concurrency, stats_url))
+        print(json.dumps(report, indent=2))
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait(timeout=10)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""Lookahead policy vs the baseline mix, on the rules-only simulator.
+
+For each role, plays the same seeded games twice: everyone on the baseline
+policy, then that one role on the lookahead search (inline, no worker pool).
+Reports the role's mean final utility both ways and the search latency.
+Judge fusion is skipped (it needs the model).
+
+    cd backend && python -m bench.policy_eval --games 200 --rounds 3
+    cd backend && python -m bench.policy_eval --iters 400   # fixed iteration budget instead of wall clock
+    cd backend && python -m bench.policy_eval --options 300 --games 50   # large synthetic scenario
+"""
+import argparse
+import json
+import random
+import statistics
+import time
+
+from app.game.policy import choose_action
+from app.game.search import candidate_actions, pass_action, search, search_options
+from app.game.state import init_state
+from app.game.transition import call_vote, transition
+from app.game.utilities import utilities
+from app.roles import ROLE_ORDER
+from bench.run_bench import percentiles
+from bench.transition_micro import make_options
+
+def play(seed: int, rounds: int, searcher, budget_ms: float, iters, lat_ms, options):
+    rng = random.Random(seed)
+    gs = init_state(topic="bench", options=options)
+    for r in range(1, rounds + 1):
+        gs.round_idx = r
+        for role in ROLE_ORDER:
+            gs.t += 1
+            if role == searcher:
+                t0 = time.perf_counter()
+                k, _ = search(gs, role, rounds, budget_ms=budget_ms, max_iters=iters, seed=rng.getrandbits(32))
+                lat_ms.append((time.perf_counter() - t0) * 1000.0)
+                a = pass_action(role, gs.option_ids, r, rng) if k == 0 else candidate_actions(role, search_options(gs))[k]
+            else:
+                a = choose_action(role, gs.option_ids, round_idx=r, last_decision_locked=gs.decision_locked, rng=rng)
+            gs = transition(gs, role, a)
+            if role == "minister" and a.type == "DECIDE":
+                return utilities(gs)
+        call_vote(gs)
+    return utilities(gs)
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--games", type=int, default=200)
+    ap.add_argument("--rounds", type=int, default=3)
+    ap.add_argument("--budget-ms", type=float, default=3.0)
+    ap.add_argument("--iters", type=int, default=None)
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--options", type=int, default=4, help="4 = the default scenario, more adds synthetic options")
+    args = ap.parse_args()
+    options = make_options(args.options)
+
+    report = {}
+    for role in ROLE_ORDER:
+        lat = []
+        base = [play(args.seed + g, args.rounds, None, args.budget_ms, args.iters, lat, options)[role] for g in range(args.games)]
+        look = [play(args.seed + g, args.rounds, role, args.budget_ms, args.iters, lat, options)[role] for g in range(args.games)]
+        wins = sum(1 for b, l in zip(base, look) if l > b + 1e-9)
+        report[role] = {
+            "baseline_utility": round(statistics.mean(base), 4),
+            "lookahead_utility": round(statistics.mean(look), 4),
+            "improved_games": round(wins / args.games, 3),
+            "search_ms": percentiles(lat),
+        }
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
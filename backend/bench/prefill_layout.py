@@ -0,0 +1,142 @@
+"""Prompt-cache friendliness of the render prompt layout.
+
+Plays the same seeded session twice, once with the legacy layout (role prompt
+and state summary first, last 6 transcript messages) and once with the current
+build_render_messages + stable_tail, and sums what the model server reports:
+prompt_eval_count (prompt tokens actually evaluated, i.e. not served from its
+prompt cache), prompt_eval_duration and client-side TTFT.
+
+By default it starts bench.fake_ollama with a simulated prefix cache; point
+--url at a real Ollama to measure the real thing.
+
+    cd backend && python -m bench.prefill_layout --rounds 4
+    cd backend && python -m bench.prefill_layout --url http://localhost:11434/api/chat --model llama3 --rounds 3
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+
+from bench.run_bench import free_port, percentiles, wait_port
+
+ROLE_ORDER = ["water_minister", "farmer", "environment", "citizen", "minister"]
+TAIL_MIN_TURNS = 6
+
+def legacy_messages(role_id, s, a, transcript):
+    from app.llm.render import action_to_instruction
+    from app.roles import ROLE_BY_ID
+
+    role = ROLE_BY_ID[role_id]
+    state_summary = {
+        "budget_remaining": round(s.budget_remaining, 3),
+        "restriction_level": s.restriction_level,
+        "groundwater_risk": round(s.groundwater_risk, 3),
+        "public_support": round(s.public_support, 3),
+        "fairness_index": round(s.fairness_index, 3),
+        "decision_locked": s.decision_locked,
+        "decision_option": s.decision_option,
+    }
+    opt_summary = [{ "id": o.id, "name": o.name } for o in s.options]
+    msgs = [
+        {"role": "system", "content": role["system"]},
+        {"role": "system", "content": f"Topic: {s.topic}"},
+        {"role": "system", "content": f"State summary: {state_summary}"},
+        {"role": "system", "content": f"Options: {opt_summary}"},
+    ]
+    for m in transcript[-6:]:
+        msgs.append({"role": "user", "content": f'{m["role_name"]}: {m["content"]}'})
+    instr = action_to_instruction(a)
+    msgs.append({"role": "user", "content": f"Chosen action: {a.model_dump()}\nInstruction: {instr}\nWrite 4-8 sentences. Be specific. Do not invent numeric facts."})
+    return msgs
+
+def stable_tail(transcript, min_turns=TAIL_MIN_TURNS):
+    from app.llm.render import TAIL_BLOCK
+
+    # window start advances in whole blocks, so consecutive turns share their transcript prefix
+    if len(transcript) <= min_turns:
+        return list(transcript)
+    start = (len(transcript) - min_turns) // TAIL_BLOCK * TAIL_BLOCK
+    return transcript[start:]
+
+def current_messages(role_id, s, a, transcript):
+    from app.llm.render import build_render_messages
+
+    return build_render_messages(role_id, s, a, stable_tail(transcript))
+
+async def play(layout, model: str, rounds: int, seed: int) -> dict:
+    from app.game.policy import choose_action
+    from app.game.state import init_state
+    from app.game.transition import transition
+    from app.llm.ollama_client import LLMClient
+    from app.roles import ROLE_BY_ID
+    from app.scenario.defaults import default_options
+
+    client = LLMClient()
+    rng = random.Random(seed)
+    gs = init_state(topic="Drought response for the river basin", options=default_options())
+    transcript = []
+    metas = []
+    for r in range(1, rounds + 1):
+        gs.round_idx = r
+        for role_id in ROLE_ORDER:
+            gs.t += 1
+            gs.speaker = role_id
+            a = choose_action(role_id, [o.id for o in gs.options], round_idx=r,
+                              last_decision_locked=gs.decision_locked, rng=rng)
+            meta = {}
+            acc = []
+            async for d in client.stream_chat(model, layout(role_id, gs, a, transcript), seed=seed, meta=meta):
+                acc.append(d)
+            metas.append(meta)
+            # fixed reply text keeps both layouts' transcripts identical
+            transcript.append({"role_id": role_id, "role_name": ROLE_BY_ID[role_id]["name"],
+                               "content": f"{ROLE_BY_ID[role_id]['name']} turn {gs.t}: " + "word " * 60})
+            gs = transition(gs, role_id, a)
+    await client.close()
+    return {
+        "turns": len(metas),
+        "prompt_tokens_evaluated": sum(m.get("prompt_eval_count", 0) for m in metas),
+        "prompt_eval_ms": round(sum(m.get("prompt_eval_duration_ms", 0.0) for m in metas), 1),
+        "ttft_ms": percentiles([m["ttft_ms"] for m in metas if "ttft_ms" in m]),
+    }
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--url", default="", help="Ollama /api/chat URL (default: start bench.fake_ollama)")
+    ap.add_argument("--model", default="llama3")
+    ap.add_argument("--rounds", type=int, default=4)
+    ap.add_argument("--seed", type=int, default=7)
+    ap.add_argument("--fake-args", default="--prefill-tps 4000 --slots 1 --ttft 0.02 --tps 2000 --tokens 40 --jitter 0",
+                    help="arguments for bench.fake_ollama")
+    args = ap.parse_args()
+
+    proc = None
+    url = args.url
+    if not url:
+        port = free_port()
+        proc = subprocess.Popen([sys.executable, "-m", "bench.fake_ollama", "--port", str(port), *args.fake_args.split()])
+        wait_port(port)
+        url = f"http://127.0.0.1:{port}/api/chat"
+    # the client reads its config at import time
+    os.environ["OLLAMA_CHAT_URL"] = url
+    os.environ["LLM_CACHE_MODE"] = "off"
+    try:
+        report = {}
+        for name, layout in (("legacy", legacy_messages), ("current", current_messages)):
+            t0 = time.perf_counter()
+            report[name] = asyncio.run(play(layout, args.model, args.rounds, args.seed))
+            report[name]["wall_s"] = round(time.perf_counter() - t0, 3)
+        legacy, current = report["legacy"]["prompt_tokens_evaluated"], report["current"]["prompt_tokens_evaluated"]
+        report["evaluated_tokens_saved"] = round(1.0 - current / legacy, 3) if legacy else None
+        print(json.dumps(report, indent=2))
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait(timeout=10)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""Round latency, sequential vs simultaneous round mode.
+
+Starts bench.fake_ollama and the app, then runs --sessions sessions one after
+another in each round mode (StartSimRequest.round_mode) and reports per-round
+wall time (first turn_start to round_end), how many turns were
+streaming at once, and whether every delta's role matched a turn in flight.
+
+  sequential   - one speaker at a time
+  simultaneous - every role but the chair renders at once, then the chair
+
+    cd backend && python -m bench.round_mode --sessions 3 --rounds 2
+"""
+import argparse
+import asyncio
+import json
+import os
+import shlex
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+import websockets
+
+from bench.run_bench import free_port, percentiles, wait_port
+
+MODES = ("sequential", "simultaneous")
+
+async def one(http: httpx.AsyncClient, base: str, body: dict) -> dict:
+    r = await http.post(f"{base}/api/sim/start", json=body)
+    sid = r.json()["session_id"]
+    ws_url = base.replace("http://", "ws://") + f"/ws/sim/{sid}"
+    rounds, order, open_turns = [], [], set()
+    peak, stray, start = 0, 0, None
+    async with websockets.connect(ws_url, max_size=None, close_timeout=0.1) as ws:
+        while True:
+            evt = json.loads(await asyncio.wait_for(ws.recv(), 120))
+            kind = evt.get("type")
+            if kind == "turn_start":
+                if start is None:
+                    start = time.perf_counter()
+                open_turns.add(evt["role"])
+                peak = max(peak, len(open_turns))
+            elif kind == "delta":
+                stray += evt["role"] not in open_turns
+            elif kind == "turn_end":
+                open_turns.discard(evt["role"])
+                order.append(evt["role"])
+            elif kind in ("round_end", "done") and start is not None:
+                rounds.append((time.perf_counter() - start) * 1000.0)
+                start = None
+            if kind in ("done", "stopped", "error"):
+                break
+    for _ in range(50):
+        res = (await http.get(f"{base}/api/sim/result/{sid}")).json()
+        if res["ok"]:
+            break
+        await asyncio.sleep(0.1)
+    transcript = res.get("result", {}).get("transcript") or []
+    return {"rounds": rounds, "peak": peak, "stray": stray, "ended": order,
+            "applied": [t["role_id"] for t in transcript]}
+
+async def drive(args, base: str, mode: str) -> dict:
+    body = {"rounds": args.rounds, "round_mode": mode}
+    if args.seed is not None:
+        body["seed"] = args.seed
+    async with httpx.AsyncClient(timeout=60) as http:
+        runs = [await one(http, base, body) for _ in range(args.sessions)]
+    return {
+        "round_ms": percentiles([ms for run in runs for ms in run["rounds"]]),
+        "max_concurrent_turns": max(run["peak"] for run in runs),
+        "stray_deltas": sum(run["stray"] for run in runs),
+        "turn_end_order": runs[0]["ended"][:5],
+        "transcript_order": runs[0]["applied"][:5],
+    }
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sessions", type=int, default=3)
+    ap.add_argument("--rounds", type=int, default=2)
+    ap.add_argument("--seed", type=int, default=7)
+    ap.add_argument("--modes", default=",".join(MODES))
+    ap.add_argument("--fake-args", default="--ttft 0.2 --tps 60 --tokens 60")
+    args = ap.parse_args()
+
+    report = {}
+    procs = []
+    tmp = tempfile.mkdtemp(prefix="bench-")
+    try:
+        fake_port, app_port = free_port(), free_port()
+        procs.append(subprocess.Popen(
+            [sys.executable, "-m", "bench.fake_ollama", "--port", str(fake_port), *shlex.split(args.fake_args)]))
+        wait_port(fake_port)
+        env = dict(os.environ)
+        env.update({
+            "OLLAMA_CHAT_URLS": f"http://127.0.0.1:{fake_port}/api/chat",
+            "SESSION_SPILL_DIR": os.path.join(tmp, "sessions"), "EVENTLOG_DIR": os.path.join(tmp, "eventlogs"),
+        })
+        procs.append(subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(app_port), "--log-level", "warning"],
+            env=env))
+        wait_port(app_port)
+        for mode in args.modes.split(","):
+            report[mode] = asyncio.run(drive(args, f"http://127.0.0.1:{app_port}", mode))
+    finally:
+        for p in reversed(procs):
+            p.terminate()
+        for p in procs:
+            try:
+                p.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                p.kill()
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,294 @@
+"""End-to-end benchmark: N sessions x M websocket viewers against the real app.
+
+Starts bench.fake_ollama and the FastAPI app (uvicorn) as subprocesses,
+drives sessions through /api/sim/start + /ws/sim/{id}, and reports:
+  - sessions/sec and failed sessions
+  - token latency percentiles (fake server emit -> viewer receive)
+  - server CPU per token relayed and RSS growth
+  - frames, payload bytes and wire bytes received per viewer
+  - gap between rounds (last speaker's turn_end -> next round's turn_start)
+
+    cd backend && python -m bench.run_bench --sessions 20 --viewers 3 --rounds 2
+    cd backend && python -m bench.run_bench --sessions 50 --concurrency 10 --fake-args "--tps 80 --error-rate 0.01"
+    cd backend && python -m bench.run_bench --sessions 40 --fake-servers 3   # app routes across 3 fake servers
+    cd backend && python -m bench.run_bench --query "?proto=3&enc=bin" --deflate   # v3 frames, compressed
+    cd backend && python -m bench.run_bench --sessions 40 --workers 4   # shared sessions via app.cluster.server
+"""
+import argparse
+import asyncio
+import json
+import os
+import re
+import shlex
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+import websockets
+from websockets.asyncio.client import ClientConnection
+
+from app.protocol import decode_frame
+
+STAMP = re.compile(r"t(\d{16,})")
+CLK_TCK = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def wait_port(port: int, timeout: float = 15.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.2):
+                return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError(f"port {port} did not open")
+
+def proc_cpu_seconds(pids) -> float:
+    total = 0.0
+    for pid in pids:
+        try:
+            with open(f"/proc/{pid}/stat") as f:
+                parts = f.read().rsplit(")", 1)[1].split()
+            total += (int(parts[11]) + int(parts[12])) / CLK_TCK
+        except OSError:
+            pass
+    return total
+
+def proc_rss_bytes(pids) -> int:
+    total = 0
+    for pid in pids:
+        try:
+            with open(f"/proc/{pid}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        total += int(line.split()[1]) * 1024
+        except OSError:
+            pass
+    return total
+
+def child_pids(pid: int):
+    # uvicorn --workers forks children; measure the whole tree
+    out = [pid]
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            for c in f.read().split():
+                out.extend(child_pids(int(c)))
+    except OSError:
+        pass
+    return out
+
+def percentiles(xs, ps=(50, 90, 99)):
+    if not xs:
+        return {f"p{p}": None for p in ps} | {"max": None, "n": 0}
+    s = sorted(xs)
+    out = {f"p{p}": round(s[min(len(s) - 1, int(p / 100.0 * len(s)))], 3) for p in ps}
+    out["max"] = round(s[-1], 3)
+    out["n"] = len(s)
+    return out
+
+class CountingConnection(ClientConnection):
+    # bytes as read off the socket (after permessage-deflate, with framing)
+    def data_received(self, data: bytes):
+        self.wire_bytes = getattr(self, "wire_bytes", 0) + len(data)
+        super().data_received(data)
+
+class Totals:
+    def __init__(self):
+        self.latencies_ms = []
+        self.round_gaps_ms = []
+        self.frames = 0
+        self.bytes = 0
+        self.wire_bytes = 0
+        self.tokens = 0
+        self.failed = 0
+        self.done = 0
+
+async def viewer(url: str, totals: Totals, count_tokens: bool, timeout: float, subprotocol_query: str = "",
+                 deflate: bool = False):
+    outcome = "closed"
+    round_end_at = None
+    async with websockets.connect(url + subprotocol_query, max_size=None, compression="deflate" if deflate else None,
+                                  create_connection=CountingConnection) as ws:
+        try:
+            while True:
+                try:
+                    raw = await asyncio.wait_for(ws.recv(), timeout)
+                except (asyncio.TimeoutError, websockets.ConnectionClosed):
+                    outcome = "timeout"
+                    break
+                now = time.time_ns()
+                totals.frames += 1
+                totals.bytes += len(raw)
+                if isinstance(raw, bytes):
+                    events = decode_frame(raw)
+                else:
+                    frame = json.loads(raw)
+                    events = frame if isinstance(frame, list) else [frame]
+                for e in events:
+                    t = e.get("type")
+                    if t == "delta":
+                        for m in STAMP.finditer(e.get("text") or ""):
+                            totals.latencies_ms.append((now - int(m.group(1))) / 1e6)
+                            if count_tokens:
+                                totals.tokens += 1
+                    elif t == "turn_end" and e.get("role") == "minister":
+                        round_end_at = now
+                    elif t == "turn_start" and round_end_at is not None:
+                        if count_tokens:
+                            totals.round_gaps_ms.append((now - round_end_at) / 1e6)
+                        round_end_at = None
+                    elif t in ("done", "error", "stopped"):
+                        return t
+        finally:
+            totals.wire_bytes += getattr(ws, "wire_bytes", 0)
+    return outcome
+
+async def run_session(http: httpx.AsyncClient, base: str, viewers: int, rounds: int, totals: Totals,
+                      timeout: float, extra: dict, query: str, deflate: bool = False):
+    r = await http.post(f"{base}/api/sim/start", json={"rounds": rounds, **extra})
+    if r.status_code != 200:
+        totals.failed += 1
+        return
+    sid = r.json()["session_id"]
+    ws_url = base.replace("http", "ws", 1) + f"/ws/sim/{sid}"
+    # the first viewer starts the session; the others join right after
+    results = await asyncio.gather(*[
+        viewer(ws_url, totals, count_tokens=(i == 0), timeout=timeout, subprotocol_query=query, deflate=deflate)
+        for i in range(viewers)
+    ])
+    if results[0] == "done":
+        totals.done += 1
+    else:
+        totals.failed += 1
+
+async def drive(args, base: str, pids) -> dict:
+    totals = Totals()
+    extra = json.loads(args.request) if args.request else {}
+    async with httpx.AsyncClient(timeout=30.0) as http:
+        # warm-up session so imports and the first connections don't count
+        await run_session(http, base, 1, 1, Totals(), args.timeout, extra, args.query, args.deflate)
+        cpu0, rss0 = proc_cpu_seconds(pids), proc_rss_bytes(pids)
+        sem = asyncio.Semaphore(args.concurrency or args.sessions)
+
+        async def one():
+            async with sem:
+                await run_session(http, base, args.viewers, args.rounds, totals, args.timeout, extra, args.query,
+                                  args.deflate)
+
+        t0 = time.perf_counter()
+        await asyncio.gather(*[one() for _ in range(args.sessions)])
+        wall = time.perf_counter() - t0
+        cpu1, rss1 = proc_cpu_seconds(pids), proc_rss_bytes(pids)
+
+    cpu = cpu1 - cpu0
+    viewers_total = args.sessions * args.viewers
+    return {
+        "sessions": args.sessions,
+        "viewers_per_session": args.viewers,
+        "rounds": args.rounds,
+        "wall_s": round(wall, 3),
+        "sessions_per_s": round(totals.done / wall, 3),
+        "done": totals.done,
+        "failed": totals.failed,
+        "tokens_relayed": totals.tokens,
+        "token_latency_ms": percentiles(totals.latencies_ms),
+        "round_gap_ms": percentiles(totals.round_gaps_ms),
+        "server_cpu_s": round(cpu, 3),
+        "cpu_us_per_token": round(cpu * 1e6 / totals.tokens, 2) if totals.tokens else None,
+        "cpu_us_per_token_delivered": round(cpu * 1e6 / (totals.tokens * args.viewers), 2) if totals.tokens else None,
+        "rss_start_mb": round(rss0 / 2**20, 1),
+        "rss_end_mb": round(rss1 / 2**20, 1),
+        "rss_growth_mb": round((rss1 - rss0) / 2**20, 1),
+        "frames_per_viewer": round(totals.frames / viewers_total, 1) if viewers_total else 0,
+        "bytes_per_viewer": round(totals.bytes / viewers_total) if viewers_total else 0,
+        "wire_bytes_per_viewer": round(totals.wire_bytes / viewers_total) if viewers_total else 0,
+    }
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sessions", type=int, default=20)
+    ap.add_argument("--viewers", type=int, default=2)
+    ap.add_argument("--rounds", type=int, default=2)
+    ap.add_argument("--concurrency", type=int, default=0, help="sessions in flight at once (default: all)")
+    ap.add_argument("--timeout", type=float, default=30.0, help="seconds without an event before a viewer gives up")
+    ap.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    ap.add_argument("--session-backend", default="auto",
+                    help="SESSION_BACKEND for the app; auto = redis (a local app.cluster.server) with --workers > 1")
+    ap.add_argument("--fake-args", default="", help="extra arguments for bench.fake_ollama")
+    ap.add_argument("--fake-servers", type=int, default=1, help="number of fake model servers in the app's endpoint pool")
+    ap.add_argument("--app-env", action="append", default=[], help="KEY=VALUE for the app process (repeatable)")
+    ap.add_argument("--app-url", default="", help="benchmark an already running app instead of starting one")
+    ap.add_argument("--request", default="", help="extra JSON fields for /api/sim/start")
+    ap.add_argument("--query", default="", help="query string appended to the websocket URL, e.g. ?proto=3")
+    ap.add_argument("--deflate", action="store_true", help="negotiate permessage-deflate on viewer sockets")
+    ap.add_argument("--json", default="", help="also write the report to this file")
+    args = ap.parse_args()
+
+    procs = []
+    tmp = tempfile.mkdtemp(prefix="bench-")
+    try:
+        if args.app_url:
+            base, pids = args.app_url.rstrip("/"), []
+        else:
+            fake_ports, app_port = [free_port() for _ in range(args.fake_servers)], free_port()
+            for port in fake_ports:
+                procs.append(subprocess.Popen(
+                    [sys.executable, "-m", "bench.fake_ollama", "--port", str(port), *shlex.split(args.fake_args)]
+                ))
+            for port in fake_ports:
+                wait_port(port)
+            env = dict(os.environ)
+            env.update({
+                "OLLAMA_CHAT_URLS": ",".join(f"http://127.0.0.1:{p}/api/chat" for p in fake_ports),
+                # measure the orchestrator, not admission control
+                "LLM_MAX_IN_FLIGHT": "100000", "LLM_PER_MODEL_CONCURRENCY": "100000",
+                "LLM_MAX_QUEUE": "100000", "SESSION_MAX": "100000",
+                "SESSION_SPILL_DIR": os.path.join(tmp, "sessions"),
+                "EVENTLOG_DIR": os.path.join(tmp, "eventlogs"),
+            })
+            backend = args.session_backend
+            if backend == "auto":
+                backend = "redis" if args.workers > 1 else "local"
+            env["SESSION_BACKEND"] = backend
+            if backend == "redis" and "SESSION_BACKEND_URL" not in dict(kv.split("=", 1) for kv in args.app_env):
+                kv_port = free_port()
+                procs.append(subprocess.Popen([sys.executable, "-m", "app.cluster.server", "--port", str(kv_port)]))
+                wait_port(kv_port)
+                env["SESSION_BACKEND_URL"] = f"redis://127.0.0.1:{kv_port}"
+            env.update(kv.split("=", 1) for kv in args.app_env)
+            app = subprocess.Popen(
+                [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(app_port),
+                 "--workers", str(args.workers), "--log-level", "warning"],
+                env=env,
+            )
+            procs.append(app)
+            wait_port(app_port)
+            time.sleep(0.5 if args.workers == 1 else 2.0)
+            base, pids = f"http://127.0.0.1:{app_port}", child_pids(app.pid)
+
+        report = asyncio.run(drive(args, base, pids))
+        if not args.app_url:
+            # how the app spread requests over the fake servers
+            report["fake_servers"] = [httpx.get(f"http://127.0.0.1:{p}/stats").json() for p in fake_ports]
+        print(json.dumps(report, indent=2))
+        if args.json:
+            with open(args.json, "w") as f:
+                json.dump(report, f, indent=2)
+    finally:
+        for p in reversed(procs):
+            p.terminate()
+        for p in procs:
+            try:
+                p.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                p.kill()
+
+if __name__ == "__main__":
+    main()
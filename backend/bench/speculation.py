@@ -0,0 +1,118 @@
+"""Next-speaker TTFT with and without speculative prefill.
+
+For each configuration, starts bench.fake_ollama with simulated prompt
+processing (--prefill-tps, a prompt cache per slot) and the app, then runs
+--sessions seeded sessions one after another. Reports the TTFT and the prompt
+tokens the server had to evaluate for every turn but the first of a round (the
+ones a speculation can prepare), the app's speculation counters, and whether
+the chosen actions match across configurations (they should: speculation must
+not change a run).
+
+  off  - SPECULATIVE_PREFILL=0
+  on   - SPECULATIVE_PREFILL=1: the next speaker's action and prompt prefix are
+         worked out while the current turn streams
+
+    cd backend && python -m bench.speculation --sessions 3 --rounds 2
+"""
+import argparse
+import asyncio
+import json
+import os
+import shlex
+import subprocess
+import sys
+import tempfile
+
+import httpx
+import websockets
+
+from bench.run_bench import free_port, percentiles, wait_port
+
+CONFIGS = {
+    "off": {"SPECULATIVE_PREFILL": "0"},
+    "on": {"SPECULATIVE_PREFILL": "1"},
+}
+
+async def one(http: httpx.AsyncClient, base: str, body: dict) -> dict:
+    r = await http.post(f"{base}/api/sim/start", json=body)
+    sid = r.json()["session_id"]
+    ws_url = base.replace("http://", "ws://") + f"/ws/sim/{sid}"
+    ttft, prompt, actions = [], [], []
+    opening = True
+    async with websockets.connect(ws_url, max_size=None, close_timeout=0.1) as ws:
+        while True:
+            evt = json.loads(await asyncio.wait_for(ws.recv(), 120))
+            kind = evt.get("type")
+            if kind == "action_selected":
+                actions.append([evt["role"], evt["action"]])
+            elif kind == "turn_end":
+                if not opening:
+                    ttft.append(evt["data"].get("ttft_ms", float("nan")))
+                    prompt.append(evt["data"].get("prompt_eval_count", 0))
+                opening = False
+            elif kind == "round_end":
+                opening = True
+            if kind in ("done", "stopped", "error"):
+                return {"ttft": ttft, "prompt": prompt, "actions": actions, "end": kind}
+
+async def drive(args, base: str, stats_url: str) -> dict:
+    body = {"rounds": args.rounds, "seed": args.seed, "judge_mode": args.judge_mode, "policy": args.policy}
+    async with httpx.AsyncClient(timeout=60) as http:
+        runs = [await one(http, base, body) for _ in range(args.sessions)]
+        spec = (await http.get(f"{base}/api/llm/stats")).json()["speculation"]
+        fake = (await http.get(stats_url)).json()
+    return {
+        "ttft_ms": percentiles([x for run in runs for x in run["ttft"]]),
+        "prompt_eval_tokens": percentiles([x for run in runs for x in run["prompt"]]),
+        "speculation": spec,
+        "server_prompt_tokens": fake["prompt_tokens"],
+        "server_prefills": fake["prefills"],
+        "ends": sorted({run["end"] for run in runs}),
+        "actions": [run["actions"] for run in runs],
+    }
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sessions", type=int, default=3)
+    ap.add_argument("--rounds", type=int, default=2)
+    ap.add_argument("--seed", type=int, default=11)
+    ap.add_argument("--judge-mode", default="round")
+    ap.add_argument("--policy", default="baseline")
+    ap.add_argument("--configs", default="off,on")
+    ap.add_argument("--fake-args", default="--ttft 0.05 --tps 40 --tokens 80 --prefill-tps 400 --slots 2")
+    args = ap.parse_args()
+
+    report = {}
+    for name in args.configs.split(","):
+        procs = []
+        tmp = tempfile.mkdtemp(prefix="bench-")
+        try:
+            fake_port, app_port = free_port(), free_port()
+            procs.append(subprocess.Popen(
+                [sys.executable, "-m", "bench.fake_ollama", "--port", str(fake_port), *shlex.split(args.fake_args)]))
+            wait_port(fake_port)
+            env = dict(os.environ)
+            env.update(CONFIGS[name])
+            env.update({
+                "OLLAMA_CHAT_URLS": f"http://127.0.0.1:{fake_port}/api/chat",
+                "SESSION_SPILL_DIR": os.path.join(tmp, "sessions"), "EVENTLOG_DIR": os.path.join(tmp, "eventlogs"),
+            })
+            procs.append(subprocess.Popen(
+                [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(app_port), "--log-level", "warning"],
+                env=env))
+            wait_port(app_port)
+            report[name] = asyncio.run(drive(args, f"http://127.0.0.1:{app_port}", f"http://127.0.0.1:{fake_port}/stats"))
+        finally:
+            for p in reversed(procs):
+                p.terminate()
+            for p in procs:
+                try:
+                    p.wait(timeout=10)
+                except subprocess.TimeoutExpired:
+                    p.kill()
+    actions = [r.pop("actions") for r in report.values()]
+    report["same_actions"] = all(a == actions[0] for a in actions)
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""Model time spent on sessions nobody wants any more.
+
+Starts bench.fake_ollama (slow, long replies) and the app, then for each
+session waits until a turn is streaming and either
+  stop     - POSTs /api/sim/stop
+  abandon  - closes the only viewer (the app has SESSION_ABANDON_GRACE=--grace)
+and reports how many tokens the model server still generated afterwards
+(sampled --settle seconds later), how many streams it saw closed early,
+and, for stop, how long until the viewer got the "stopped" event.
+
+    cd backend && python -m bench.stop_cancel --sessions 4
+    cd backend && python -m bench.stop_cancel --mode abandon --grace 1 --action cancel
+"""
+import argparse
+import asyncio
+import json
+import os
+import shlex
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+import websockets
+
+from bench.run_bench import free_port, percentiles, wait_port
+
+async def one(http: httpx.AsyncClient, base: str, mode: str, stats_url: str, settle: float) -> dict:
+    r = await http.post(f"{base}/api/sim/start", json={"rounds": 2})
+    sid = r.json()["session_id"]
+    ws_url = base.replace("http://", "ws://") + f"/ws/sim/{sid}"
+    out = {}
+    async with websockets.connect(ws_url, max_size=None) as ws:
+        deltas = 0
+        while deltas < 5:
+            evt = json.loads(await ws.recv())
+            deltas += evt.get("type") == "delta"
+        before = (await http.get(stats_url)).json()
+        t0 = time.perf_counter()
+        if mode == "stop":
+            await http.post(f"{base}/api/sim/stop/{sid}")
+            while True:
+                evt = json.loads(await asyncio.wait_for(ws.recv(), 30))
+                if evt.get("type") in ("stopped", "error", "done"):
+                    out["stop_to_event_ms"] = round((time.perf_counter() - t0) * 1000.0, 1)
+                    break
+    await asyncio.sleep(settle)
+    after = (await http.get(stats_url)).json()
+    out["tokens_after"] = after["tokens"] - before["tokens"]
+    out["cancelled_streams"] = after["cancelled"] - before["cancelled"]
+    sessions = (await http.get(f"{base}/api/sim/sessions")).json()["sessions"]
+    out["status"] = next((s["status"] for s in sessions if s["session_id"] == sid), "expired")
+    return out
+
+async def drive(args, base: str, stats_url: str) -> dict:
+    async with httpx.AsyncClient(timeout=30) as http:
+        # one at a time, so the server's token counter belongs to this session
+        runs = [await one(http, base, args.mode, stats_url, args.settle) for _ in range(args.sessions)]
+    report = {
+        "mode": args.mode,
+        "sessions": len(runs),
+        "tokens_after_per_session": round(sum(r["tokens_after"] for r in runs) / len(runs), 1),
+        "cancelled_streams": sum(r["cancelled_streams"] for r in runs),
+        "statuses": sorted({r["status"] for r in runs}),
+    }
+    if args.mode == "stop":
+        report["stop_to_event_ms"] = percentiles([r["stop_to_event_ms"] for r in runs if "stop_to_event_ms" in r])
+    return report
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--mode", choices=["stop", "abandon"], default="stop")
+    ap.add_argument("--sessions", type=int, default=4)
+    ap.add_argument("--grace", type=float, default=1.0, help="SESSION_ABANDON_GRACE for the app")
+    ap.add_argument("--action", default="pause", help="SESSION_ABANDON_ACTION for the app")
+    ap.add_argument("--settle", type=float, default=4.0, help="seconds to wait before reading the server's counters")
+    ap.add_argument("--fake-args", default="--ttft 0.05 --tps 20 --tokens 300", help="arguments for bench.fake_ollama")
+    args = ap.parse_args()
+
+    procs = []
+    tmp = tempfile.mkdtemp(prefix="bench-")
+    try:
+        fake_port, app_port = free_port(), free_port()
+        procs.append(subprocess.Popen(
+            [sys.executable, "-m", "bench.fake_ollama", "--port", str(fake_port), *shlex.split(args.fake_args)]))
+        wait_port(fake_port)
+        env = dict(os.environ)
+        env.update({
+            "OLLAMA_CHAT_URLS": f"http://127.0.0.1:{fake_port}/api/chat",
+            "SESSION_ABANDON_GRACE": str(args.grace), "SESSION_ABANDON_ACTION": args.action,
+            "SESSION_SPILL_DIR": os.path.join(tmp, "sessions"), "EVENTLOG_DIR": os.path.join(tmp, "eventlogs"),
+        })
+        procs.append(subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(app_port), "--log-level", "warning"],
+            env=env))
+        wait_port(app_port)
+        time.sleep(0.5)
+        report = asyncio.run(drive(args, f"http://127.0.0.1:{app_port}", f"http://127.0.0.1:{fake_port}/stats"))
+        print(json.dumps(report, indent=2))
+    finally:
+        for p in reversed(procs):
+            p.terminate()
+        for p in procs:
+            try:
+                p.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                p.kill()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""Microbenchmark: transition + call_vote throughput, pydantic GameState vs slotted SimState.
+
+The "before" path is the original dict-of-dicts implementation (linear
+option_by_id scans, O(options^2) call_vote, model_dump per event), kept here
+verbatim as a reference. Both paths are fed the same action sequence and
+must end in identical states.
+
+    cd backend && python -m bench.transition_micro --options 4 200
+"""
+import argparse
+import random
+import time
+
+from app.game.actions import Action
+from app.game.policy import choose_action
+from app.game.state import GameState, PolicyOption, init_support, init_state
+from app.game.transition import transition, call_vote, clamp
+from app.roles import ROLE_ORDER
+from app.scenario.defaults import default_options
+
+# --- reference (pre-SimState) implementation -------------------------------
+
+def legacy_option_by_id(s: GameState, option_id: str):
+    for o in s.options:
+        if o.id == option_id:
+            return o
+    return None
+
+def legacy_apply_support_delta(s: GameState, role: str, option_id: str, delta: float):
+    s.support[role][option_id] = clamp(s.support[role][option_id] + delta)
+
+def legacy_transition(s: GameState, role: str, a: Action) -> GameState:
+    if a.type == "SUPPORT" and a.option_id:
+        legacy_apply_support_delta(s, role, a.option_id, 0.15)
+        s.public_support = clamp(s.public_support + 0.02)
+    elif a.type == "OPPOSE" and a.option_id:
+        legacy_apply_support_delta(s, role, a.option_id, -0.15)
+        s.public_support = clamp(s.public_support - 0.02)
+    elif a.type == "PROPOSE" and a.option_id:
+        legacy_apply_support_delta(s, role, a.option_id, 0.10)
+    elif a.type == "AMEND" and a.option_id and a.amendment_type:
+        legacy_apply_support_delta(s, role, a.option_id, 0.07)
+        if a.amendment_type == "subsidy":
+            s.fairness_index = clamp(s.fairness_index + 0.06)
+            s.budget_remaining -= 0.05
+        if a.amendment_type == "phasing":
+            s.public_support = clamp(s.public_support + 0.03)
+        if a.amendment_type == "monitoring_kpis":
+            s.infrastructure_status = clamp(s.infrastructure_status + 0.03)
+    elif a.type == "OFFER_COMPROMISE" and a.option_id_a and a.option_id_b:
+        legacy_apply_support_delta(s, role, a.option_id_a, 0.07)
+        legacy_apply_support_delta(s, role, a.option_id_b, 0.07)
+        s.public_support = clamp(s.public_support + 0.03)
+    if a.option_id:
+        o = legacy_option_by_id(s, a.option_id)
+        if o:
+            s.budget_remaining -= (0.03 * o.capex_cost + 0.02 * o.opex_cost)
+            s.groundwater_risk = clamp(s.groundwater_risk - 0.04 * o.water_saving - 0.03 * o.eco_benefit)
+            s.public_support = clamp(s.public_support - 0.03 * o.political_risk)
+            if o.id == "quotas_enforce":
+                s.restriction_level = min(3, s.restriction_level + 1)
+                s.fairness_index = clamp(s.fairness_index - 0.05)
+    if s.budget_remaining < 0:
+        s.economic_stress = clamp(s.economic_stress + 0.08)
+        s.public_support = clamp(s.public_support - 0.05)
+    return s
+
+def legacy_compute_option_score(s: GameState, option_id: str) -> float:
+    w = {"water_minister": 0.22, "farmer": 0.22, "environment": 0.22, "citizen": 0.22, "minister": 0.12}
+    sup = sum(w[r] * s.support[r].get(option_id, 0.0) for r in w)
+    o = legacy_option_by_id(s, option_id)
+    if not o:
+        return sup
+    feasibility = clamp(0.6 * clamp(s.budget_remaining) + 0.4 * s.infrastructure_status)
+    return clamp(0.75 * sup + 0.25 * feasibility)
+
+def legacy_call_vote(s: GameState):
+    best_id, best = None, -1.0
+    for o in s.options:
+        sc = legacy_compute_option_score(s, o.id)
+        if sc > best:
+            best, best_id = sc, o.id
+    if best_id and best >= 0.65:
+        s.decision_locked = True
+        s.decision_option = best_id
+    return best_id
+
+# ---------------------------------------------------------------------------
+
+def make_options(n: int):
+    base = default_options()
+    if n <= len(base):
+        return base[:n]
+    rnd = random.Random(n)
+    extra = [
+        PolicyOption(id=f"opt_{i}", name=f"Option {i}", description="synthetic",
+                     capex_cost=rnd.random(), opex_cost=rnd.random(), water_saving=rnd.random(),
+                     political_risk=rnd.random(), eco_benefit=rnd.random())
+        for i in range(n - len(base))
+    ]
+    return base + extra
+
+def make_actions(option_ids, turns: int):
+    random.seed(1234)
+    return [(ROLE_ORDER[t % 5], choose_action(ROLE_ORDER[t % 5], option_ids, 1, False)) for t in range(turns)]
+
+def bench(label, n_options, turns, run):
+    t0 = time.perf_counter()
+    final = run()
+    dt = time.perf_counter() - t0
+    print(f"  {label:<10} {turns / dt:>12,.0f} turns/s  ({dt * 1e6 / turns:.2f} us/turn)")
+    return final
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--options", type=int, nargs="+", default=[4, 50, 200])
+    ap.add_argument("--turns", type=int, default=20000)
+    ap.add_argument("--snapshot", action="store_true", help="also serialize state after every turn")
+    args = ap.parse_args()
+
+    for n in args.options:
+        opts = make_options(n)
+        actions = make_actions([o.id for o in opts], args.turns)
+        print(f"options={n} turns={args.turns} (transition + call_vote{' + snapshot' if args.snapshot else ''} per turn)")
+
+        def run_before():
+            s = GameState(topic="bench", options=opts)
+            s.support = init_support(opts)
+            for role, a in actions:
+                legacy_transition(s, role, a)
+                legacy_call_vote(s)
+                if args.snapshot:
+                    s.model_dump()
+            return s.model_dump()
+
+        def run_after():
+            s = init_state("bench", opts)
+            for role, a in actions:
+                transition(s, role, a)
+                call_vote(s)
+                if args.snapshot:
+                    s.snapshot()
+            return s.snapshot()
+
+        before = bench("before", n, args.turns, run_before)
+        after = bench("after", n, args.turns, run_after)
+        assert before == after, "SimState diverged from the reference implementation"
+
+if __name__ == "__main__":
+    main()
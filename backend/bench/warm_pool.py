@@ -0,0 +1,109 @@
+"""First-turn latency with and without the model warm pool.
+
+Starts bench.fake_ollama with slow model loads (--load-time) and a short
+server-side keep_alive, then for each configuration starts the app and runs
+--sessions sessions one after another, --gap seconds apart (a quiet period
+long enough for the server to unload an idle model). The viewer connects
+--connect-delay seconds after /api/sim/start. Reports time from the viewer's
+connect to the first delta, and the app's cold/warm first-turn split.
+
+  off  - no keep_alive on requests, no warm-up (the old behaviour)
+  warm - LLM_WARM_MODELS preloaded at startup, keep_alive on every request,
+         the session's model warmed on /api/sim/start
+
+    cd backend && python -m bench.warm_pool --sessions 4 --gap 4
+"""
+import argparse
+import asyncio
+import json
+import os
+import shlex
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+import websockets
+
+from bench.run_bench import free_port, percentiles, wait_port
+
+CONFIGS = {
+    "off": {"LLM_KEEP_ALIVE": "", "LLM_WARM_ON_START": "0", "LLM_WARM_MODELS": ""},
+    "warm": {"LLM_KEEP_ALIVE": "30m", "LLM_WARM_ON_START": "1", "LLM_WARM_MODELS": "llama3"},
+}
+
+async def one(http: httpx.AsyncClient, base: str, connect_delay: float) -> float:
+    r = await http.post(f"{base}/api/sim/start", json={"rounds": 1})
+    sid = r.json()["session_id"]
+    await asyncio.sleep(connect_delay)
+    ws_url = base.replace("http://", "ws://") + f"/ws/sim/{sid}"
+    async with websockets.connect(ws_url, max_size=None) as ws:
+        t0 = time.perf_counter()
+        first = None
+        while True:
+            evt = json.loads(await asyncio.wait_for(ws.recv(), 60))
+            if evt.get("type") == "delta" and first is None:
+                first = (time.perf_counter() - t0) * 1000.0
+            if evt.get("type") in ("done", "stopped", "error"):
+                return first if first is not None else float("nan")
+
+async def drive(args, base: str, stats_url: str) -> dict:
+    async with httpx.AsyncClient(timeout=30) as http:
+        # the app's startup preload (if any) happens while the first gap elapses
+        firsts = []
+        for _ in range(args.sessions):
+            await asyncio.sleep(args.gap)
+            firsts.append(await one(http, base, args.connect_delay))
+        warm = (await http.get(f"{base}/api/llm/stats")).json()["warm"]
+        fake = (await http.get(stats_url)).json()
+    return {
+        "first_delta_ms": percentiles(firsts),
+        "first_turns": warm["first_turn_ttft_ms"],
+        "model_loads": fake["loads"],
+    }
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sessions", type=int, default=4)
+    ap.add_argument("--gap", type=float, default=4.0, help="seconds between sessions")
+    ap.add_argument("--connect-delay", type=float, default=0.3, help="seconds from /api/sim/start to the websocket")
+    ap.add_argument("--load-time", type=float, default=2.0, help="model load time of the fake server")
+    ap.add_argument("--server-keep-alive", type=float, default=3.0, help="the fake server's default keep_alive")
+    ap.add_argument("--configs", default="off,warm")
+    ap.add_argument("--fake-args", default="--ttft 0.05 --tps 200 --tokens 40")
+    args = ap.parse_args()
+
+    report = {}
+    for name in args.configs.split(","):
+        procs = []
+        tmp = tempfile.mkdtemp(prefix="bench-")
+        try:
+            fake_port, app_port = free_port(), free_port()
+            procs.append(subprocess.Popen(
+                [sys.executable, "-m", "bench.fake_ollama", "--port", str(fake_port), "--load-time", str(args.load_time),
+                 "--keep-alive", str(args.server_keep_alive), *shlex.split(args.fake_args)]))
+            wait_port(fake_port)
+            env = dict(os.environ)
+            env.update(CONFIGS[name])
+            env.update({
+                "OLLAMA_CHAT_URLS": f"http://127.0.0.1:{fake_port}/api/chat",
+                "SESSION_SPILL_DIR": os.path.join(tmp, "sessions"), "EVENTLOG_DIR": os.path.join(tmp, "eventlogs"),
+            })
+            procs.append(subprocess.Popen(
+                [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(app_port), "--log-level", "warning"],
+                env=env))
+            wait_port(app_port)
+            report[name] = asyncio.run(drive(args, f"http://127.0.0.1:{app_port}", f"http://127.0.0.1:{fake_port}/stats"))
+        finally:
+            for p in reversed(procs):
+                p.terminate()
+            for p in procs:
+                try:
+                    p.wait(timeout=10)
+                except subprocess.TimeoutExpired:
+                    p.kill()
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
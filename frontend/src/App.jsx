@@ -9,6 +9,18 @@ function clamp01(x) {
   return Math.max(0, Math.min(1, n));
 }
 
+// Deep-merge a v2 state patch (see backend/app/protocol.py) into a copy of the state.
+function applyPatch(target, patch) {
+  const out = { ...(target || {}) };
+  for (const [k, v] of Object.entries(patch || {})) {
+    const cur = out[k];
+    out[k] = v && typeof v === "object" && !Array.isArray(v) && cur && typeof cur === "object"
+      ? applyPatch(cur, v)
+      : v;
+  }
+  return out;
+}
+
 function pct(x) {
   return `${Math.round(clamp01(x) * 100)}%`;
 }
@@ -194,7 +206,12 @@ export default function App() {
 
   const wsRef = useRef(null);
   const inflightByRole = useRef({}); // role -> msg id
+  const stateRef = useRef(null);
+  const lastSeq = useRef(0);
+  const resyncing = useRef(false);
+  const statusRef = useRef("idle");
 
+  statusRef.current = status;
   const canStart = status === "idle" || status === "done" || status === "stopped" || status === "error";
 
   async function start() {
@@ -206,6 +223,9 @@ export default function App() {
     setDecision(null);
     setPayoffs(null);
     setStatus("starting");
+    stateRef.current = null;
+    lastSeq.current = 0;
+    resyncing.current = false;
 
     const r = await fetch("http://localhost:8000/api/sim/start", {
       method: "POST",
@@ -222,12 +242,24 @@ export default function App() {
     const j = await r.json();
     setSessionId(j.session_id);
 
-    if (wsRef.current) wsRef.current.close();
-    wsRef.current = connectWS(j.session_id, onEvent);
+    if (wsRef.current) {
+      wsRef.current.onclose = null;
+      wsRef.current.close();
+    }
+    openWS(j.session_id, null);
 
     setStatus("running");
   }
 
+  function openWS(sid, fromSeq) {
+    wsRef.current = connectWS(sid, onEvent, fromSeq, () => {
+      // dropped mid-session: reconnect and catch up from the last seen event
+      if (statusRef.current === "running" || statusRef.current === "starting") {
+        setTimeout(() => openWS(sid, lastSeq.current + 1), 1000);
+      }
+    });
+  }
+
   async function stop() {
     if (!sessionId) return;
     await fetch(`http://localhost:8000/api/sim/stop/${sessionId}`, { method: "POST" });
@@ -248,11 +280,30 @@ export default function App() {
     return newId;
   }
 
+  function setState(next) {
+    stateRef.current = next;
+    setGameState(next);
+  }
+
   function onEvent(evt) {
-    if (evt.state) setGameState(evt.state);
+    if (typeof evt.seq === "number") {
+      if (evt.type === "snapshot" || evt.type === "session_start") {
+        resyncing.current = false;
+      } else if (resyncing.current || evt.seq <= lastSeq.current) {
+        return;
+      } else if ((evt.from_seq ?? evt.seq) !== lastSeq.current + 1) {
+        // missed events: ask for a fresh snapshot and drop patches until it arrives
+        resyncing.current = true;
+        if (wsRef.current) wsRef.current.send(JSON.stringify({ type: "resync" }));
+        return;
+      }
+      lastSeq.current = evt.seq;
+    }
+
+    if (evt.state) setState(evt.state);
+    else if (evt.patch && Object.keys(evt.patch).length) setState(applyPatch(stateRef.current, evt.patch));
 
-    if (evt.type === "session_start") {
-      setGameState(evt.state || null);
+    if (evt.type === "session_start" || evt.type === "snapshot") {
       return;
     }
 
@@ -276,6 +327,13 @@ export default function App() {
       return;
     }
 
+    if (evt.type === "turn_reset") {
+      // the turn was interrupted (session paused with nobody watching) and is rendered again
+      const id = inflightByRole.current[evt.role];
+      if (id) setMessages(prev => prev.map(m => (m.id === id ? { ...m, content: "" } : m)));
+      return;
+    }
+
     if (evt.type === "turn_end") {
       const role = evt.role;
       const id = inflightByRole.current[role];
@@ -288,7 +346,8 @@ export default function App() {
 
     if (evt.type === "judge_scores") {
       setJudge(evt.data || null);
-      setJudgeRound((evt.state && evt.state.round_idx) || null);
+      // incremental judging reports a round after the next one has started
+      setJudgeRound(evt.round_idx ?? ((stateRef.current && stateRef.current.round_idx) || null));
       return;
     }
 
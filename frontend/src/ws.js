@@ -1,8 +1,16 @@
-export function connectWS(sessionId, onEvent) {
-  const ws = new WebSocket(`ws://localhost:8000/ws/sim/${sessionId}`);
+export function connectWS(sessionId, onEvent, fromSeq = null, onClose = null) {
+  // fromSeq: resume from this event seq (catch-up from the session's event log)
+  // proto=3: events arrive batched as JSON arrays (see backend/app/protocol.py)
+  const q = fromSeq ? `?proto=3&from=${fromSeq}` : "?proto=3";
+  const ws = new WebSocket(`ws://localhost:8000/ws/sim/${sessionId}${q}`);
   ws.onmessage = (e) => {
-    try { onEvent(JSON.parse(e.data)); } catch (_) {}
+    let frame;
+    try { frame = JSON.parse(e.data); } catch (_) { return; }
+    for (const evt of Array.isArray(frame) ? frame : [frame]) {
+      try { onEvent(evt); } catch (_) {}
+    }
   };
   ws.onerror = () => onEvent({ type: "error", message: "ws_error" });
+  if (onClose) ws.onclose = onClose;
   return ws;
 }